@@ -1,4 +1,8 @@
+from decimal import Decimal
+
 from django.contrib import admin
+from django.db.models import DecimalField, F, Sum, Value
+from django.db.models.functions import Coalesce
 from .models import Carrito, ItemCarrito, Pedido, DetallePedido
 
 @admin.register(Carrito)
@@ -6,14 +10,28 @@ class CarritoAdmin(admin.ModelAdmin):
     list_display = ['usuario', 'cantidad_items', 'total', 'creado', 'actualizado']
     search_fields = ['usuario__username']
     readonly_fields = ['creado', 'actualizado']
+    list_select_related = ['usuario']
+    
+    def get_queryset(self, request):
+        # Unidades y total de cada carrito en la misma consulta del listado
+        return super().get_queryset(request).annotate(
+            unidades=Coalesce(Sum('itemcarrito__cantidad'), 0),
+            monto=Coalesce(
+                Sum(F('itemcarrito__cantidad') * F('itemcarrito__producto__precio')),
+                Value(Decimal('0')),
+                output_field=DecimalField(max_digits=12, decimal_places=0),
+            ),
+        )
     
     def cantidad_items(self, obj):
-        return obj.cantidad_items()
+        return obj.unidades
     cantidad_items.short_description = 'Items'
+    cantidad_items.admin_order_field = 'unidades'
     
     def total(self, obj):
-        return f"${obj.total():,.0f}"
+        return f"${obj.monto:,.0f}"
     total.short_description = 'Total'
+    total.admin_order_field = 'monto'
 
 
 @admin.register(ItemCarrito)
@@ -41,12 +59,13 @@ class PedidoAdmin(admin.ModelAdmin):
     list_filter = ['estado', 'fecha_pedido']
     search_fields = ['numero_pedido', 'usuario__username']
     readonly_fields = ['numero_pedido', 'fecha_pedido', 'fecha_pago', 'subtotal', 'iva', 'total', 
-                      'token_ws', 'buy_order', 'transaction_date', 'authorization_code', 'payment_type_code']
+                      'token_ws', 'buy_order', 'transaction_date', 'authorization_code', 'payment_type_code',
+                      'reserva_expira', 'venta']
     inlines = [DetallePedidoInline]
     
     fieldsets = (
         ('Información del Pedido', {
-            'fields': ('numero_pedido', 'usuario', 'fecha_pedido', 'estado')
+            'fields': ('numero_pedido', 'usuario', 'fecha_pedido', 'estado', 'reserva_expira', 'venta')
         }),
         ('Montos', {
             'fields': ('subtotal', 'iva', 'total')
@@ -0,0 +1,73 @@
+"""
+Carrito de los visitantes sin cuenta.
+
+Se guarda en una cookie firmada ("12:3|7:1": producto y cantidad), no en la
+base de datos: navegar y agregar productos sin iniciar sesion no crea
+Carrito, ItemCarrito ni sesiones. El stock se valida igual que en el carrito
+de los usuarios (ver carrito/operaciones.py), con una consulta de lectura.
+
+Al iniciar sesion (o registrarse) `fusionar` suma la cookie al carrito del
+usuario con un solo upsert y la borra. Para pagar hay que iniciar sesion.
+"""
+from django.conf import settings
+
+from inventario.models import Producto
+from .operaciones import MAX_LINEAS_ANONIMO, fusionar_carrito
+from .resumen import VACIO, resumen_carrito
+
+COOKIE = 'carrito'
+SALT = 'carrito.anonimo'
+
+
+def leer(request):
+    """{producto_id: cantidad} de la cookie (vacio si no hay o fue alterada)"""
+    valor = request.get_signed_cookie(COOKIE, default='', salt=SALT)
+    cantidades = {}
+    for linea in valor.split('|')[:MAX_LINEAS_ANONIMO] if valor else []:
+        producto_id, _, cantidad = linea.partition(':')
+        if producto_id.isdigit() and cantidad.isdigit() and int(cantidad) > 0:
+            cantidades[int(producto_id)] = int(cantidad)
+    return cantidades
+
+
+def guardar(response, cantidades):
+    """Escribe el carrito en la cookie de la respuesta (o la borra si quedo vacio)"""
+    if not cantidades:
+        response.delete_cookie(COOKIE)
+        return
+    response.set_signed_cookie(
+        COOKIE,
+        '|'.join(f'{producto_id}:{cantidad}' for producto_id, cantidad in cantidades.items()),
+        salt=SALT,
+        max_age=getattr(settings, 'CARRITO_ANONIMO_DIAS', 14) * 24 * 60 * 60,
+        httponly=True,
+        samesite='Lax',
+    )
+
+
+def fusionar(request, response):
+    """
+    Pasa el carrito de la cookie al del usuario recien autenticado y borra la
+    cookie. Retorna cuantos productos se agregaron o sumaron.
+    """
+    cantidades = leer(request)
+    if COOKIE in request.COOKIES:
+        response.delete_cookie(COOKIE)
+    return fusionar_carrito(request.user, cantidades)
+
+
+def resumen_visitante(request):
+    """
+    {'cantidad', 'total'} del carrito de quien hace la peticion: el del usuario
+    (desde el cache, ver carrito/resumen.py) o el de la cookie (una consulta de precios)
+    """
+    if request.user.is_authenticated:
+        return resumen_carrito(request.user)
+    cantidades = leer(request)
+    if not cantidades:
+        return dict(VACIO)
+    precios = dict(Producto.objects.filter(id__in=list(cantidades)).values_list('id', 'precio'))
+    return {
+        'cantidad': sum(cantidad for producto_id, cantidad in cantidades.items() if producto_id in precios),
+        'total': sum(cantidad * precios[producto_id] for producto_id, cantidad in cantidades.items() if producto_id in precios),
+    }
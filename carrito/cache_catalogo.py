@@ -0,0 +1,102 @@
+"""
+Cache de las paginas del catalogo publico.
+
+Durante un lanzamiento la mayoria de las visitas al catalogo son anonimas y
+piden las mismas paginas. La pagina completa para visitantes sin sesion y las
+paginas del scroll infinito (para todos) se guardan ya renderizadas, con clave
+segun los filtros de la URL y la version del catalogo. La version sube cuando
+se guarda o borra un producto, cuando cambia su stock (ventas, reservas,
+importaciones: señal stock_actualizado) y cuando cambian las categorias (ver
+carrito/signals.py). Esta en la base de datos (ver inventario/versiones.py) y no
+en el cache, que por defecto es de cada proceso: una venta hecha en un worker
+cambia las paginas de todos, como maximo VERIFICAR_SEGUNDOS despues.
+
+Lo que depende de cada visitante no se guarda: la pagina compartida lleva
+marcas en lugar del token CSRF y del contador del carrito, que se reemplazan
+al responder (`personalizar`). Las paginas con mensajes (ej: "producto
+agregado") no se cachean.
+
+Ademas, cada tarjeta de producto se guarda como fragmento ({% cache %} en
+_tarjetas_catalogo.html) con clave segun la fecha de modificacion, el precio,
+el stock y la version de las categorias. Asi, cuando una venta cambia la version del
+catalogo, al rearmar la pagina solo se vuelven a renderizar las tarjetas de
+los productos que cambiaron.
+"""
+import hashlib
+
+from django.contrib.messages import get_messages
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.middleware.csrf import get_token
+from django.template.loader import render_to_string
+
+from inventario import taxonomia
+from inventario.versiones import VersionCompartida
+
+VERIFICAR_SEGUNDOS = 2
+VERSION = VersionCompartida('CATALOGO', VERIFICAR_SEGUNDOS)
+# La pagina lleva la hora del encabezado; las tarjetas se guardan por mas tiempo (su clave ya cambia con el producto)
+DURACION = 60  # segundos
+DURACION_TARJETAS = 60 * 60
+# Parametros del catalogo; con otros la pagina no se cachea (evita llenar el cache con URLs inventadas)
+PARAMETROS = {'categoria', 'subcategoria', 'busqueda', 'cursor', 'parcial'}
+MARCA_CSRF = 'csrf-catalogo-compartido'
+MARCA_CARRITO = 'contador-carrito-compartido'
+MARCA_CANTIDAD = 'cantidad-carrito-compartido'
+# Contexto de la pagina compartida: marcas en lugar de los datos del visitante
+CONTEXTO_COMPARTIDO = {'csrf_token': MARCA_CSRF, 'marca_carrito': MARCA_CARRITO, 'cantidad_carrito': MARCA_CANTIDAD}
+
+
+def version():
+    return VERSION.actual()
+
+
+def subir_version():
+    VERSION.subir()
+
+
+def invalidar():
+    """Cambio algo que se ve en el catalogo (se aplica al confirmar la transaccion en curso)"""
+    VERSION.subir_al_confirmar()
+
+
+def contexto_tarjetas():
+    """Lo que necesita el {% cache %} de _tarjetas_catalogo.html"""
+    return {'duracion_tarjetas': DURACION_TARJETAS, 'version_taxonomia': taxonomia.version()}
+
+
+def clave(request, parcial):
+    """Clave de la pagina en el cache, o None si esta peticion no se puede cachear"""
+    if request.method != 'GET' or not set(request.GET) <= PARAMETROS:
+        return None
+    # La pagina completa lleva el menu del usuario y los mensajes; las parciales solo tarjetas
+    if not parcial and (request.user.is_authenticated or len(get_messages(request))):
+        return None
+    filtros = hashlib.md5(request.GET.urlencode().encode(), usedforsecurity=False).hexdigest()
+    return f'carrito:catalogo:{version()}:{filtros}'
+
+
+def guardar(clave, response):
+    cache.set(clave, (response['Content-Type'], response.content), DURACION)
+
+
+def respuesta(request, guardada):
+    """Respuesta desde el cache, con los datos del visitante"""
+    content_type, contenido = guardada
+    return personalizar(request, HttpResponse(contenido, content_type=content_type))
+
+
+def personalizar(request, response):
+    """Pone el token CSRF y el contador del carrito del visitante en la pagina compartida"""
+    from .anonimo import resumen_visitante
+
+    contenido = response.content
+    if MARCA_CSRF.encode() in contenido:
+        contenido = contenido.replace(MARCA_CSRF.encode(), get_token(request).encode())
+    if MARCA_CARRITO.encode() in contenido:
+        cantidad = resumen_visitante(request)['cantidad']
+        contador = render_to_string('carrito/_contador_carrito.html', {'cantidad_carrito': cantidad})
+        contenido = contenido.replace(MARCA_CARRITO.encode(), contador.encode())
+        contenido = contenido.replace(MARCA_CANTIDAD.encode(), str(cantidad).encode())
+    response.content = contenido
+    return response
@@ -0,0 +1,12 @@
+from django.utils.functional import SimpleLazyObject
+
+from .anonimo import resumen_visitante
+
+
+def carrito(request):
+    """
+    `resumen_carrito` ({'cantidad', 'total'}) para el contador del menu, del
+    usuario o del visitante sin cuenta. Se calcula solo si la plantilla lo usa,
+    y para los usuarios normalmente sale del cache.
+    """
+    return {'resumen_carrito': SimpleLazyObject(lambda: resumen_visitante(request))}
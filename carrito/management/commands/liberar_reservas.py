@@ -0,0 +1,36 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from carrito.reservas import liberar_vencidas, recalcular_reservas
+
+
+class Command(BaseCommand):
+    help = (
+        'Libera el stock reservado por pedidos web cuya reserva vencio sin pago. '
+        'Ejecutar cada minuto (cron) o dejarlo corriendo con --intervalo'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--intervalo', type=float, default=None,
+                            help='Seguir corriendo y revisar cada estos segundos')
+        parser.add_argument('--recalcular', action='store_true',
+                            help='Ademas recalcular el stock reservado de todos los productos desde los pedidos')
+
+    def handle(self, *args, **options):
+        if options['recalcular']:
+            descuadrados = recalcular_reservas()
+            self.stdout.write(f'Stock reservado recalculado ({descuadrados} productos corregidos)')
+
+        try:
+            while True:
+                close_old_connections()
+                liberadas = liberar_vencidas()
+                if liberadas or options['intervalo'] is None:
+                    self.stdout.write(self.style.SUCCESS(f'{liberadas} reservas vencidas liberadas'))
+                if options['intervalo'] is None:
+                    break
+                time.sleep(options['intervalo'])
+        except KeyboardInterrupt:
+            self.stdout.write('Detenido')
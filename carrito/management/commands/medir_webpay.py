@@ -0,0 +1,70 @@
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+
+from carrito.payments import ClienteWebpay, WebpayError, _opciones
+from carrito.webpay_local import WebpayLocal
+
+
+class Command(BaseCommand):
+    help = (
+        'Mide latencia y throughput de pagos (create + commit) contra Webpay. Por defecto levanta '
+        'un Webpay local; con --url se mide contra otro servidor (ej: `manage.py webpay_local`)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--pagos', type=int, default=200, help='Pagos a simular (default: 200)')
+        parser.add_argument('--hilos', type=int, default=10, help='Pagos en paralelo (default: 10)')
+        parser.add_argument('--latencia', type=float, default=0,
+                            help='Milisegundos de latencia del Webpay local (default: 0)')
+        parser.add_argument('--url', help='Medir contra este servidor Webpay en vez de uno local')
+        parser.add_argument('--sin-reutilizar', action='store_true',
+                            help='Crear un cliente (y conexiones) por pago, para comparar con el cliente compartido')
+
+    def _pagar(self, cliente, numero):
+        cliente = cliente or ClienteWebpay(_opciones(), url_base=self.url)
+        inicio = time.perf_counter()
+        transaccion = cliente.create(f'MEDICION-{numero}', 'medicion', 1000, 'http://127.0.0.1/retorno/')
+        medio = time.perf_counter()
+        cliente.commit(transaccion['token'])
+        fin = time.perf_counter()
+        return medio - inicio, fin - medio
+
+    def _resumen(self, nombre, tiempos):
+        tiempos = sorted(tiempos)
+        percentil = lambda p: tiempos[min(len(tiempos) - 1, int(len(tiempos) * p))] * 1000
+        self.stdout.write(
+            f'{nombre:<7} p50 {percentil(0.5):7.1f} ms   p95 {percentil(0.95):7.1f} ms   '
+            f'p99 {percentil(0.99):7.1f} ms   promedio {statistics.mean(tiempos) * 1000:7.1f} ms'
+        )
+
+    def handle(self, *args, **options):
+        local = None
+        if options['url']:
+            self.url = options['url']
+        else:
+            local = WebpayLocal(latencia=options['latencia'] / 1000).start()
+            self.url = local.url
+
+        cliente = None if options['sin_reutilizar'] else ClienteWebpay(
+            _opciones(), url_base=self.url, conexiones=options['hilos']
+        )
+        try:
+            inicio = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=options['hilos']) as hilos:
+                resultados = list(hilos.map(lambda n: self._pagar(cliente, n), range(options['pagos'])))
+            total = time.perf_counter() - inicio
+        except WebpayError as e:
+            raise CommandError(f'Webpay respondio con error: {e}')
+        finally:
+            if local is not None:
+                local.stop()
+
+        self.stdout.write(
+            f"{options['pagos']} pagos en {total:.2f} s con {options['hilos']} hilos: "
+            f"{options['pagos'] / total:.1f} pagos/s ({'un cliente por pago' if cliente is None else 'cliente compartido'})"
+        )
+        self._resumen('create', [create for create, _ in resultados])
+        self._resumen('commit', [commit for _, commit in resultados])
@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+
+from carrito.webpay_local import WebpayLocal
+
+
+class Command(BaseCommand):
+    help = (
+        'Levanta un Webpay Plus local (create/commit/status y formulario de pago) para probar '
+        'y medir el checkout sin internet. Usar con TRANSBANK_URL = http://HOST:PUERTO'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--puerto', type=int, default=8001)
+        parser.add_argument('--latencia', type=float, default=0,
+                            help='Milisegundos de espera en cada llamada a la API (simula un Webpay lento)')
+        parser.add_argument('--rechazar', action='store_true', help='Rechazar todos los pagos')
+        parser.add_argument('--verbose', action='store_true', help='Mostrar cada peticion')
+
+    def handle(self, *args, **options):
+        webpay = WebpayLocal(
+            host=options['host'],
+            puerto=options['puerto'],
+            latencia=options['latencia'] / 1000,
+            rechazar=options['rechazar'],
+            verbose=options['verbose'],
+        )
+        self.stdout.write(self.style.SUCCESS(f'Webpay local en {webpay.url} (TRANSBANK_URL = {webpay.url!r})'))
+        try:
+            webpay.serve_forever()
+        except KeyboardInterrupt:
+            self.stdout.write('Webpay local detenido')
+        finally:
+            webpay.stop()
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-16 23:15
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('carrito', '0002_pedido_detallepedido'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='pedido',
+            index=models.Index(fields=['usuario', '-fecha_pedido'], name='pedido_usuario_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pedido',
+            index=models.Index(condition=models.Q(('token_ws__isnull', False)), fields=['token_ws'], name='pedido_token_ws_idx'),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-16 23:53
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('carrito', '0003_indices_consultas'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pedido',
+            name='reserva_expira',
+            field=models.DateTimeField(blank=True, help_text='Vacio si el pedido no tiene stock reservado', null=True, verbose_name='Reserva de Stock Vence'),
+        ),
+        migrations.AddIndex(
+            model_name='pedido',
+            index=models.Index(condition=models.Q(('reserva_expira__isnull', False)), fields=['reserva_expira'], name='pedido_reserva_expira_idx'),
+        ),
+    ]
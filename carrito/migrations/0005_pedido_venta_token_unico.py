@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-16 23:55
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('carrito', '0004_reservas_stock'),
+        ('inventario', '0014_producto_stock_reservado'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='pedido',
+            name='pedido_token_ws_idx',
+        ),
+        migrations.AddField(
+            model_name='pedido',
+            name='venta',
+            field=models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='pedido', to='inventario.venta', verbose_name='Venta'),
+        ),
+        migrations.AddConstraint(
+            model_name='pedido',
+            constraint=models.UniqueConstraint(condition=models.Q(('token_ws__isnull', False)), fields=('token_ws',), name='pedido_token_ws_unico'),
+        ),
+    ]
@@ -1,4 +1,8 @@
+from decimal import Decimal
+
 from django.db import models
+from django.db.models import DecimalField, F, Q, Sum, Value
+from django.db.models.functions import Coalesce
 from django.conf import settings
 from inventario.models import Producto
 from django.utils import timezone
@@ -14,18 +18,35 @@ class Carrito(models.Model):
         verbose_name = "Carrito"
         verbose_name_plural = "Carritos"
     
+    def resumen(self):
+        """Unidades y total del carrito (una consulta)"""
+        return resumir_items(self.itemcarrito_set.all())
+    
     def total(self):
         """Calcula el total del carrito"""
-        return sum(item.subtotal() for item in self.itemcarrito_set.all())
+        return self.resumen()['total']
     
     def cantidad_items(self):
         """Cuenta total de productos en el carrito"""
-        return sum(item.cantidad for item in self.itemcarrito_set.all())
+        return self.resumen()['cantidad']
     
     def __str__(self):
         return f"Carrito de {self.usuario.username}"
 
 
+def resumir_items(items):
+    """{'cantidad': unidades, 'total': suma de subtotales} de un queryset de ItemCarrito"""
+    resumen = items.aggregate(
+        unidades=Coalesce(Sum('cantidad'), 0),
+        monto=Coalesce(
+            Sum(F('cantidad') * F('producto__precio')),
+            Value(Decimal('0')),
+            output_field=DecimalField(max_digits=12, decimal_places=0),
+        ),
+    )
+    return {'cantidad': resumen['unidades'], 'total': resumen['monto']}
+
+
 class ItemCarrito(models.Model):
     """Producto individual dentro del carrito"""
     carrito = models.ForeignKey(Carrito, on_delete=models.CASCADE)
@@ -110,6 +131,24 @@ class Pedido(models.Model):
     authorization_code = models.CharField(max_length=50, blank=True, null=True, verbose_name="Código Autorización")
     payment_type_code = models.CharField(max_length=10, blank=True, null=True, verbose_name="Tipo de Pago")
     
+    # Venta registrada al confirmarse el pago (una por pedido)
+    venta = models.OneToOneField(
+        'inventario.Venta',
+        on_delete=models.SET_NULL,
+        blank=True,
+        null=True,
+        related_name='pedido',
+        verbose_name="Venta"
+    )
+    
+    # Reserva de stock mientras se paga (ver carrito/reservas.py)
+    reserva_expira = models.DateTimeField(
+        blank=True,
+        null=True,
+        verbose_name="Reserva de Stock Vence",
+        help_text="Vacio si el pedido no tiene stock reservado"
+    )
+    
     # Observaciones
     observaciones = models.TextField(blank=True, null=True)
     
@@ -117,6 +156,20 @@ class Pedido(models.Model):
         verbose_name = "Pedido"
         verbose_name_plural = "Pedidos"
         ordering = ['-fecha_pedido']
+        indexes = [
+            # Mis pedidos / actividad del cliente
+            models.Index(fields=['usuario', '-fecha_pedido'], name='pedido_usuario_fecha_idx'),
+            # liberar_reservas busca las reservas vencidas
+            models.Index(
+                fields=['reserva_expira'], condition=Q(reserva_expira__isnull=False), name='pedido_reserva_expira_idx'
+            ),
+        ]
+        constraints = [
+            # retorno_pago busca (y bloquea) el pedido por el token de Webpay
+            models.UniqueConstraint(
+                fields=['token_ws'], condition=Q(token_ws__isnull=False), name='pedido_token_ws_unico'
+            ),
+        ]
     
     def __str__(self):
         return f"{self.numero_pedido} - {self.usuario.username} - ${self.total}"
@@ -124,22 +177,9 @@ class Pedido(models.Model):
     def save(self, *args, **kwargs):
         """Generar número de pedido autoincremental si es nuevo"""
         if not self.numero_pedido:
+            from inventario.secuencias import generar_numero_pedido
             # Formato: PED-YYYYMMDD-XXXX
-            fecha = timezone.now().strftime('%Y%m%d')
-            ultimo_pedido = Pedido.objects.filter(
-                numero_pedido__startswith=f'PED-{fecha}'
-            ).order_by('id').last()
-            
-            if ultimo_pedido and ultimo_pedido.numero_pedido:
-                try:
-                    ultimo_num = int(ultimo_pedido.numero_pedido.split('-')[-1])
-                    nuevo_num = ultimo_num + 1
-                except:
-                    nuevo_num = 1
-            else:
-                nuevo_num = 1
-            
-            self.numero_pedido = f"PED-{fecha}-{nuevo_num:04d}"
+            self.numero_pedido = generar_numero_pedido()
         
         super().save(*args, **kwargs)
     
@@ -0,0 +1,226 @@
+"""
+Cambios en bloque al carrito (API JSON del carrito y botones del catalogo).
+
+Cada operacion indica un producto y su cantidad final (`cantidad`; 0 lo quita
+del carrito) o cuantas unidades sumar o restar (`sumar`). Todas se validan
+con una sola consulta, que trae el stock disponible de los productos y lo que
+ya hay en el carrito. Despues se aplican juntas en una transaccion:
+
+- un UPDATE para los items que ya estaban, con Case/When (F('cantidad') + n
+  para `sumar`, asi dos clics seguidos no pisan el uno al otro),
+- un INSERT en bloque para los productos nuevos,
+- un DELETE para los que quedan en 0.
+
+Si alguna operacion no se puede aplicar (producto inactivo, sin stock
+suficiente), no se aplica ninguna. Solo se valida el stock al aumentar
+cantidades: bajar siempre se permite. El stock se reserva recien al pagar
+(ver carrito/reservas.py).
+"""
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Case, F, OuterRef, Subquery, Value, When
+from django.db.models.functions import Coalesce
+
+from inventario.models import Producto
+from .models import Carrito, ItemCarrito, resumir_items
+from .resumen import invalidar
+
+MAX_OPERACIONES = 100
+MAX_LINEAS_ANONIMO = 50  # La cookie del carrito anonimo no puede pasar de 4 KB
+
+
+class CarritoError(Exception):
+    """La operacion sobre el carrito no es valida o no hay stock"""
+
+
+def leer_operaciones(datos):
+    """
+    Valida el cuerpo de la API: {"operaciones": [{"producto": 12, "cantidad": 3},
+    {"producto": 7, "sumar": -1}]}. Retorna [(producto_id, 'cantidad'|'sumar', valor)].
+    """
+    operaciones = datos.get('operaciones') if isinstance(datos, dict) else None
+    if not isinstance(operaciones, list) or not operaciones:
+        raise CarritoError('Se esperaba una lista de operaciones')
+    if len(operaciones) > MAX_OPERACIONES:
+        raise CarritoError(f'Máximo {MAX_OPERACIONES} operaciones por solicitud')
+
+    resultado = []
+    vistos = set()
+    for operacion in operaciones:
+        if not isinstance(operacion, dict):
+            raise CarritoError('Operación inválida')
+        tipos = [tipo for tipo in ('cantidad', 'sumar') if tipo in operacion]
+        producto_id = operacion.get('producto')
+        if len(tipos) != 1 or not isinstance(producto_id, int) or isinstance(producto_id, bool):
+            raise CarritoError('Cada operación lleva "producto" y "cantidad" o "sumar"')
+        valor = operacion[tipos[0]]
+        if not isinstance(valor, int) or isinstance(valor, bool) or (tipos[0] == 'cantidad' and valor < 0):
+            raise CarritoError(f'Cantidad inválida para el producto {producto_id}')
+        if producto_id in vistos:
+            raise CarritoError(f'El producto {producto_id} aparece más de una vez')
+        vistos.add(producto_id)
+        resultado.append((producto_id, tipos[0], valor))
+    return resultado
+
+
+def _sin_stock(producto):
+    if not producto['activo'] or producto['disponible'] <= 0:
+        return CarritoError(f'El producto "{producto["nombre"]}" no tiene stock disponible')
+    return CarritoError(
+        f'No puedes agregar más unidades de "{producto["nombre"]}". Stock disponible: {producto["disponible"]}'
+    )
+
+
+def _productos(ids, usuario=None):
+    """
+    {id: fila} con nombre, precio, activo y stock disponible de los productos, y
+    en 'en_carrito' lo que ya tiene el usuario en su carrito (0 sin usuario)
+    """
+    en_carrito = Value(0)
+    if usuario is not None:
+        actual = ItemCarrito.objects.filter(carrito__usuario=usuario, producto=OuterRef('pk')).values('cantidad')[:1]
+        en_carrito = Coalesce(Subquery(actual), 0)
+    return {
+        fila['id']: fila
+        for fila in Producto.objects.filter(id__in=list(ids)).annotate(
+            disponible=F('stock') - F('stock_reservado'),
+            en_carrito=en_carrito,
+        ).values('id', 'nombre', 'precio', 'activo', 'disponible', 'en_carrito')
+    }
+
+
+def _planificar(operaciones, productos):
+    """{producto_id: cantidad final}; lanza CarritoError si algun aumento no tiene stock"""
+    finales = {}
+    for producto_id, tipo, valor in operaciones:
+        producto = productos.get(producto_id)
+        if producto is None:
+            raise CarritoError(f'El producto {producto_id} no existe')
+        antes = producto['en_carrito']
+        despues = max(antes + valor if tipo == 'sumar' else valor, 0)
+        if despues > antes and (not producto['activo'] or despues > producto['disponible']):
+            raise _sin_stock(producto)
+        finales[producto_id] = despues
+    return finales
+
+
+def _resultado(finales, productos, cantidad, total):
+    neto = int(total / Decimal('1.19'))
+    return {
+        'items': {
+            producto_id: {
+                'cantidad': final,
+                'subtotal': int(final * productos[producto_id]['precio']),
+                'disponible': max(productos[producto_id]['disponible'], 0),
+            }
+            for producto_id, final in finales.items()
+        },
+        'cantidad': cantidad,
+        'total': int(total),
+        'neto': neto,
+        'iva': int(total) - neto,
+    }
+
+
+def aplicar_operaciones(usuario, operaciones):
+    """
+    Aplica las operaciones al carrito del usuario. Lanza CarritoError, sin
+    cambiar nada, si alguna no se puede aplicar.
+
+    Retorna {'items': {producto_id: {'cantidad', 'subtotal', 'disponible'}},
+    'cantidad', 'total', 'neto', 'iva'}: los items tocados y los totales del
+    carrito ya recalculados.
+    """
+    with transaction.atomic():
+        # Validacion: stock disponible y cantidad actual de todos los productos en una consulta
+        productos = _productos([producto_id for producto_id, _, _ in operaciones], usuario)
+        finales = _planificar(operaciones, productos)
+
+        actualizar = {}
+        nuevos = {}
+        quitar = []
+        for producto_id, tipo, valor in operaciones:
+            antes, despues = productos[producto_id]['en_carrito'], finales[producto_id]
+            if despues == antes:
+                continue
+            if despues == 0:
+                quitar.append(producto_id)
+            elif antes == 0:
+                nuevos[producto_id] = despues
+            else:
+                actualizar[producto_id] = F('cantidad') + valor if tipo == 'sumar' else Value(despues)
+
+        items = ItemCarrito.objects.filter(carrito__usuario=usuario)
+        if actualizar:
+            items.filter(producto_id__in=list(actualizar)).update(
+                cantidad=Case(*[When(producto_id=pid, then=nueva) for pid, nueva in actualizar.items()])
+            )
+        if nuevos:
+            _insertar(usuario, nuevos)
+        if quitar:
+            items.filter(producto_id__in=quitar).delete()
+        if actualizar or nuevos or quitar:
+            invalidar(usuario.pk)
+
+        resumen = resumir_items(items)
+
+    return _resultado(finales, productos, resumen['cantidad'], resumen['total'])
+
+
+def _insertar(usuario, cantidades):
+    """Un solo INSERT ... ON CONFLICT con las cantidades finales de cada producto"""
+    carrito, _ = Carrito.objects.get_or_create(usuario=usuario)
+    # Si otra peticion agrego el mismo producto entretanto, queda la cantidad de esta
+    ItemCarrito.objects.bulk_create(
+        [ItemCarrito(carrito=carrito, producto_id=pid, cantidad=cantidad) for pid, cantidad in cantidades.items()],
+        update_conflicts=True,
+        unique_fields=['carrito', 'producto'],
+        update_fields=['cantidad'],
+    )
+
+
+# ---- Carrito anonimo (ver carrito/anonimo.py) ----
+
+def aplicar_operaciones_anonimo(cantidades, operaciones):
+    """
+    Igual que aplicar_operaciones, sobre el carrito de un visitante sin cuenta
+    ({producto_id: cantidad}). No escribe en la base de datos: hace una sola
+    consulta (stock y precios) y retorna (cantidades nuevas, resultado).
+    """
+    productos = _productos(set(cantidades) | {producto_id for producto_id, _, _ in operaciones})
+    for producto_id, producto in productos.items():
+        producto['en_carrito'] = cantidades.get(producto_id, 0)
+    finales = _planificar(operaciones, productos)
+
+    # Los productos que ya no existen salen del carrito
+    nuevas = {pid: cantidad for pid, cantidad in {**cantidades, **finales}.items() if cantidad and pid in productos}
+    if len(nuevas) > MAX_LINEAS_ANONIMO:
+        raise CarritoError(f'Tu carrito admite hasta {MAX_LINEAS_ANONIMO} productos distintos; inicia sesión para agregar más')
+    total = sum((cantidad * productos[pid]['precio'] for pid, cantidad in nuevas.items()), Decimal('0'))
+    return nuevas, _resultado(finales, productos, sum(nuevas.values()), total)
+
+
+def fusionar_carrito(usuario, cantidades):
+    """
+    Suma el carrito anonimo ({producto_id: cantidad}) al carrito del usuario,
+    sin pasar del stock disponible, con una consulta y un solo upsert.
+    Retorna cuantos productos cambiaron.
+    """
+    if not cantidades:
+        return 0
+    with transaction.atomic():
+        productos = _productos(cantidades, usuario)
+        lineas = {}
+        for producto_id, cantidad in cantidades.items():
+            producto = productos.get(producto_id)
+            if producto is None or not producto['activo']:
+                continue
+            antes = producto['en_carrito']
+            final = min(antes + cantidad, max(producto['disponible'], antes))
+            if final > antes:
+                lineas[producto_id] = final
+        if lineas:
+            _insertar(usuario, lineas)
+            invalidar(usuario.pk)
+    return len(lineas)
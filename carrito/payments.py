@@ -0,0 +1,183 @@
+"""
+Integracion con Webpay Plus (Transbank).
+
+Es el unico modulo que importa el SDK de Transbank; las vistas de pago lo
+importan dentro de la funcion para que los workers no lo carguen al arrancar.
+
+Del SDK se usan los hosts, encabezados y validaciones; las llamadas HTTP las
+hace `ClienteWebpay` con una requests.Session compartida por todo el proceso
+(`cliente_webpay()`), asi cada pago reutiliza conexiones TLS ya abiertas en vez
+de abrir una nueva. Las llamadas tienen tiempo maximo de conexion y de
+respuesta (un Webpay lento ya no deja workers colgados) y se reintentan solo
+cuando repetirlas no puede crear ni confirmar dos veces una transaccion: los
+errores de conexion (la peticion no salio) y, solo para las consultas (GET),
+las respuestas 502/503/504. Un 502/504 a un create o commit puede llegar
+despues de que Webpay lo proceso, asi que no se repite; si el commit falla
+(sin respuesta, o porque otra peticion ya lo hizo) se consulta el estado de la
+transaccion en vez de repetirlo.
+
+Las vistas asincronas usan acreate/acommit: como requests es bloqueante, la
+llamada corre en un grupo de hilos propio del cliente (TRANSBANK_CONEXIONES),
+asi el event loop y el hilo de Django para codigo sincrono quedan libres
+mientras Webpay responde.
+
+TRANSBANK_URL permite apuntar a otro servidor, por ejemplo al Webpay local de
+`python manage.py webpay_local` para probar y medir el checkout sin internet.
+"""
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+from transbank.common.api_constants import ApiConstants
+from transbank.common.headers_builder import HeadersBuilder
+from transbank.common.integration_type import IntegrationType, webpay_host
+from transbank.common.options import WebpayOptions
+from transbank.common.validation_util import ValidationUtil
+from urllib3.exceptions import TimeoutError as TimeoutUrllib3
+from urllib3.util.retry import Retry
+
+RUTA_TRANSACCIONES = ApiConstants.WEBPAY_ENDPOINT + '/transactions'
+
+# Valores por defecto si no estan en settings
+TIMEOUT_CONEXION = 3.05
+TIMEOUT_RESPUESTA = 15
+REINTENTOS = 2
+CONEXIONES = 20
+
+
+class WebpayError(Exception):
+    """Webpay rechazo la llamada o no respondio"""
+
+    def __init__(self, mensaje, codigo=None):
+        super().__init__(mensaje)
+        self.codigo = codigo
+
+
+def _opciones():
+    """Credenciales y ambiente segun TRANSBANK_ENVIRONMENT (TEST o LIVE)"""
+    if settings.TRANSBANK_ENVIRONMENT == 'TEST':
+        integration_type = IntegrationType.TEST
+    else:
+        integration_type = IntegrationType.LIVE
+    return WebpayOptions(
+        commerce_code=settings.TRANSBANK_COMMERCE_CODE,
+        api_key=settings.TRANSBANK_API_KEY,
+        integration_type=integration_type,
+    )
+
+
+class ClienteWebpay:
+    """Transacciones Webpay Plus (create, commit, status) sobre una sesion HTTP reutilizable"""
+
+    def __init__(self, opciones, url_base=None, timeout=(TIMEOUT_CONEXION, TIMEOUT_RESPUESTA),
+                 reintentos=REINTENTOS, conexiones=CONEXIONES):
+        self.url_base = (url_base or webpay_host(opciones.integration_type)).rstrip('/')
+        self.timeout = timeout
+        reintento = Retry(
+            total=reintentos,
+            connect=reintentos,
+            read=0,  # Si la peticion llego, repetirla podria cobrar o confirmar dos veces
+            status=reintentos,
+            status_forcelist=(502, 503, 504),
+            # Reintentos por estado solo para consultas; create (POST) y commit (PUT)
+            # pudieron procesarse aunque el proxy responda 502/504
+            allowed_methods=frozenset({'GET'}),
+            backoff_factor=0.2,
+            raise_on_status=False,
+        )
+        adaptador = HTTPAdapter(pool_connections=1, pool_maxsize=conexiones, max_retries=reintento)
+        self.sesion = requests.Session()
+        self.sesion.mount('https://', adaptador)
+        self.sesion.mount('http://', adaptador)
+        self.sesion.headers.update(HeadersBuilder.build(opciones))
+        self._hilos = ThreadPoolExecutor(max_workers=conexiones, thread_name_prefix='webpay')
+
+    def _llamar(self, metodo, ruta, datos=None):
+        try:
+            respuesta = self.sesion.request(metodo, self.url_base + ruta, json=datos, timeout=self.timeout)
+        except requests.RequestException as e:
+            # Con reintentos, requests entrega los timeouts envueltos en un ConnectionError
+            causa = getattr(e.args[0], 'reason', None) if e.args else None
+            if isinstance(e, requests.Timeout) or isinstance(causa, TimeoutUrllib3):
+                raise WebpayError('Webpay no respondió a tiempo') from e
+            raise WebpayError('No se pudo conectar con Webpay') from e
+
+        try:
+            contenido = respuesta.json() if respuesta.content else {}
+        except ValueError:
+            contenido = {}
+        if not 200 <= respuesta.status_code < 300:
+            mensaje = contenido.get('error_message') or contenido.get('description') or respuesta.text
+            raise WebpayError(mensaje or f'Webpay respondió {respuesta.status_code}', respuesta.status_code)
+        return contenido
+
+    def create(self, buy_order, session_id, amount, return_url):
+        ValidationUtil.has_text_with_max_length(buy_order, ApiConstants.BUY_ORDER_LENGTH, 'buy_order')
+        ValidationUtil.has_text_with_max_length(session_id, ApiConstants.SESSION_ID_LENGTH, 'session_id')
+        ValidationUtil.has_text_with_max_length(return_url, ApiConstants.RETURN_URL_LENGTH, 'return_url')
+        return self._llamar('POST', RUTA_TRANSACCIONES, {
+            'buy_order': buy_order,
+            'session_id': session_id,
+            'amount': amount,
+            'return_url': return_url,
+        })
+
+    def commit(self, token):
+        ValidationUtil.has_text_with_max_length(token, ApiConstants.TOKEN_LENGTH, 'token')
+        try:
+            return self._llamar('PUT', f'{RUTA_TRANSACCIONES}/{token}')
+        except WebpayError as error:
+            # Sin respuesta el commit pudo haberse aplicado, y si otra peticion ya lo
+            # confirmo Webpay responde error: en ambos casos manda el estado de la transaccion
+            try:
+                estado = self.status(token)
+            except WebpayError:
+                raise error
+            if estado.get('status') in (None, 'INITIALIZED'):
+                raise error
+            return estado
+
+    def status(self, token):
+        ValidationUtil.has_text_with_max_length(token, ApiConstants.TOKEN_LENGTH, 'token')
+        return self._llamar('GET', f'{RUTA_TRANSACCIONES}/{token}')
+
+    # ---- Para vistas asincronas ----
+
+    def _en_hilo(self, funcion, *args):
+        return asyncio.get_running_loop().run_in_executor(self._hilos, partial(funcion, *args))
+
+    async def acreate(self, buy_order, session_id, amount, return_url):
+        return await self._en_hilo(self.create, buy_order, session_id, amount, return_url)
+
+    async def acommit(self, token):
+        return await self._en_hilo(self.commit, token)
+
+    async def astatus(self, token):
+        return await self._en_hilo(self.status, token)
+
+
+_cliente = None
+_lock = threading.Lock()
+
+
+def cliente_webpay():
+    """Cliente Webpay Plus del proceso (se crea en el primer pago)"""
+    global _cliente
+    if _cliente is None:
+        with _lock:
+            if _cliente is None:
+                _cliente = ClienteWebpay(
+                    _opciones(),
+                    url_base=getattr(settings, 'TRANSBANK_URL', None),
+                    timeout=(
+                        getattr(settings, 'TRANSBANK_TIMEOUT_CONEXION', TIMEOUT_CONEXION),
+                        getattr(settings, 'TRANSBANK_TIMEOUT_RESPUESTA', TIMEOUT_RESPUESTA),
+                    ),
+                    reintentos=getattr(settings, 'TRANSBANK_REINTENTOS', REINTENTOS),
+                    conexiones=getattr(settings, 'TRANSBANK_CONEXIONES', CONEXIONES),
+                )
+    return _cliente
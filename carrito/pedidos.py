@@ -0,0 +1,174 @@
+"""
+Creacion y confirmacion de los pagos de pedidos web.
+
+El retorno de Webpay puede llegar dos veces con el mismo token (recarga del
+navegador, doble redireccion). La llamada a Webpay se hace sin transaccion
+abierta; si el pago ya habia sido confirmado por la otra peticion, el cliente
+de Webpay entrega el estado final de la transaccion (ver
+carrito.payments.ClienteWebpay.commit). Luego `aplicar_pago` bloquea el pedido
+(select_for_update) y solo lo procesa si sigue PENDIENTE: la segunda peticion
+encuentra el pedido PAGADO o CANCELADO, sin descontar stock ni crear otra Venta.
+
+El registro completo (pedido, stock, movimientos, venta, detalles, resumen
+diario y carrito) va en una sola transaccion con escrituras en bloque: si algo
+falla no queda un pedido pagado a medias y el retorno se puede reintentar.
+"""
+import logging
+
+from asgiref.sync import sync_to_async
+from django.db import transaction
+from django.utils import timezone
+
+from inventario.models import DetalleVenta, MovimientoStock, Venta
+from inventario.resumen_ventas import sumar_venta
+from .models import DetallePedido, ItemCarrito, Pedido
+from .reservas import descontar_stock, liberar, reservar
+
+logger = logging.getLogger(__name__)
+
+
+def _coincide(pedido, respuesta):
+    """La respuesta de Webpay corresponde a la orden y al monto del pedido"""
+    orden = respuesta.get('buy_order')
+    monto = respuesta.get('amount')
+    return (orden is None or orden == pedido.buy_order) and (monto is None or int(monto) == int(pedido.total))
+
+
+def _cancelar(pedido, observaciones=None):
+    liberar(pedido)
+    pedido.estado = 'CANCELADO'
+    campos = ['estado', 'reserva_expira']
+    if observaciones:
+        pedido.observaciones = observaciones
+        campos.append('observaciones')
+    pedido.save(update_fields=campos)
+
+
+def _registrar_venta(pedido, respuesta):
+    """Marca el pedido pagado y registra la venta web; retorna los productos sin stock"""
+    productos, vendidos, faltantes = descontar_stock(pedido)
+    detalles = list(pedido.detalles.all())
+    cliente = pedido.usuario.username
+
+    venta = Venta(
+        cliente_nombre=f"{cliente} (Compra Web)",
+        usuario=None,  # Sin vendedor
+        observaciones=f'Compra por sitio web - Pedido {pedido.numero_pedido}',
+        canal='WEB',
+    )
+    venta.asignar_totales(sum(detalle.subtotal for detalle in detalles))
+    venta.save()
+
+    DetalleVenta.objects.bulk_create([
+        DetalleVenta(
+            venta=venta,
+            producto_id=detalle.producto_id,
+            cantidad=detalle.cantidad,
+            precio_unitario=detalle.precio_unitario,
+            subtotal=detalle.cantidad * detalle.precio_unitario,
+        )
+        for detalle in detalles
+    ])
+    MovimientoStock.objects.bulk_create([
+        MovimientoStock(
+            producto=productos[producto_id],
+            tipo='VENTA',
+            cantidad=cantidad,
+            stock_anterior=productos[producto_id].stock,
+            stock_nuevo=productos[producto_id].stock - cantidad,
+            motivo=f'Compra online - Pedido {pedido.numero_pedido}',
+            observaciones=f'Venta realizada por sitio web. Cliente: {cliente}',
+            usuario=None,  # Sin vendedor (compra online)
+        )
+        for producto_id, cantidad in vendidos.items()
+    ])
+    sumar_venta(venta, unidades=sum(detalle.cantidad for detalle in detalles))
+
+    pedido.estado = 'PAGADO'
+    pedido.fecha_pago = timezone.now()
+    pedido.transaction_date = respuesta.get('transaction_date')
+    pedido.authorization_code = respuesta.get('authorization_code')
+    pedido.payment_type_code = respuesta.get('payment_type_code')
+    pedido.venta = venta
+    pedido.save(update_fields=[
+        'estado', 'fecha_pago', 'transaction_date', 'authorization_code', 'payment_type_code',
+        'venta', 'reserva_expira',
+    ])
+
+    # Vaciar el carrito
+    ItemCarrito.objects.filter(carrito__usuario=pedido.usuario).delete()
+
+    return [productos[producto_id] for producto_id in faltantes]
+
+
+def crear_pedido(usuario, items):
+    """
+    Crea el pedido PENDIENTE con los items del carrito y reserva su stock, todo
+    en una transaccion. Lanza ReservaError (sin crear nada) si no alcanza el stock.
+    """
+    with transaction.atomic():
+        pedido = Pedido.objects.create(usuario=usuario, estado='PENDIENTE')
+        DetallePedido.objects.bulk_create([
+            DetallePedido(
+                pedido=pedido,
+                producto_id=item.producto_id,
+                cantidad=item.cantidad,
+                precio_unitario=item.producto.precio,
+                subtotal=item.cantidad * item.producto.precio,
+            )
+            for item in items
+        ])
+        pedido.calcular_totales()
+        reservar(pedido, {item.producto_id: item.cantidad for item in items})
+    return pedido
+
+
+def aplicar_pago(pedido_id, respuesta):
+    """
+    Aplica la respuesta de Webpay (commit o status) al pedido, si sigue PENDIENTE.
+
+    Retorna (pedido, procesado, faltantes): `procesado` es False si otra
+    peticion ya lo habia confirmado o anulado, y `faltantes` son los productos
+    que no tenian stock al confirmar (la reserva habia vencido).
+    """
+    with transaction.atomic():
+        pedido = Pedido.objects.select_for_update().select_related('usuario').get(pk=pedido_id)
+        if pedido.estado != 'PENDIENTE':
+            return pedido, False, []
+
+        if respuesta.get('status') != 'AUTHORIZED':
+            _cancelar(pedido)
+            return pedido, True, []
+        if not _coincide(pedido, respuesta):
+            logger.error(
+                'Webpay autorizo %s por %s y el pedido %s es por %s',
+                respuesta.get('buy_order'), respuesta.get('amount'), pedido.buy_order, pedido.total,
+            )
+            _cancelar(pedido, 'Webpay autorizó una orden o monto distinto al del pedido: revisar y reembolsar.')
+            return pedido, True, []
+
+        faltantes = _registrar_venta(pedido, respuesta)
+    return pedido, True, faltantes
+
+
+async def aconfirmar_pago(token_ws, usuario, acommit):
+    """
+    Confirma en Webpay (`await acommit(token_ws)` retorna la respuesta de
+    Transbank) el pago del pedido del usuario con ese token y registra la venta.
+    Retorna lo mismo que aplicar_pago; lanza Pedido.DoesNotExist si el token no
+    corresponde a un pedido del usuario.
+    """
+    pedido = await Pedido.objects.aget(token_ws=token_ws, usuario=usuario)
+    if pedido.estado != 'PENDIENTE':
+        return pedido, False, []
+    respuesta = await acommit(token_ws)
+    return await sync_to_async(aplicar_pago)(pedido.pk, respuesta)
+
+
+def anular_pago(token, usuario):
+    """Cancela el pedido pendiente cuyo pago se anulo en Webpay y libera su reserva"""
+    with transaction.atomic():
+        pedido = Pedido.objects.select_for_update().filter(token_ws=token, usuario=usuario, estado='PENDIENTE').first()
+        if pedido is not None:
+            _cancelar(pedido)
+    return pedido
@@ -0,0 +1,170 @@
+"""
+Reservas de stock de los pedidos web.
+
+Entre iniciar_pago y el retorno de Webpay las unidades del pedido quedan
+apartadas en Producto.stock_reservado. El catalogo, el carrito y el POS
+trabajan con el stock disponible (stock - stock_reservado), asi que dos
+clientes no pueden pagar la misma ultima unidad durante un lanzamiento.
+
+Un pedido tiene la reserva vigente mientras Pedido.reserva_expira no sea nulo.
+Cada operacion primero "toma" la reserva con un UPDATE condicionado sobre el
+pedido y recien entonces mueve las cantidades con UPDATE (F()) sobre Producto,
+asi que se puede llamar dos veces (o desde dos procesos) sin descontar doble.
+
+La reserva dura RESERVA_STOCK_MINUTOS; el comando `liberar_reservas` devuelve
+al stock disponible las vencidas. Si un pago se autoriza despues de vencida la
+reserva, se vende desde el stock disponible que quede.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, OuterRef, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from inventario.models import Producto
+from inventario.signals import notificar_stock
+from .models import DetallePedido, Pedido
+
+
+class ReservaError(Exception):
+    """No hay stock disponible para reservar el pedido"""
+
+
+def duracion_reserva():
+    return timedelta(minutes=getattr(settings, 'RESERVA_STOCK_MINUTOS', 15))
+
+
+def cantidades_pedido(pedido):
+    """{producto_id: cantidad} de los detalles del pedido"""
+    cantidades = {}
+    for producto_id, cantidad in pedido.detalles.values_list('producto_id', 'cantidad'):
+        cantidades[producto_id] = cantidades.get(producto_id, 0) + cantidad
+    return cantidades
+
+
+def _por_producto(cantidades, expresion):
+    """Case(When(id=...)) con el valor de `expresion(cantidad)` para cada producto"""
+    return Case(*[When(id=pid, then=expresion(cantidad)) for pid, cantidad in cantidades.items()])
+
+
+def reservar(pedido, cantidades):
+    """
+    Aparta `cantidades` ({producto_id: cantidad}) para el pedido por
+    RESERVA_STOCK_MINUTOS. Lanza ReservaError, sin reservar nada, si algun
+    producto no esta activo o no tiene stock disponible suficiente.
+    """
+    with transaction.atomic():
+        # Un solo UPDATE: solo entran los productos con stock disponible suficiente
+        reservados = Producto.objects.filter(
+            id__in=list(cantidades),
+            activo=True,
+            stock__gte=F('stock_reservado') + _por_producto(cantidades, Value),
+        ).update(stock_reservado=F('stock_reservado') + _por_producto(cantidades, Value))
+
+        if reservados != len(cantidades):
+            productos = Producto.objects.in_bulk(list(cantidades))
+            for producto_id, cantidad in cantidades.items():
+                producto = productos.get(producto_id)
+                if producto is None or not producto.activo:
+                    raise ReservaError(f'El producto {producto_id} no existe o no está activo')
+                if producto.stock_disponible < cantidad:
+                    raise ReservaError(
+                        f'Stock insuficiente para {producto.nombre}. '
+                        f'Disponible: {max(producto.stock_disponible, 0)}'
+                    )
+            raise ReservaError('El stock cambió mientras se reservaba, intenta nuevamente')
+
+        pedido.reserva_expira = timezone.now() + duracion_reserva()
+        Pedido.objects.filter(pk=pedido.pk).update(reserva_expira=pedido.reserva_expira)
+        notificar_stock(cantidades)
+
+
+def liberar(pedido):
+    """
+    Devuelve al stock disponible lo reservado por el pedido. Retorna False si
+    el pedido ya no tenia la reserva vigente (ya liberada o convertida en venta).
+    """
+    with transaction.atomic():
+        tomada = Pedido.objects.filter(pk=pedido.pk, reserva_expira__isnull=False).update(reserva_expira=None)
+        pedido.reserva_expira = None
+        if not tomada:
+            return False
+        cantidades = cantidades_pedido(pedido)
+        if cantidades:
+            Producto.objects.filter(id__in=list(cantidades)).update(
+                stock_reservado=_por_producto(cantidades, lambda cantidad: F('stock_reservado') - cantidad)
+            )
+            notificar_stock(cantidades)
+    return True
+
+
+def descontar_stock(pedido):
+    """
+    Convierte la reserva de un pedido pagado en venta: descuenta el stock de
+    cada producto y libera lo reservado. Si la reserva ya habia vencido, vende
+    desde el stock disponible.
+
+    Retorna (productos, vendidos, faltantes): los productos bloqueados con el
+    stock previo al descuento ({id: Producto}), las cantidades descontadas
+    ({id: cantidad}) y los ids sin stock suficiente, que no se descuentan.
+    """
+    cantidades = cantidades_pedido(pedido)
+    with transaction.atomic():
+        vigente = Pedido.objects.filter(pk=pedido.pk, reserva_expira__isnull=False).update(reserva_expira=None)
+        pedido.reserva_expira = None
+        productos = Producto.objects.select_for_update().in_bulk(list(cantidades))
+
+        vendidos = {}
+        faltantes = []
+        for producto_id, cantidad in cantidades.items():
+            producto = productos.get(producto_id)
+            # Con la reserva vigente las unidades ya estaban apartadas para este pedido
+            disponible = producto.stock if vigente else producto.stock_disponible
+            if disponible >= cantidad:
+                vendidos[producto_id] = cantidad
+            else:
+                faltantes.append(producto_id)
+
+        cambios = {}
+        if vendidos:
+            cambios['stock'] = Case(
+                *[When(id=pid, then=F('stock') - cantidad) for pid, cantidad in vendidos.items()],
+                default=F('stock'),
+            )
+        if vigente:
+            cambios['stock_reservado'] = _por_producto(cantidades, lambda cantidad: F('stock_reservado') - cantidad)
+        if cambios:
+            Producto.objects.filter(id__in=list(cantidades)).update(fecha_modificacion=timezone.now(), **cambios)
+            notificar_stock(cantidades)
+
+    return productos, vendidos, faltantes
+
+
+def liberar_vencidas(ahora=None):
+    """Libera las reservas vencidas; retorna cuantos pedidos se liberaron"""
+    ahora = ahora or timezone.now()
+    vencidos = Pedido.objects.filter(reserva_expira__lt=ahora).only('pk')
+    return sum(1 for pedido in vencidos.iterator() if liberar(pedido))
+
+
+def recalcular_reservas():
+    """
+    Recalcula Producto.stock_reservado desde los pedidos con reserva vigente
+    (ej: si se borro un pedido con la reserva activa desde el admin).
+    Retorna cuantos productos estaban descuadrados.
+    """
+    reservado = (
+        DetallePedido.objects.filter(producto=OuterRef('pk'), pedido__reserva_expira__isnull=False)
+        .values('producto').annotate(total=Sum('cantidad')).values('total')
+    )
+    real = Coalesce(Subquery(reservado, output_field=IntegerField()), Value(0))
+    with transaction.atomic():
+        descuadrados = list(
+            Producto.objects.annotate(real=real).exclude(stock_reservado=F('real')).values_list('pk', flat=True)
+        )
+        if descuadrados:
+            Producto.objects.filter(pk__in=descuadrados).update(stock_reservado=real)
+            notificar_stock(descuadrados)
+    return len(descuadrados)
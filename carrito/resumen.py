@@ -0,0 +1,87 @@
+"""
+Resumen del carrito (unidades y total) para el contador del menu.
+
+El menu muestra el contador del carrito en todas las paginas, asi que el
+resumen se guarda en el cache de Django por usuario y se expone a las
+plantillas con el context processor `carrito.context_processors.carrito`
+(`resumen_carrito.cantidad`, `resumen_carrito.total`). Con el resumen en cache
+una pagina no hace consultas por el carrito; si no esta, hace una sola
+(SUM sobre los items).
+
+La clave lleva dos numeros de version: el del carrito del usuario, que sube
+cuando cambia alguno de sus items, y el de los precios, que sube cuando se
+modifica un producto (ver carrito/signals.py). Al cambiar una version la clave
+anterior queda sin uso y expira sola, asi un resumen calculado en paralelo con
+un cambio nunca queda guardado bajo la version nueva.
+
+La version de los precios esta en la base de datos (ver inventario/versiones.py)
+y se ve en todos los procesos. La del carrito esta en el cache: si el cache es
+el de cada proceso (LocMemCache), un cambio hecho en otro worker no la sube en
+este, asi que con ese cache el resumen se guarda solo DURACION_LOCAL segundos.
+
+Las escrituras en bloque sobre ItemCarrito con update() no envian señales:
+quien las haga debe llamar a `invalidar(usuario_id)`.
+"""
+import time
+
+from django.core.cache import cache, caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import transaction
+
+from inventario.versiones import VersionCompartida
+from .models import ItemCarrito, resumir_items
+
+VERSION_PRECIOS = VersionCompartida('CARRITO-PRECIOS')
+DURACION = 60 * 60  # segundos
+DURACION_LOCAL = 10
+VACIO = {'cantidad': 0, 'total': 0}
+
+
+def _clave_version(usuario_id):
+    return f'carrito:resumen:{usuario_id}:version'
+
+
+def _version(usuario_id):
+    """Version del carrito del usuario, creandola si no esta"""
+    clave = _clave_version(usuario_id)
+    version = cache.get(clave)
+    if version is None:
+        # Una version nueva nunca repite una anterior (si el cache la descarto)
+        cache.add(clave, time.time_ns(), timeout=DURACION * 24)
+        version = cache.get(clave)
+    return version
+
+
+def _subir(usuario_id):
+    clave = _clave_version(usuario_id)
+    try:
+        cache.incr(clave)
+    except ValueError:
+        cache.add(clave, time.time_ns(), timeout=DURACION * 24)
+
+
+def _duracion():
+    """Segundos que se guarda un resumen: poco si el cache no es compartido entre procesos"""
+    return DURACION_LOCAL if isinstance(caches['default'], LocMemCache) else DURACION
+
+
+def resumen_carrito(usuario):
+    """{'cantidad', 'total'} del carrito del usuario (ceros si es anonimo o no tiene carrito)"""
+    if not usuario.is_authenticated:
+        return dict(VACIO)
+    clave = f'carrito:resumen:{usuario.pk}:{_version(usuario.pk)}:{VERSION_PRECIOS.actual()}'
+    resumen = cache.get(clave)
+    if resumen is None:
+        resumen = resumir_items(ItemCarrito.objects.filter(carrito__usuario_id=usuario.pk))
+        cache.set(clave, resumen, _duracion())
+    return resumen
+
+
+def invalidar(usuario_id):
+    """El carrito del usuario cambio (se aplica al confirmar la transaccion en curso)"""
+    transaction.on_commit(lambda: _subir(usuario_id))
+
+
+def invalidar_precios():
+    """Cambio el precio de algun producto: todos los resumenes quedan obsoletos"""
+    VERSION_PRECIOS.subir_al_confirmar()
@@ -0,0 +1,49 @@
+"""
+Señales del carrito: mantienen al dia el resumen en cache (ver carrito/resumen.py)
+y las paginas del catalogo en cache (ver carrito/cache_catalogo.py).
+"""
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from inventario.models import Categoria, Producto, Subcategoria
+from inventario.signals import stock_actualizado
+from . import cache_catalogo
+from .models import Carrito, ItemCarrito
+from .resumen import invalidar, invalidar_precios
+
+
+@receiver(post_save, sender=ItemCarrito)
+@receiver(post_delete, sender=ItemCarrito)
+def item_modificado(sender, instance, **kwargs):
+    # Si el item trae el carrito cargado no hace falta consultar el usuario
+    carrito = ItemCarrito.carrito.field.get_cached_value(instance, default=None)
+    if carrito is not None:
+        invalidar(carrito.usuario_id)
+        return
+    usuario_id = Carrito.objects.filter(pk=instance.carrito_id).values_list('usuario_id', flat=True).first()
+    if usuario_id is not None:
+        invalidar(usuario_id)
+
+
+@receiver(post_save, sender=Producto)
+def producto_modificado(sender, instance, update_fields=None, **kwargs):
+    # Los productos nuevos no estan en ningun carrito, y guardar solo otros campos no cambia el total
+    if kwargs.get('created') or (update_fields is not None and 'precio' not in update_fields):
+        return
+    invalidar_precios()
+
+
+@receiver(post_save, sender=Producto)
+@receiver(post_delete, sender=Producto)
+@receiver(post_save, sender=Categoria)
+@receiver(post_delete, sender=Categoria)
+@receiver(post_save, sender=Subcategoria)
+@receiver(post_delete, sender=Subcategoria)
+def catalogo_modificado(sender, **kwargs):
+    cache_catalogo.invalidar()
+
+
+@receiver(stock_actualizado)
+def stock_modificado(sender, **kwargs):
+    # La señal ya se envia al confirmar la transaccion
+    cache_catalogo.subir_version()
@@ -1,3 +1,252 @@
-from django.test import TestCase
+import json
+import threading
+from unittest import mock
+from urllib.parse import parse_qs, urlsplit
 
-# Create your tests here.
+import requests
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+
+from inventario.models import Categoria, MovimientoStock, Producto, Venta
+from inventario.secuencias import reservar_bloque
+from . import anonimo, cache_catalogo, payments, resumen
+from .payments import ClienteWebpay, WebpayError
+from .models import Carrito, ItemCarrito, Pedido
+from .webpay_local import WebpayLocal
+
+
+class RetornoPagoConcurrenteTest(TransactionTestCase):
+    """
+    El retorno de Webpay repetido a la vez (recarga, doble redireccion) registra
+    una sola venta y descuenta el stock una sola vez. Usa el Webpay local.
+    """
+
+    HILOS = 6
+
+    def setUp(self):
+        self.webpay = WebpayLocal(latencia=0.05).start()
+        self.addCleanup(self.webpay.stop)
+        # Cliente Webpay nuevo, apuntando al servidor local
+        configuracion = override_settings(TRANSBANK_URL=self.webpay.url)
+        configuracion.enable()
+        self.addCleanup(configuracion.disable)
+        cliente_nuevo = mock.patch.object(payments, '_cliente', None)
+        cliente_nuevo.start()
+        self.addCleanup(cliente_nuevo.stop)
+
+        self.usuario = User.objects.create_user('comprador', password='clave12345')
+        categoria = Categoria.objects.create(nombre='Sobres')
+        self.producto = Producto.objects.create(nombre='Sobre Pokémon', categoria=categoria, precio=5000, stock=10)
+        carrito = Carrito.objects.create(usuario=self.usuario)
+        ItemCarrito.objects.create(carrito=carrito, producto=self.producto, cantidad=3)
+
+    def _cliente(self):
+        cliente = Client()
+        cliente.force_login(self.usuario)
+        return cliente
+
+    def _iniciar_pago(self):
+        """Crea el pedido y la transaccion en el Webpay local; retorna el token_ws"""
+        respuesta = self._cliente().get('/carrito/iniciar-pago/')
+        destino = urlsplit(respuesta['Location'])
+        self.assertEqual(f'{destino.scheme}://{destino.netloc}', self.webpay.url)
+        return parse_qs(destino.query)['token_ws'][0]
+
+    def test_retorno_en_paralelo_registra_una_venta(self):
+        token = self._iniciar_pago()
+        barrera = threading.Barrier(self.HILOS)
+        respuestas = []
+        errores = []
+
+        def volver_de_webpay():
+            try:
+                cliente = self._cliente()
+                barrera.wait()
+                respuestas.append(cliente.get('/carrito/pago/retorno/', {'token_ws': token}))
+            except Exception as e:
+                errores.append(e)
+            finally:
+                connection.close()
+
+        hilos = [threading.Thread(target=volver_de_webpay) for _ in range(self.HILOS)]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+        if errores:
+            raise errores[0]
+
+        pedido = Pedido.objects.get(token_ws=token)
+        self.assertEqual(pedido.estado, 'PAGADO')
+        self.assertEqual(Venta.objects.filter(canal='WEB').count(), 1)
+        self.assertEqual(pedido.venta.detalles.count(), 1)
+        self.assertEqual(MovimientoStock.objects.filter(producto=self.producto, tipo='VENTA').count(), 1)
+        self.producto.refresh_from_db()
+        self.assertEqual(self.producto.stock, 7)
+        self.assertEqual(self.producto.stock_reservado, 0)
+        self.assertFalse(ItemCarrito.objects.filter(carrito__usuario=self.usuario).exists())
+        # Todas las peticiones terminan en la pagina del pedido
+        self.assertEqual(
+            {respuesta['Location'] for respuesta in respuestas},
+            {f'/carrito/pedido-exitoso/{pedido.pk}/'},
+        )
+
+    def test_retorno_repetido_despues_del_pago(self):
+        token = self._iniciar_pago()
+        cliente = self._cliente()
+        cliente.get('/carrito/pago/retorno/', {'token_ws': token})
+        cliente.get('/carrito/pago/retorno/', {'token_ws': token})
+        self.assertEqual(Venta.objects.filter(canal='WEB').count(), 1)
+        self.producto.refresh_from_db()
+        self.assertEqual(self.producto.stock, 7)
+
+
+class ResumenCarritoTest(TestCase):
+    """El contador del carrito sigue los cambios de precio hechos en otro proceso"""
+
+    def setUp(self):
+        # La base se revierte entre pruebas: ni la version recordada ni lo guardado con ella valen
+        cache.clear()
+        resumen.VERSION_PRECIOS._valor = None
+        self.usuario = User.objects.create_user('comprador', password='clave12345')
+        categoria = Categoria.objects.create(nombre='Sobres')
+        self.producto = Producto.objects.create(nombre='Sobre Pokémon', categoria=categoria, precio=5000, stock=10)
+        carrito = Carrito.objects.create(usuario=self.usuario)
+        ItemCarrito.objects.create(carrito=carrito, producto=self.producto, cantidad=2)
+
+    def test_precio_cambiado_en_otro_proceso(self):
+        self.assertEqual(resumen.resumen_carrito(self.usuario)['total'], 10000)
+        # Otro proceso cambia el precio y sube la version en la base de datos
+        Producto.objects.filter(pk=self.producto.pk).update(precio=6000)
+        reservar_bloque(resumen.VERSION_PRECIOS.clave)
+        with mock.patch.object(resumen.VERSION_PRECIOS, 'segundos', 0):
+            self.assertEqual(resumen.resumen_carrito(self.usuario)['total'], 12000)
+
+    def test_cache_de_cada_proceso_guarda_poco(self):
+        self.assertEqual(resumen._duracion(), resumen.DURACION_LOCAL)
+
+
+class CatalogoCacheTest(TestCase):
+    """Las paginas del catalogo en cache siguen el stock, tambien si cambia en otro proceso"""
+
+    def setUp(self):
+        # La base se revierte entre pruebas: ni la version recordada ni lo guardado con ella valen
+        cache.clear()
+        cache_catalogo.VERSION._valor = None
+        categoria = Categoria.objects.create(nombre='Sobres')
+        self.producto = Producto.objects.create(nombre='Sobre Pokémon', categoria=categoria, precio=5000, stock=10)
+
+    def _catalogo(self):
+        return Client().get('/carrito/catalogo/').content.decode()
+
+    def test_venta_en_otro_proceso(self):
+        self.assertIn('Stock: 10', self._catalogo())
+        # Otro proceso vende y sube la version en la base de datos
+        Producto.objects.filter(pk=self.producto.pk).update(stock=9)
+        reservar_bloque(cache_catalogo.VERSION.clave)
+        with mock.patch.object(cache_catalogo.VERSION, 'segundos', 0):
+            self.assertIn('Stock: 9', self._catalogo())
+
+    def test_estado_segun_stock_disponible(self):
+        # 10 en bodega pero 8 reservados por pedidos web: quedan 2, el umbral critico
+        Producto.objects.filter(pk=self.producto.pk).update(stock_reservado=8)
+        self.assertIn('Últimas 2 unidades', self._catalogo())
+
+
+class CarritoAPITest(TestCase):
+    """API del carrito en bloque, carrito en cookie de los visitantes y su fusion al iniciar sesion"""
+
+    def setUp(self):
+        cache.clear()
+        resumen.VERSION_PRECIOS._valor = None
+        self.usuario = User.objects.create_user('comprador', password='clave12345')
+        categoria = Categoria.objects.create(nombre='Sobres')
+        # 5 en bodega, 1 reservado por un pedido web en pago: se pueden pedir 4
+        self.sobre = Producto.objects.create(nombre='Sobre', categoria=categoria, precio=5000, stock=5)
+        Producto.objects.filter(pk=self.sobre.pk).update(stock_reservado=1)
+        self.mazo = Producto.objects.create(nombre='Mazo', categoria=categoria, precio=15000, stock=10)
+
+    def _api(self, cliente, *operaciones):
+        return cliente.post('/carrito/api/', json.dumps({'operaciones': list(operaciones)}), content_type='application/json')
+
+    def _carrito(self):
+        return dict(ItemCarrito.objects.filter(carrito__usuario=self.usuario).values_list('producto_id', 'cantidad'))
+
+    def test_operaciones_en_bloque_limitadas_al_stock(self):
+        cliente = Client()
+        cliente.force_login(self.usuario)
+        respuesta = self._api(cliente, {'producto': self.sobre.pk, 'cantidad': 3}, {'producto': self.mazo.pk, 'sumar': 2})
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual((respuesta.json()['cantidad'], respuesta.json()['total']), (5, 45000))
+
+        # Pasar del disponible rechaza todo el bloque
+        respuesta = self._api(cliente, {'producto': self.mazo.pk, 'sumar': 1}, {'producto': self.sobre.pk, 'sumar': 2})
+        self.assertEqual(respuesta.status_code, 400)
+        self.assertIn('Stock disponible: 4', respuesta.json()['error'])
+        self.assertEqual(self._carrito(), {self.sobre.pk: 3, self.mazo.pk: 2})
+
+        respuesta = self._api(cliente, {'producto': self.sobre.pk, 'sumar': 1}, {'producto': self.mazo.pk, 'cantidad': 0})
+        self.assertEqual(respuesta.json()['items'][str(self.sobre.pk)], {'cantidad': 4, 'subtotal': 20000, 'disponible': 4})
+        self.assertEqual(self._carrito(), {self.sobre.pk: 4})
+
+    def test_cookie_alterada_se_ignora(self):
+        cliente = Client()
+        self._api(cliente, {'producto': self.mazo.pk, 'cantidad': 2})
+        firmada = cliente.cookies[anonimo.COOKIE].value
+        self.assertTrue(firmada.startswith(f'{self.mazo.pk}:2:'))
+        cliente.cookies[anonimo.COOKIE] = firmada.replace(f'{self.mazo.pk}:2', f'{self.mazo.pk}:9', 1)
+        respuesta = self._api(cliente, {'producto': self.sobre.pk, 'cantidad': 1})
+        self.assertEqual((respuesta.json()['cantidad'], respuesta.json()['total']), (1, 5000))
+
+    def test_cookie_se_fusiona_al_iniciar_sesion(self):
+        carrito = Carrito.objects.create(usuario=self.usuario)
+        ItemCarrito.objects.create(carrito=carrito, producto=self.sobre, cantidad=2)
+        cliente = Client()
+        self._api(cliente, {'producto': self.sobre.pk, 'cantidad': 4}, {'producto': self.mazo.pk, 'cantidad': 2})
+
+        respuesta = cliente.post('/accounts/login/', {'username': 'comprador', 'password': 'clave12345'})
+        self.assertRedirects(respuesta, '/carrito/', fetch_redirect_response=False)
+        # 2 + 4 del sobre quedan en las 4 disponibles
+        self.assertEqual(self._carrito(), {self.sobre.pk: 4, self.mazo.pk: 2})
+        self.assertEqual(cliente.cookies[anonimo.COOKIE].value, '')
+
+
+class ClienteWebpayTest(SimpleTestCase):
+    """create y commit nunca se repiten si Webpay pudo haberlos procesado"""
+
+    def setUp(self):
+        self.webpay = WebpayLocal().start()
+        self.addCleanup(self.webpay.stop)
+        self.cliente = ClienteWebpay(payments._opciones(), url_base=self.webpay.url, reintentos=2)
+
+    def _crear(self):
+        return self.cliente.create('PED-PRUEBA-0001', 'sesion', 5000, 'http://testserver/carrito/pago/retorno/')
+
+    def test_create_con_502_no_se_repite(self):
+        self.webpay.error_despues = 502
+        with self.assertRaises(WebpayError):
+            self._crear()
+        self.assertEqual(len(self.webpay.transacciones), 1)
+
+    def test_commit_con_502_consulta_el_estado(self):
+        token = self._crear()['token']
+        self.webpay.error_despues = 502
+        respuesta = self.cliente.commit(token)
+        self.assertEqual(respuesta['status'], 'AUTHORIZED')
+        self.assertEqual(respuesta['buy_order'], 'PED-PRUEBA-0001')
+
+    def test_commit_repetido_entrega_el_estado(self):
+        token = self._crear()['token']
+        self.assertEqual(self.cliente.commit(token)['status'], 'AUTHORIZED')
+        self.assertEqual(self.cliente.commit(token)['status'], 'AUTHORIZED')
+
+    def test_cualquier_2xx_es_exito(self):
+        for estado in (200, 201, 204, 299):
+            respuesta = requests.Response()
+            respuesta.status_code = estado
+            respuesta._content = b''
+            with self.subTest(estado=estado), mock.patch.object(self.cliente.sesion, 'request', return_value=respuesta):
+                self.assertEqual(self.cliente._llamar('GET', '/ruta'), {})
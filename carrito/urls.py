@@ -11,6 +11,7 @@ urlpatterns = [
     path('incrementar/<int:item_id>/', views.incrementar_item, name='incrementar_item'),
     path('disminuir/<int:item_id>/', views.disminuir_item, name='disminuir_item'),
     path('vaciar/', views.vaciar_carrito, name='vaciar_carrito'),
+    path('api/', views.api_carrito, name='api_carrito'),
     path('confirmar/', views.confirmar_pedido, name='confirmar_pedido'),
     
     # Proceso de pago
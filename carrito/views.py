@@ -1,23 +1,39 @@
-from django.shortcuts import render, redirect, get_object_or_404
+import json
+import logging
+
+from asgiref.sync import sync_to_async
+from django.shortcuts import render, redirect, get_object_or_404, aget_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.utils import timezone
 from django.db.models import Q
+from django.http import JsonResponse
 from .models import Carrito, ItemCarrito
-from inventario.models import Producto, Categoria, Subcategoria
+from inventario import taxonomia
+from inventario.models import Producto
+from inventario.busqueda import buscar_productos
+from inventario.paginacion import es_parcial, paginar_keyset, respuesta_parcial
 from decimal import Decimal
-from transbank.webpay.webpay_plus.transaction import Transaction
-from transbank.common.options import WebpayOptions
-from transbank.common.integration_type import IntegrationType
 from django.conf import settings
-from .models import Pedido, DetallePedido
-from inventario.models import Venta, DetalleVenta, MovimientoStock
+from django.core.cache import cache
+from .models import Pedido
+from . import anonimo, cache_catalogo
+from .operaciones import CarritoError, aplicar_operaciones, aplicar_operaciones_anonimo, leer_operaciones
+from .pedidos import aconfirmar_pago, anular_pago, crear_pedido
+from .reservas import ReservaError, liberar
+
+logger = logging.getLogger(__name__)
 
 def catalogo_productos(request):
     """Catálogo público de productos para clientes (con filtros)"""
-    productos = Producto.objects.filter(activo=True, stock__gt=0).select_related('categoria', 'subcategoria')
-    categorias = Categoria.objects.filter(activo=True)
-    subcategorias = Subcategoria.objects.filter(activo=True)
+    # Paginas ya renderizadas para visitantes sin sesion y scroll infinito (ver carrito/cache_catalogo.py)
+    parcial = es_parcial(request)
+    clave = cache_catalogo.clave(request, parcial)
+    if clave is not None:
+        guardada = cache.get(clave)
+        if guardada is not None:
+            return cache_catalogo.respuesta(request, guardada)
+
+    productos = Producto.objects.disponibles().select_related('categoria', 'subcategoria')
     
     # Filtros
     categoria_filtro = request.GET.get('categoria')
@@ -31,40 +47,67 @@ def catalogo_productos(request):
         productos = productos.filter(subcategoria_id=subcategoria_filtro)
     
     if busqueda:
-        productos = productos.filter(
-            Q(nombre__icontains=busqueda) | Q(codigo_sku__icontains=busqueda)
+        productos = buscar_productos(productos, busqueda)
+    
+    # Pagina actual (keyset); las siguientes llegan por scroll infinito
+    orden = ('-relevancia', 'codigo_sku') if busqueda else ('codigo_sku',)
+    pagina = paginar_keyset(request, productos, orden, tamano=24)
+    if parcial:
+        response = respuesta_parcial(
+            request,
+            'carrito/_tarjetas_catalogo.html',
+            {'productos': pagina.items, **cache_catalogo.contexto_tarjetas()},
+            pagina,
         )
+        if clave is not None:
+            cache_catalogo.guardar(clave, response)
+        return response
+    
+    # Filtros con la cantidad de productos disponibles, desde el cache (ver inventario/taxonomia.py)
+    conteos = taxonomia.facetas()
+    categorias = taxonomia.con_conteo(taxonomia.categorias_activas(), conteos['categorias'])
+    subcategorias = taxonomia.con_conteo(taxonomia.subcategorias_activas(), conteos['subcategorias'])
     
     # Estadísticas
     total_productos = productos.count()
     
-    # Contador de carrito
-    cantidad_carrito = 0
-    if request.user.is_authenticated:
-        try:
-            carrito = Carrito.objects.get(usuario=request.user)
-            cantidad_carrito = carrito.cantidad_items()
-        except Carrito.DoesNotExist:
-            pass
-    
     context = {
-        'productos': productos,
+        'productos': pagina.items,
+        'pagina': pagina,
         'categorias': categorias,
         'subcategorias': subcategorias,
         'total_productos': total_productos,
-        'cantidad_carrito': cantidad_carrito,
+        **cache_catalogo.contexto_tarjetas(),
     }
     
-    return render(request, 'carrito/catalogo.html', context)
+    if clave is None:
+        # Contador de carrito (desde el cache o la cookie, ver carrito/anonimo.py)
+        context['cantidad_carrito'] = anonimo.resumen_visitante(request)['cantidad']
+        return render(request, 'carrito/catalogo.html', context)
+    
+    # Pagina compartida: el token CSRF y el carrito del visitante se ponen al responder
+    response = render(request, 'carrito/catalogo.html', {**context, **cache_catalogo.CONTEXTO_COMPARTIDO})
+    cache_catalogo.guardar(clave, response)
+    return cache_catalogo.personalizar(request, response)
 
 
-@login_required
 def ver_carrito(request):
-    """Vista principal del carrito"""
-    carrito, created = Carrito.objects.get_or_create(usuario=request.user)
-    items = carrito.itemcarrito_set.select_related('producto').all()
+    """Vista principal del carrito (del usuario o, sin sesion, el de la cookie)"""
+    if request.user.is_authenticated:
+        carrito, created = Carrito.objects.get_or_create(usuario=request.user)
+        items = list(carrito.itemcarrito_set.select_related('producto'))
+    else:
+        carrito = None
+        cantidades = anonimo.leer(request)
+        productos = Producto.objects.select_related('categoria').in_bulk(list(cantidades))
+        # Items sin guardar, solo para mostrarlos
+        items = [
+            ItemCarrito(producto=productos[producto_id], cantidad=cantidad)
+            for producto_id, cantidad in cantidades.items() if producto_id in productos
+        ]
 
-    total = carrito.total()
+    # Los productos ya vienen cargados: el total no necesita otra consulta
+    total = sum((item.subtotal() for item in items), Decimal('0'))
     
     neto = int(total / Decimal('1.19'))
     iva = total - neto
@@ -81,87 +124,101 @@ def ver_carrito(request):
 
 
 def agregar_al_carrito(request, producto_id):
-    """Agregar un producto al carrito"""
+    """Agregar un producto al carrito (sin JavaScript; el catalogo usa api_carrito)"""
     producto = get_object_or_404(Producto, id=producto_id, activo=True)
-    carrito, created = Carrito.objects.get_or_create(usuario=request.user)
-    
-    # Verificar stock disponible
-    if producto.stock <= 0:
-        messages.error(request, f'El producto "{producto.nombre}" no tiene stock disponible')
-        return redirect(request.META.get('HTTP_REFERER', 'carrito:catalogo'))
-    
-    # Obtener o crear el item en el carrito
-    item, created = ItemCarrito.objects.get_or_create(
-        carrito=carrito,
-        producto=producto
-    )
-    
-    if not created:
-        # Si ya existe, verificar que no exceda el stock
-        if item.cantidad >= producto.stock:
-            messages.warning(request, f'No puedes agregar más unidades de "{producto.nombre}". Stock disponible: {producto.stock}')
-            return redirect(request.META.get('HTTP_REFERER', 'carrito:catalogo'))
-        
-        item.cantidad += 1
-        item.save()
+    response = redirect(request.META.get('HTTP_REFERER', 'carrito:catalogo'))
+    operaciones = [(producto.id, 'sumar', 1)]
+    try:
+        if request.user.is_authenticated:
+            resultado = aplicar_operaciones(request.user, operaciones)
+        else:
+            cantidades, resultado = aplicar_operaciones_anonimo(anonimo.leer(request), operaciones)
+            anonimo.guardar(response, cantidades)
+    except CarritoError as e:
+        messages.error(request, str(e))
+        return response
+    
+    if resultado['items'][producto.id]['cantidad'] > 1:
         messages.success(request, f'Se agregó otra unidad de "{producto.nombre}" al carrito')
     else:
         messages.success(request, f'"{producto.nombre}" agregado al carrito')
     
-    return redirect(request.META.get('HTTP_REFERER', 'carrito:catalogo'))
+    return response
 
 
 
+@login_required
 def eliminar_item(request, item_id):
     """Eliminar un item del carrito"""
-    item = get_object_or_404(ItemCarrito, id=item_id, carrito__usuario=request.user)
-    nombre_producto = item.producto.nombre
-    item.delete()
-    messages.success(request, f'"{nombre_producto}" eliminado del carrito')
+    item = get_object_or_404(ItemCarrito.objects.select_related('producto'), id=item_id, carrito__usuario=request.user)
+    aplicar_operaciones(request.user, [(item.producto_id, 'cantidad', 0)])
+    messages.success(request, f'"{item.producto.nombre}" eliminado del carrito')
     return redirect('carrito:ver_carrito')
 
 
 
+@login_required
 def incrementar_item(request, item_id):
     """Incrementar cantidad de un item"""
     item = get_object_or_404(ItemCarrito, id=item_id, carrito__usuario=request.user)
-    
-    # Verificar stock
-    if item.cantidad >= item.producto.stock:
-        messages.warning(request, f'No hay más stock disponible de "{item.producto.nombre}"')
-        return redirect('carrito:ver_carrito')
-    
-    item.cantidad += 1
-    item.save()
+    try:
+        aplicar_operaciones(request.user, [(item.producto_id, 'sumar', 1)])
+    except CarritoError as e:
+        messages.warning(request, str(e))
     return redirect('carrito:ver_carrito')
 
 
 @login_required
 def disminuir_item(request, item_id):
     """Disminuir cantidad de un item"""
-    item = get_object_or_404(ItemCarrito, id=item_id, carrito__usuario=request.user)
-    
-    if item.cantidad > 1:
-        item.cantidad -= 1
-        item.save()
-    else:
-        # Si llega a 0, eliminar el item
-        nombre_producto = item.producto.nombre
-        item.delete()
-        messages.info(request, f'"{nombre_producto}" eliminado del carrito')
+    item = get_object_or_404(ItemCarrito.objects.select_related('producto'), id=item_id, carrito__usuario=request.user)
+    aplicar_operaciones(request.user, [(item.producto_id, 'sumar', -1)])
+    if item.cantidad <= 1:
+        # Si llega a 0, se elimina el item
+        messages.info(request, f'"{item.producto.nombre}" eliminado del carrito')
     
     return redirect('carrito:ver_carrito')
 
 
+def api_carrito(request):
+    """
+    API JSON del carrito: aplica varios cambios de cantidad de una vez y
+    responde con los totales recalculados (ver carrito/operaciones.py).
+    
+    POST {"operaciones": [{"producto": 12, "cantidad": 3}, {"producto": 7, "sumar": -1}]}
+    """
+    if request.method != 'POST':
+        return JsonResponse({'success': False, 'error': 'Método no permitido'}, status=405)
+    
+    try:
+        operaciones = leer_operaciones(json.loads(request.body))
+        if request.user.is_authenticated:
+            return JsonResponse({'success': True, **aplicar_operaciones(request.user, operaciones)})
+        # Sin sesion el carrito vive en la cookie (ver carrito/anonimo.py)
+        cantidades, resultado = aplicar_operaciones_anonimo(anonimo.leer(request), operaciones)
+    except CarritoError as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=400)
+    except ValueError:
+        return JsonResponse({'success': False, 'error': 'JSON inválido'}, status=400)
+    
+    response = JsonResponse({'success': True, **resultado})
+    anonimo.guardar(response, cantidades)
+    return response
+
+
 
 def vaciar_carrito(request):
     """Vaciar todo el carrito"""
+    response = redirect('carrito:ver_carrito')
     if request.method == 'POST':
-        carrito = get_object_or_404(Carrito, usuario=request.user)
-        carrito.itemcarrito_set.all().delete()
+        if request.user.is_authenticated:
+            carrito = get_object_or_404(Carrito, usuario=request.user)
+            carrito.itemcarrito_set.all().delete()
+        else:
+            anonimo.guardar(response, {})
         messages.success(request, 'Carrito vaciado exitosamente')
     
-    return redirect('carrito:ver_carrito')
+    return response
 
 
 
@@ -169,15 +226,14 @@ def vaciar_carrito(request):
 def confirmar_pedido(request):
     """Vista de confirmación antes de pagar"""
     carrito = get_object_or_404(Carrito, usuario=request.user)
-    items = carrito.itemcarrito_set.select_related('producto').all()
+    items = list(carrito.itemcarrito_set.select_related('producto'))
     
-    if not items.exists():
+    if not items:
         messages.warning(request, 'Tu carrito está vacío')
         return redirect('carrito:ver_carrito')
     
     # Calcular totales
-    total = carrito.total()
-    from decimal import Decimal
+    total = sum((item.subtotal() for item in items), Decimal('0'))
     neto = int(total / Decimal('1.19'))
     iva = total - neto
     
@@ -191,188 +247,100 @@ def confirmar_pedido(request):
     return render(request, 'carrito/confirmar_pedido.html', context)
 
 @login_required
-def iniciar_pago(request):
-    """Iniciar proceso de pago con Transbank"""
-    carrito = get_object_or_404(Carrito, usuario=request.user)
-    items = carrito.itemcarrito_set.select_related('producto').all()
-    
-    if not items.exists():
+async def iniciar_pago(request):
+    """
+    Iniciar proceso de pago con Transbank. Es asincrona: mientras Webpay
+    responde no se ocupa un hilo de Django (ver carrito/payments.py)
+    """
+    usuario = await request.auser()
+    carrito = await aget_object_or_404(Carrito, usuario=usuario)
+    items = [item async for item in carrito.itemcarrito_set.select_related('producto')]
+    
+    if not items:
         messages.warning(request, 'Tu carrito está vacío')
         return redirect('carrito:ver_carrito')
     
-    # Verificar stock antes de iniciar pago
-    for item in items:
-        if item.cantidad > item.producto.stock:
-            messages.error(request, f'Stock insuficiente para {item.producto.nombre}. Disponible: {item.producto.stock}')
-            return redirect('carrito:ver_carrito')
+    try:
+        # Crear pedido pendiente y reservar el stock mientras se paga (si no alcanza no queda pedido)
+        pedido = await sync_to_async(crear_pedido)(usuario, items)
+    except ReservaError as e:
+        messages.error(request, str(e))
+        return redirect('carrito:ver_carrito')
     
     try:
-        # Crear pedido pendiente
-        pedido = Pedido.objects.create(
-            usuario=request.user,
-            estado='PENDIENTE'
-        )
-        
-        # Crear detalles del pedido
-        for item in items:
-            DetallePedido.objects.create(
-                pedido=pedido,
-                producto=item.producto,
-                cantidad=item.cantidad,
-                precio_unitario=item.producto.precio
-            )
-        
-        # Calcular totales
-        pedido.calcular_totales()
-        
-        # Configurar Transbank
-        if settings.TRANSBANK_ENVIRONMENT == 'TEST':
-            options = WebpayOptions(
-                commerce_code=settings.TRANSBANK_COMMERCE_CODE,
-                api_key=settings.TRANSBANK_API_KEY,
-                integration_type=IntegrationType.TEST
-            )
-        else:
-            options = WebpayOptions(
-                commerce_code=settings.TRANSBANK_COMMERCE_CODE,
-                api_key=settings.TRANSBANK_API_KEY,
-                integration_type=IntegrationType.LIVE
-            )
-        
-        tx = Transaction(options)
+        # Configurar Transbank (el SDK se carga recien aqui)
+        from .payments import cliente_webpay
+        tx = cliente_webpay()
         
         # Preparar datos de la transacción
         buy_order = pedido.numero_pedido
-        session_id = str(request.user.id)
+        session_id = str(usuario.id)
         amount = int(pedido.total)
         return_url = request.build_absolute_uri('/carrito/pago/retorno/')
         
         # Crear transacción en Transbank
-        response = tx.create(buy_order, session_id, amount, return_url)
+        response = await tx.acreate(buy_order, session_id, amount, return_url)
         
         # Guardar token en el pedido
         pedido.token_ws = response['token']
         pedido.buy_order = buy_order
-        pedido.save()
+        await pedido.asave(update_fields=['token_ws', 'buy_order'])
         
         # Redirigir a Webpay
         return redirect(f"{response['url']}?token_ws={response['token']}")
         
     except Exception as e:
+        # Webpay no creo la transaccion: devolver el stock reservado
+        await sync_to_async(liberar)(pedido)
+        pedido.estado = 'CANCELADO'
+        await pedido.asave(update_fields=['estado', 'reserva_expira'])
         messages.error(request, f'Error al iniciar el pago: {str(e)}')
         return redirect('carrito:ver_carrito')
 
 
 @login_required
-def retorno_pago(request):
-    """Procesar retorno desde Transbank"""
+async def retorno_pago(request):
+    """Procesar retorno desde Transbank (asincrona; se puede repetir sin registrar dos veces la venta)"""
+    usuario = await request.auser()
     token_ws = request.GET.get('token_ws')
     
+    # Pago anulado en el formulario de Webpay: llega TBK_TOKEN en vez de token_ws
+    tbk_token = request.GET.get('TBK_TOKEN')
+    if not token_ws and tbk_token:
+        await sync_to_async(anular_pago)(tbk_token, usuario)
+        messages.warning(request, 'El pago fue anulado. Tu carrito sigue disponible.')
+        return redirect('carrito:ver_carrito')
+    
     if not token_ws:
         messages.error(request, 'No se recibió confirmación de Transbank')
         return redirect('carrito:ver_carrito')
     
     try:
-        # Configurar Transbank
-        if settings.TRANSBANK_ENVIRONMENT == 'TEST':
-            options = WebpayOptions(
-                commerce_code=settings.TRANSBANK_COMMERCE_CODE,
-                api_key=settings.TRANSBANK_API_KEY,
-                integration_type=IntegrationType.TEST
-            )
-        else:
-            options = WebpayOptions(
-                commerce_code=settings.TRANSBANK_COMMERCE_CODE,
-                api_key=settings.TRANSBANK_API_KEY,
-                integration_type=IntegrationType.LIVE
-            )
-        
-        tx = Transaction(options)
-        response = tx.commit(token_ws)
-        
-        # Buscar el pedido
-        pedido = get_object_or_404(Pedido, token_ws=token_ws, usuario=request.user)
-        
-        # Verificar si la transacción fue exitosa
-        if response['status'] == 'AUTHORIZED':
-            # Guardar información de la transacción
-            pedido.estado = 'PAGADO'
-            pedido.fecha_pago = timezone.now()
-            pedido.transaction_date = response.get('transaction_date')
-            pedido.authorization_code = response.get('authorization_code')
-            pedido.payment_type_code = response.get('payment_type_code')
-            pedido.save()
-            
-            # CRÍTICO: Descontar stock y crear movimientos
-            detalles = pedido.detalles.select_related('producto').all()
-            
-            for detalle in detalles:
-                producto = detalle.producto
-                
-                # Verificar stock disponible antes de descontar
-                if producto.stock >= detalle.cantidad:
-                    stock_anterior = producto.stock
-                    producto.stock -= detalle.cantidad
-                    producto.save()
-                    
-                    # Registrar movimiento de stock
-                    MovimientoStock.objects.create(
-                        producto=producto,
-                        tipo='VENTA',
-                        cantidad=detalle.cantidad,
-                        stock_anterior=stock_anterior,
-                        stock_nuevo=producto.stock,
-                        motivo=f'Compra online - Pedido {pedido.numero_pedido}',
-                        observaciones=f'Venta realizada por sitio web. Cliente: {request.user.username}',
-                        usuario=None  # Sin vendedor (compra online)
-                    )
-                else:
-                    # Si no hay stock suficiente, registrar el problema pero continuar
-                    messages.warning(
-                        request, 
-                        f'ADVERTENCIA: Stock insuficiente para {producto.nombre}. '
-                        f'Se registró la venta pero revisa el inventario.'
-                    )
-            
-            # Crear venta en el sistema (para el historial de ventas)
-            venta = Venta.objects.create(
-                cliente_nombre=f"{request.user.username} (Compra Web)",
-                usuario=None,  # Sin vendedor
-                observaciones=f'Compra por sitio web - Pedido {pedido.numero_pedido}'
-            )
-            
-            # Crear detalles de venta
-            for detalle in detalles:
-                DetalleVenta.objects.create(
-                    venta=venta,
-                    producto=detalle.producto,
-                    cantidad=detalle.cantidad,
-                    precio_unitario=detalle.precio_unitario
-                )
-            
-            # Calcular totales de la venta
-            venta.calcular_totales()
-            
-            # Vaciar el carrito
-            carrito = Carrito.objects.filter(usuario=request.user).first()
-            if carrito:
-                carrito.itemcarrito_set.all().delete()
-            
-            messages.success(request, f'¡Pago exitoso! Tu pedido {pedido.numero_pedido} ha sido confirmado.')
-            return redirect('carrito:pedido_exitoso', pedido_id=pedido.id)
-        else:
-            pedido.estado = 'CANCELADO'
-            pedido.save()
-            messages.error(request, 'El pago no fue autorizado. Por favor, intenta nuevamente.')
-            return redirect('carrito:ver_carrito')
-            
+        # Configurar Transbank (el SDK se carga recien aqui)
+        from .payments import cliente_webpay
+        pedido, procesado, faltantes = await aconfirmar_pago(token_ws, usuario, cliente_webpay().acommit)
+    except Pedido.DoesNotExist:
+        messages.error(request, 'No se encontró el pedido asociado al pago')
+        return redirect('carrito:ver_carrito')
     except Exception as e:
+        logger.exception('Error al procesar el retorno de Webpay (token %s)', token_ws)
         messages.error(request, f'Error al procesar el pago: {str(e)}')
-        # Imprimir el error en consola para debugging
-        import traceback
-        print("ERROR EN RETORNO_PAGO:")
-        print(traceback.format_exc())
         return redirect('carrito:ver_carrito')
+    
+    if pedido.estado == 'CANCELADO':
+        messages.error(request, 'El pago no fue autorizado. Por favor, intenta nuevamente.')
+        return redirect('carrito:ver_carrito')
+    
+    if procesado:
+        for producto in faltantes:
+            # La reserva vencio y el stock se vendio entretanto: se registro la venta igual
+            messages.warning(
+                request, 
+                f'ADVERTENCIA: Stock insuficiente para {producto.nombre}. '
+                f'Se registró la venta pero revisa el inventario.'
+            )
+        messages.success(request, f'¡Pago exitoso! Tu pedido {pedido.numero_pedido} ha sido confirmado.')
+    return redirect('carrito:pedido_exitoso', pedido_id=pedido.id)
 
 
 @login_required
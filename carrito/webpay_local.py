@@ -0,0 +1,223 @@
+"""
+Servidor Webpay Plus local para pruebas y mediciones sin internet.
+
+Implementa las llamadas que usa carrito.payments (create, commit y status) con
+las mismas rutas, encabezados y formato de respuesta que Webpay, mas el
+formulario de pago, que devuelve al comprador a la return_url del comercio con
+el token_ws como si hubiera pagado. El commit aprueba la compra (o la rechaza
+con `rechazar`) y, igual que Webpay, falla si se repite. Con `error_despues`
+(ej: 502) create y commit se procesan pero responden ese error, como un proxy
+que pierde la respuesta.
+
+Uso:
+    python manage.py webpay_local --puerto 8001 --latencia 150
+    # settings: TRANSBANK_URL = 'http://127.0.0.1:8001'
+
+o dentro de un test / script:
+    with WebpayLocal(latencia=0.05) as webpay:
+        cliente = ClienteWebpay(opciones, url_base=webpay.url)
+
+Solo usa la libreria estandar y no toca la base de datos.
+"""
+import json
+import re
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlencode, urlsplit
+
+RUTA_API = '/rswebpaytransaction/api/webpay/v1.2/transactions'
+RUTA_FORMULARIO = '/webpayserver/initTransaction'
+_TRANSACCION = re.compile(r'^' + re.escape(RUTA_API) + r'/(\w+)$')
+
+
+class _Manejador(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # Mantener la conexion abierta, como Webpay
+    disable_nagle_algorithm = True  # Encabezados y cuerpo salen en escrituras separadas
+
+    def log_message(self, formato, *args):
+        if self.server.webpay.verbose:
+            super().log_message(formato, *args)
+
+    def _responder(self, estado, datos=None, encabezados=None):
+        cuerpo = json.dumps(datos).encode('utf-8') if datos is not None else b''
+        self.send_response(estado)
+        if datos is not None:
+            self.send_header('Content-Type', 'application/json')
+        for nombre, valor in (encabezados or {}).items():
+            self.send_header(nombre, valor)
+        self.send_header('Content-Length', str(len(cuerpo)))
+        self.end_headers()
+        try:
+            self.wfile.write(cuerpo)
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # El cliente se canso de esperar (timeout)
+
+    def _cuerpo(self):
+        largo = int(self.headers.get('Content-Length') or 0)
+        if not largo:
+            return {}
+        try:
+            return json.loads(self.rfile.read(largo))
+        except ValueError:
+            return None
+
+    def _autorizado(self):
+        if self.headers.get('Tbk-Api-Key-Id') and self.headers.get('Tbk-Api-Key-Secret'):
+            return True
+        self._responder(401, {'error_message': 'Not Authorized'})
+        return False
+
+    def do_POST(self):
+        ruta = urlsplit(self.path).path
+        if ruta == RUTA_FORMULARIO:
+            return self._formulario()
+        if ruta != RUTA_API:
+            return self._responder(404, {'error_message': 'Not Found'})
+        datos = self._cuerpo()
+        if not self._autorizado():
+            return
+        if not datos or not all(datos.get(campo) for campo in ('buy_order', 'session_id', 'amount', 'return_url')):
+            return self._responder(422, {'error_message': 'buy_order, session_id, amount and return_url are required'})
+        self.server.webpay.esperar()
+        token = self.server.webpay.crear(datos)
+        if self.server.webpay.error_despues:
+            return self._responder(self.server.webpay.error_despues, {'error_message': 'Bad Gateway'})
+        self._responder(200, {'token': token, 'url': self.server.webpay.url + RUTA_FORMULARIO})
+
+    def do_PUT(self):
+        coincidencia = _TRANSACCION.match(urlsplit(self.path).path)
+        self._cuerpo()
+        if not coincidencia:
+            return self._responder(404, {'error_message': 'Not Found'})
+        if not self._autorizado():
+            return
+        self.server.webpay.esperar()
+        estado, datos = self.server.webpay.confirmar(coincidencia.group(1))
+        if self.server.webpay.error_despues:
+            return self._responder(self.server.webpay.error_despues, {'error_message': 'Bad Gateway'})
+        self._responder(estado, datos)
+
+    def do_GET(self):
+        ruta = urlsplit(self.path).path
+        if ruta == RUTA_FORMULARIO:
+            return self._formulario()
+        coincidencia = _TRANSACCION.match(ruta)
+        if not coincidencia:
+            return self._responder(404, {'error_message': 'Not Found'})
+        if not self._autorizado():
+            return
+        self.server.webpay.esperar()
+        estado, datos = self.server.webpay.estado(coincidencia.group(1))
+        self._responder(estado, datos)
+
+    def _formulario(self):
+        """El comprador 'paga' y vuelve al comercio con el token"""
+        parametros = parse_qs(urlsplit(self.path).query)
+        cuerpo = self.rfile.read(int(self.headers.get('Content-Length') or 0)).decode('utf-8')
+        parametros.update(parse_qs(cuerpo))
+        token = (parametros.get('token_ws') or [''])[0]
+        transaccion = self.server.webpay.transacciones.get(token)
+        if transaccion is None:
+            return self._responder(404, {'error_message': 'Transaction not found'})
+        destino = f"{transaccion['return_url']}?{urlencode({'token_ws': token})}"
+        self._responder(302, encabezados={'Location': destino})
+
+
+class WebpayLocal:
+    """Servidor Webpay Plus de prueba que corre en un hilo"""
+
+    def __init__(self, host='127.0.0.1', puerto=0, latencia=0.0, rechazar=False, error_despues=None, verbose=False):
+        self.latencia = latencia
+        self.rechazar = rechazar
+        self.error_despues = error_despues
+        self.verbose = verbose
+        self.transacciones = {}
+        self._lock = threading.Lock()
+        self._servidor = ThreadingHTTPServer((host, puerto), _Manejador)
+        self._servidor.daemon_threads = True
+        self._servidor.webpay = self
+        self._hilo = None
+
+    @property
+    def url(self):
+        host, puerto = self._servidor.server_address[:2]
+        return f'http://{host}:{puerto}'
+
+    def esperar(self):
+        """Simula el tiempo de respuesta de Webpay"""
+        if self.latencia:
+            time.sleep(self.latencia)
+
+    def crear(self, datos):
+        token = uuid.uuid4().hex + uuid.uuid4().hex
+        with self._lock:
+            self.transacciones[token] = {
+                'buy_order': datos['buy_order'],
+                'session_id': datos['session_id'],
+                'amount': int(float(datos['amount'])),
+                'return_url': datos['return_url'],
+                'status': 'INITIALIZED',
+            }
+        return token
+
+    def _detalle(self, transaccion):
+        aprobada = transaccion['status'] == 'AUTHORIZED'
+        return {
+            'vci': 'TSY' if aprobada else 'TSN',
+            'amount': transaccion['amount'],
+            'status': transaccion['status'],
+            'buy_order': transaccion['buy_order'],
+            'session_id': transaccion['session_id'],
+            'card_detail': {'card_number': '6623'},
+            'accounting_date': transaccion.get('accounting_date'),
+            'transaction_date': transaccion.get('transaction_date'),
+            'authorization_code': '1213' if aprobada else '000000',
+            'payment_type_code': 'VN',
+            'response_code': 0 if aprobada else -1,
+            'installments_number': 0,
+        }
+
+    def confirmar(self, token):
+        with self._lock:
+            transaccion = self.transacciones.get(token)
+            if transaccion is None:
+                return 422, {'error_message': 'Transaction not found'}
+            if transaccion['status'] != 'INITIALIZED':
+                # Webpay no permite confirmar dos veces
+                return 422, {'error_message': "Invalid status '2' for transaction while authorizing"}
+            ahora = datetime.now(timezone.utc)
+            transaccion['status'] = 'FAILED' if self.rechazar else 'AUTHORIZED'
+            transaccion['transaction_date'] = ahora.strftime('%Y-%m-%dT%H:%M:%S.') + f'{ahora.microsecond // 1000:03d}Z'
+            transaccion['accounting_date'] = ahora.strftime('%m%d')
+            return 200, self._detalle(transaccion)
+
+    def estado(self, token):
+        with self._lock:
+            transaccion = self.transacciones.get(token)
+            if transaccion is None:
+                return 422, {'error_message': 'Transaction not found'}
+            return 200, self._detalle(transaccion)
+
+    def start(self):
+        self._hilo = threading.Thread(target=self._servidor.serve_forever, daemon=True)
+        self._hilo.start()
+        return self
+
+    def serve_forever(self):
+        self._servidor.serve_forever()
+
+    def stop(self):
+        if self._hilo is not None:
+            self._servidor.shutdown()
+            self._hilo.join()
+            self._hilo = None
+        self._servidor.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
@@ -1,6 +1,6 @@
 from django.contrib import admin
 from django.utils.html import format_html
-from .models import Categoria, Subcategoria, Producto, MovimientoStock, Venta, DetalleVenta
+from .models import Categoria, Subcategoria, Producto, MovimientoStock, Venta, DetalleVenta, Secuencia, ResumenVentasDiario, TareaImportacion
 
 @admin.register(Categoria)
 class CategoriaAdmin(admin.ModelAdmin):
@@ -16,10 +16,10 @@ class SubcategoriaAdmin(admin.ModelAdmin):
     
 @admin.register(Producto)
 class ProductoAdmin(admin.ModelAdmin):
-    list_display = ['codigo_sku', 'imagen_preview', 'nombre', 'categoria', 'subcategoria', 'precio', 'stock', 'activo']
+    list_display = ['codigo_sku', 'imagen_preview', 'nombre', 'categoria', 'subcategoria', 'precio', 'stock', 'stock_reservado', 'activo']
     list_filter = ['categoria', 'subcategoria', 'activo']
     search_fields = ['codigo_sku', 'nombre']
-    readonly_fields = ['codigo_sku', 'fecha_creacion', 'fecha_modificacion', 'imagen_preview_large']
+    readonly_fields = ['codigo_sku', 'stock_reservado', 'fecha_creacion', 'fecha_modificacion', 'imagen_preview_large']
     
     fieldsets = (
         ('Información Básica', {
@@ -30,7 +30,7 @@ class ProductoAdmin(admin.ModelAdmin):
             'description': 'Suba una imagen del producto (JPG o PNG recomendado)'
         }),
         ('Precios y Stock', {
-            'fields': ('precio', 'stock', 'stock_minimo', 'stock_critico')
+            'fields': ('precio', 'stock', 'stock_reservado', 'stock_minimo', 'stock_critico')
         }),
         ('Estado', {
             'fields': ('activo',)
@@ -87,8 +87,8 @@ class DetalleVentaInline(admin.TabularInline):
 
 @admin.register(Venta)
 class VentaAdmin(admin.ModelAdmin):
-    list_display = ['folio', 'fecha_venta', 'cliente_nombre', 'subtotal', 'total', 'estado', 'usuario']
-    list_filter = ['estado', 'fecha_venta']
+    list_display = ['folio', 'fecha_venta', 'cliente_nombre', 'subtotal', 'total', 'estado', 'canal', 'usuario']
+    list_filter = ['estado', 'canal', 'fecha_venta']
     search_fields = ['folio', 'cliente_nombre']
     readonly_fields = ['folio', 'fecha_venta', 'subtotal', 'total']
     inlines = [DetalleVentaInline]
@@ -114,4 +114,24 @@ class DetalleVentaAdmin(admin.ModelAdmin):
     list_display = ['venta', 'producto', 'cantidad', 'precio_unitario', 'subtotal']
     list_filter = ['venta__fecha_venta']
     search_fields = ['venta__folio', 'producto__nombre']
-    readonly_fields = ['subtotal']
\ No newline at end of file
+    readonly_fields = ['subtotal']
+
+@admin.register(Secuencia)
+class SecuenciaAdmin(admin.ModelAdmin):
+    list_display = ['clave', 'valor']
+    search_fields = ['clave']
+
+
+@admin.register(ResumenVentasDiario)
+class ResumenVentasDiarioAdmin(admin.ModelAdmin):
+    list_display = ['fecha', 'usuario', 'canal', 'estado', 'cantidad', 'total']
+    list_filter = ['canal', 'estado', 'fecha']
+    date_hierarchy = 'fecha'
+
+
+@admin.register(TareaImportacion)
+class TareaImportacionAdmin(admin.ModelAdmin):
+    list_display = ['nombre_archivo', 'usuario', 'estado', 'filas_procesadas', 'filas_fallidas', 'fecha_creacion', 'fecha_fin']
+    list_filter = ['estado', 'fecha_creacion']
+    search_fields = ['nombre_archivo', 'usuario__username']
+    readonly_fields = ['fecha_creacion', 'fecha_inicio', 'fecha_fin', 'fecha_avance']
@@ -0,0 +1,327 @@
+"""
+Busqueda de texto sobre el catalogo de productos.
+
+`buscar_productos(queryset, texto)` filtra un queryset de Producto y lo ordena
+por relevancia usando el motor disponible en la base de datos:
+
+- SQLite: tabla virtual FTS5 `inventario_producto_fts` (nombre, descripcion,
+  SKU, categoria y franquicia), mantenida por triggers, asi que tambien queda
+  al dia con bulk_create() y update().
+- PostgreSQL: columna tsvector en español `busqueda_documento` (nombre, SKU,
+  categoria, franquicia y descripcion) con indice GIN, mantenida por triggers
+  igual que la tabla FTS5.
+- Basica: icontains sobre nombre y SKU (el comportamiento original).
+
+El motor se elige con el setting BUSQUEDA_PRODUCTOS_BACKEND
+('auto', 'sqlite_fts', 'postgres' o 'basica').
+"""
+from django.conf import settings
+from django.db import connection
+from django.db import models
+from django.db.models import BooleanField, F, FloatField, Func, Lookup, Q, Value
+from django.db.models.expressions import RawSQL
+
+from .indice_pos import tokenizar
+
+TABLA_FTS = 'inventario_producto_fts'
+
+
+class CampoFTS(models.TextField):
+    """Columna oculta de una tabla FTS5 (la que lleva el nombre de la tabla)"""
+
+
+@CampoFTS.register_lookup
+class Coincide(Lookup):
+    """documento__coincide='"pok"*' -> tabla MATCH '"pok"*'"""
+    lookup_name = 'coincide'
+
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return f'{lhs} MATCH {rhs}', lhs_params + rhs_params
+
+
+def sin_resultados(queryset):
+    return queryset.none().annotate(relevancia=Value(0.0, output_field=FloatField()))
+
+
+class BusquedaBasica:
+    """icontains sobre nombre y SKU (sin indice, recorre toda la tabla)"""
+    nombre = 'basica'
+
+    def buscar(self, queryset, texto):
+        return queryset.filter(
+            Q(nombre__icontains=texto) | Q(codigo_sku__icontains=texto)
+        ).annotate(relevancia=Value(0.0, output_field=FloatField()))
+
+    def instalar(self, conexion):
+        pass
+
+    def desinstalar(self, conexion):
+        pass
+
+    def reconstruir(self, conexion):
+        pass
+
+
+class BusquedaSQLite:
+    """Tabla virtual FTS5 con prefijos indexados y ranking BM25"""
+    nombre = 'sqlite_fts'
+
+    # Pesos BM25 por columna: nombre, descripcion, sku, categoria, subcategoria
+    PESOS = '10.0, 1.0, 5.0, 2.0, 2.0'
+
+    SQL_INSTALAR = [
+        f"""
+        CREATE VIRTUAL TABLE IF NOT EXISTS {TABLA_FTS} USING fts5(
+            nombre, descripcion, codigo_sku, categoria, subcategoria,
+            tokenize = 'unicode61 remove_diacritics 2',
+            prefix = '2 3'
+        )
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS inventario_producto_fts_ai
+        AFTER INSERT ON inventario_producto BEGIN
+            INSERT INTO {TABLA_FTS}(rowid, nombre, descripcion, codigo_sku, categoria, subcategoria)
+            VALUES (
+                new.id, new.nombre, COALESCE(new.descripcion, ''), new.codigo_sku,
+                (SELECT nombre FROM inventario_categoria WHERE id = new.categoria_id),
+                COALESCE((SELECT nombre FROM inventario_subcategoria WHERE id = new.subcategoria_id), '')
+            );
+        END
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS inventario_producto_fts_au
+        AFTER UPDATE OF nombre, descripcion, codigo_sku, categoria_id, subcategoria_id
+        ON inventario_producto BEGIN
+            DELETE FROM {TABLA_FTS} WHERE rowid = old.id;
+            INSERT INTO {TABLA_FTS}(rowid, nombre, descripcion, codigo_sku, categoria, subcategoria)
+            VALUES (
+                new.id, new.nombre, COALESCE(new.descripcion, ''), new.codigo_sku,
+                (SELECT nombre FROM inventario_categoria WHERE id = new.categoria_id),
+                COALESCE((SELECT nombre FROM inventario_subcategoria WHERE id = new.subcategoria_id), '')
+            );
+        END
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS inventario_producto_fts_ad
+        AFTER DELETE ON inventario_producto BEGIN
+            DELETE FROM {TABLA_FTS} WHERE rowid = old.id;
+        END
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS inventario_categoria_fts_au
+        AFTER UPDATE OF nombre ON inventario_categoria BEGIN
+            UPDATE {TABLA_FTS} SET categoria = new.nombre
+            WHERE rowid IN (SELECT id FROM inventario_producto WHERE categoria_id = new.id);
+        END
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS inventario_subcategoria_fts_au
+        AFTER UPDATE OF nombre ON inventario_subcategoria BEGIN
+            UPDATE {TABLA_FTS} SET subcategoria = new.nombre
+            WHERE rowid IN (SELECT id FROM inventario_producto WHERE subcategoria_id = new.id);
+        END
+        """,
+    ]
+
+    SQL_RECONSTRUIR = [
+        f"DELETE FROM {TABLA_FTS}",
+        f"""
+        INSERT INTO {TABLA_FTS}(rowid, nombre, descripcion, codigo_sku, categoria, subcategoria)
+        SELECT p.id, p.nombre, COALESCE(p.descripcion, ''), p.codigo_sku, c.nombre, COALESCE(s.nombre, '')
+        FROM inventario_producto p
+        JOIN inventario_categoria c ON c.id = p.categoria_id
+        LEFT JOIN inventario_subcategoria s ON s.id = p.subcategoria_id
+        """,
+        f"INSERT INTO {TABLA_FTS}({TABLA_FTS}) VALUES ('optimize')",
+    ]
+
+    def _expresion(self, texto):
+        # Cada palabra como prefijo: "pok"* "esc"* (todas deben aparecer)
+        return ' '.join(f'"{token}"*' for token in tokenizar(texto))
+
+    def buscar(self, queryset, texto):
+        expresion = self._expresion(texto)
+        if not expresion:
+            return sin_resultados(queryset)
+        # JOIN con la tabla FTS (modelo ProductoBusqueda); bm25 es menor mientras
+        # mas relevante, se invierte para ordenar igual que en PostgreSQL
+        relevancia = Func(
+            F('busqueda__documento'),
+            function='bm25',
+            template=f'-%(function)s(%(expressions)s, {self.PESOS})',
+            output_field=FloatField(),
+        )
+        return queryset.filter(busqueda__documento__coincide=expresion).annotate(relevancia=relevancia)
+
+    def instalar(self, conexion):
+        with conexion.cursor() as cursor:
+            for sql in self.SQL_INSTALAR:
+                cursor.execute(sql)
+
+    def desinstalar(self, conexion):
+        with conexion.cursor() as cursor:
+            cursor.execute(f"DROP TABLE IF EXISTS {TABLA_FTS}")
+            for trigger in ('inventario_producto_fts_ai', 'inventario_producto_fts_au', 'inventario_producto_fts_ad',
+                            'inventario_categoria_fts_au', 'inventario_subcategoria_fts_au'):
+                cursor.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+
+    def reconstruir(self, conexion):
+        self.instalar(conexion)
+        with conexion.cursor() as cursor:
+            for sql in self.SQL_RECONSTRUIR:
+                cursor.execute(sql)
+
+
+class BusquedaPostgres:
+    """tsvector en español (columna mantenida por triggers) con indice GIN y ranking ts_rank"""
+    nombre = 'postgres'
+
+    # Columna fuera del modelo: la llenan los triggers, como la tabla FTS5 en SQLite
+    DOCUMENTO = 'inventario_producto.busqueda_documento'
+
+    # Pesos de ts_rank: A nombre, B SKU, C categoria y franquicia, D descripcion.
+    # Sin tildes, igual que las palabras de la consulta (tokenizar) y que FTS5
+    # con remove_diacritics, sin depender de la extension unaccent
+    SQL_INSTALAR = [
+        "ALTER TABLE inventario_producto ADD COLUMN IF NOT EXISTS busqueda_documento tsvector",
+        """
+        CREATE OR REPLACE FUNCTION inventario_busqueda_texto(texto text) RETURNS tsvector AS $$
+            SELECT to_tsvector('spanish'::regconfig, translate(
+                COALESCE(texto, ''), 'áéíóúüñÁÉÍÓÚÜÑàèìòùÀÈÌÒÙ', 'aeiouunAEIOUUNaeiouAEIOU'
+            ))
+        $$ LANGUAGE sql IMMUTABLE
+        """,
+        """
+        CREATE OR REPLACE FUNCTION inventario_producto_busqueda() RETURNS trigger AS $$
+        BEGIN
+            NEW.busqueda_documento :=
+                setweight(inventario_busqueda_texto(NEW.nombre), 'A') ||
+                setweight(inventario_busqueda_texto(NEW.codigo_sku), 'B') ||
+                setweight(inventario_busqueda_texto(
+                    COALESCE((SELECT nombre FROM inventario_categoria WHERE id = NEW.categoria_id), '') || ' ' ||
+                    COALESCE((SELECT nombre FROM inventario_subcategoria WHERE id = NEW.subcategoria_id), '')
+                ), 'C') ||
+                setweight(inventario_busqueda_texto(NEW.descripcion), 'D');
+            RETURN NEW;
+        END
+        $$ LANGUAGE plpgsql
+        """,
+        """
+        CREATE OR REPLACE FUNCTION inventario_taxonomia_busqueda() RETURNS trigger AS $$
+        BEGIN
+            -- Reasignar la misma categoria dispara el trigger de los productos
+            IF TG_TABLE_NAME = 'inventario_categoria' THEN
+                UPDATE inventario_producto SET categoria_id = categoria_id WHERE categoria_id = NEW.id;
+            ELSE
+                UPDATE inventario_producto SET subcategoria_id = subcategoria_id WHERE subcategoria_id = NEW.id;
+            END IF;
+            RETURN NULL;
+        END
+        $$ LANGUAGE plpgsql
+        """,
+        "DROP TRIGGER IF EXISTS inventario_producto_busqueda_biu ON inventario_producto",
+        """
+        CREATE TRIGGER inventario_producto_busqueda_biu
+        BEFORE INSERT OR UPDATE OF nombre, descripcion, codigo_sku, categoria_id, subcategoria_id
+        ON inventario_producto FOR EACH ROW EXECUTE FUNCTION inventario_producto_busqueda()
+        """,
+        "DROP TRIGGER IF EXISTS inventario_categoria_busqueda_au ON inventario_categoria",
+        """
+        CREATE TRIGGER inventario_categoria_busqueda_au
+        AFTER UPDATE OF nombre ON inventario_categoria
+        FOR EACH ROW EXECUTE FUNCTION inventario_taxonomia_busqueda()
+        """,
+        "DROP TRIGGER IF EXISTS inventario_subcategoria_busqueda_au ON inventario_subcategoria",
+        """
+        CREATE TRIGGER inventario_subcategoria_busqueda_au
+        AFTER UPDATE OF nombre ON inventario_subcategoria
+        FOR EACH ROW EXECUTE FUNCTION inventario_taxonomia_busqueda()
+        """,
+        "CREATE INDEX IF NOT EXISTS inventario_producto_busqueda_gin "
+        "ON inventario_producto USING GIN (busqueda_documento)",
+    ]
+
+    SQL_RECONSTRUIR = [
+        # El trigger recalcula la columna de cada producto
+        "UPDATE inventario_producto SET nombre = nombre",
+        "REINDEX INDEX inventario_producto_busqueda_gin",
+    ]
+
+    def _expresion(self, texto):
+        # Cada palabra como prefijo: pok:* & esc:*
+        return ' & '.join(f'{token}:*' for token in tokenizar(texto))
+
+    def buscar(self, queryset, texto):
+        expresion = self._expresion(texto)
+        if not expresion:
+            return sin_resultados(queryset)
+        consulta = "to_tsquery('spanish'::regconfig, %s)"
+        coincide = RawSQL(f"{self.DOCUMENTO} @@ {consulta}", [expresion], output_field=BooleanField())
+        relevancia = RawSQL(f"ts_rank({self.DOCUMENTO}, {consulta})", [expresion], output_field=FloatField())
+        return queryset.filter(coincide).annotate(relevancia=relevancia)
+
+    def instalar(self, conexion):
+        with conexion.cursor() as cursor:
+            for sql in self.SQL_INSTALAR:
+                cursor.execute(sql)
+
+    def desinstalar(self, conexion):
+        with conexion.cursor() as cursor:
+            cursor.execute('DROP TRIGGER IF EXISTS inventario_producto_busqueda_biu ON inventario_producto')
+            cursor.execute('DROP TRIGGER IF EXISTS inventario_categoria_busqueda_au ON inventario_categoria')
+            cursor.execute('DROP TRIGGER IF EXISTS inventario_subcategoria_busqueda_au ON inventario_subcategoria')
+            cursor.execute('DROP FUNCTION IF EXISTS inventario_producto_busqueda()')
+            cursor.execute('DROP FUNCTION IF EXISTS inventario_taxonomia_busqueda()')
+            cursor.execute('DROP FUNCTION IF EXISTS inventario_busqueda_texto(text)')
+            # Indice anterior (expresion sin categoria ni franquicia) o el de la columna
+            cursor.execute('DROP INDEX IF EXISTS inventario_producto_busqueda_gin')
+            cursor.execute('ALTER TABLE inventario_producto DROP COLUMN IF EXISTS busqueda_documento')
+
+    def reconstruir(self, conexion):
+        self.instalar(conexion)
+        with conexion.cursor() as cursor:
+            for sql in self.SQL_RECONSTRUIR:
+                cursor.execute(sql)
+
+
+MOTORES = {
+    'basica': BusquedaBasica,
+    'sqlite_fts': BusquedaSQLite,
+    'postgres': BusquedaPostgres,
+}
+
+_motor_actual = None
+
+
+def motor_para(conexion):
+    """Motor de busqueda segun el setting y el tipo de base de datos"""
+    nombre = getattr(settings, 'BUSQUEDA_PRODUCTOS_BACKEND', 'auto')
+    if nombre == 'auto':
+        if conexion.vendor == 'sqlite':
+            nombre = 'sqlite_fts'
+        elif conexion.vendor == 'postgresql':
+            nombre = 'postgres'
+        else:
+            nombre = 'basica'
+    return MOTORES[nombre]()
+
+
+def motor():
+    """Motor de la conexion por defecto (si la tabla FTS no existe se usa la basica)"""
+    global _motor_actual
+    if _motor_actual is None:
+        elegido = motor_para(connection)
+        if elegido.nombre == 'sqlite_fts' and TABLA_FTS not in connection.introspection.table_names():
+            elegido = BusquedaBasica()
+        _motor_actual = elegido
+    return _motor_actual
+
+
+def buscar_productos(queryset, texto):
+    """Filtra productos por texto, anotados con `relevancia` (mayor = mas relevante)"""
+    texto = (texto or '').strip()
+    if not texto:
+        return queryset
+    return motor().buscar(queryset, texto).order_by('-relevancia', 'codigo_sku')
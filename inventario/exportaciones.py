@@ -0,0 +1,178 @@
+"""
+Exportacion de ventas, movimientos de stock e inventario a CSV o Excel.
+
+Las filas se leen con values_list().iterator(chunk_size=...): la base de datos
+las entrega por bloques y nunca se cargan todas ni se crean instancias de
+modelos. En CSV cada fila se envia apenas se lee (StreamingHttpResponse), asi
+que la descarga empieza de inmediato aunque sea un año de ventas. En Excel,
+openpyxl en modo write_only escribe las filas a un archivo temporal sin
+guardarlas en memoria y el archivo se envia con FileResponse.
+"""
+import csv
+import tempfile
+from datetime import datetime, time, timedelta
+
+from django.http import FileResponse, StreamingHttpResponse
+from django.utils import timezone
+
+from .models import DetalleVenta, MovimientoStock, Producto
+
+TAMANO_BLOQUE = 2000
+
+COLUMNAS_VENTAS = [
+    ('venta__folio', 'Folio'),
+    ('venta__fecha_venta', 'Fecha'),
+    ('venta__estado', 'Estado'),
+    ('venta__canal', 'Canal'),
+    ('venta__usuario__username', 'Vendedor'),
+    ('venta__cliente_nombre', 'Cliente'),
+    ('producto__codigo_sku', 'SKU'),
+    ('producto__nombre', 'Producto'),
+    ('cantidad', 'Cantidad'),
+    ('precio_unitario', 'Precio unitario'),
+    ('subtotal', 'Subtotal linea'),
+    ('venta__subtotal', 'Neto venta'),
+    ('venta__iva', 'IVA venta'),
+    ('venta__total', 'Total venta'),
+]
+
+COLUMNAS_MOVIMIENTOS = [
+    ('fecha_movimiento', 'Fecha'),
+    ('producto__codigo_sku', 'SKU'),
+    ('producto__nombre', 'Producto'),
+    ('tipo', 'Tipo'),
+    ('cantidad', 'Cantidad'),
+    ('stock_anterior', 'Stock anterior'),
+    ('stock_nuevo', 'Stock nuevo'),
+    ('motivo', 'Motivo'),
+    ('observaciones', 'Observaciones'),
+    ('usuario__username', 'Usuario'),
+]
+
+COLUMNAS_PRODUCTOS = [
+    ('codigo_sku', 'SKU'),
+    ('nombre', 'Nombre'),
+    ('categoria__nombre', 'Categoria'),
+    ('subcategoria__nombre', 'Subcategoria'),
+    ('precio', 'Precio'),
+    ('stock', 'Stock'),
+    ('stock_minimo', 'Stock minimo'),
+    ('stock_critico', 'Stock critico'),
+    ('activo', 'Activo'),
+    ('fecha_modificacion', 'Ultima modificacion'),
+]
+
+
+def _inicio_del_dia(fecha):
+    return timezone.make_aware(datetime.combine(fecha, time.min))
+
+
+def _en_rango(queryset, campo, desde=None, hasta=None):
+    """Filtra `campo` entre las fechas `desde` y `hasta` (inclusive) usando el indice"""
+    if desde:
+        queryset = queryset.filter(**{f'{campo}__gte': _inicio_del_dia(desde)})
+    if hasta:
+        queryset = queryset.filter(**{f'{campo}__lt': _inicio_del_dia(hasta + timedelta(days=1))})
+    return queryset
+
+
+def _filas(queryset, columnas):
+    return queryset.values_list(*[campo for campo, _ in columnas]).iterator(chunk_size=TAMANO_BLOQUE)
+
+
+def filas_ventas(desde=None, hasta=None, estado=None, vendedor=None, canal=None):
+    """Una fila por producto vendido, con los datos de su venta"""
+    detalles = _en_rango(DetalleVenta.objects.all(), 'venta__fecha_venta', desde, hasta)
+    if estado:
+        detalles = detalles.filter(venta__estado=estado)
+    if vendedor:
+        detalles = detalles.filter(venta__usuario_id=vendedor)
+    if canal:
+        detalles = detalles.filter(venta__canal=canal)
+    detalles = detalles.order_by('venta__fecha_venta', 'venta_id', 'id')
+    return [titulo for _, titulo in COLUMNAS_VENTAS], _filas(detalles, COLUMNAS_VENTAS)
+
+
+def filas_movimientos(desde=None, hasta=None, tipo=None, usuario=None):
+    movimientos = _en_rango(MovimientoStock.objects.all(), 'fecha_movimiento', desde, hasta)
+    if tipo:
+        movimientos = movimientos.filter(tipo=tipo)
+    if usuario:
+        movimientos = movimientos.filter(usuario_id=usuario)
+    movimientos = movimientos.order_by('fecha_movimiento', 'id')
+    return [titulo for _, titulo in COLUMNAS_MOVIMIENTOS], _filas(movimientos, COLUMNAS_MOVIMIENTOS)
+
+
+def filas_productos(categoria=None, subcategoria=None, incluir_inactivos=False):
+    productos = Producto.objects.all() if incluir_inactivos else Producto.objects.filter(activo=True)
+    if categoria:
+        productos = productos.filter(categoria_id=categoria)
+    if subcategoria:
+        productos = productos.filter(subcategoria_id=subcategoria)
+    productos = productos.order_by('codigo_sku')
+    return [titulo for _, titulo in COLUMNAS_PRODUCTOS], _filas(productos, COLUMNAS_PRODUCTOS)
+
+
+def _valor(valor):
+    """Fechas en hora local y sin zona horaria (Excel no las admite)"""
+    if isinstance(valor, datetime):
+        return timezone.localtime(valor).replace(tzinfo=None) if timezone.is_aware(valor) else valor
+    return valor
+
+
+class _Eco:
+    """Buffer que devuelve lo escrito: csv.writer arma la linea y se envia tal cual"""
+
+    def write(self, valor):
+        return valor
+
+
+def respuesta_csv(nombre, encabezados, filas):
+    escritor = csv.writer(_Eco())
+
+    def lineas():
+        # BOM para que Excel reconozca los acentos al abrir el CSV
+        yield '\ufeff' + escritor.writerow(encabezados)
+        for fila in filas:
+            yield escritor.writerow([
+                valor.strftime('%Y-%m-%d %H:%M:%S') if isinstance(valor, datetime) else valor
+                for valor in map(_valor, fila)
+            ])
+
+    response = StreamingHttpResponse(lineas(), content_type='text/csv; charset=utf-8')
+    response['Content-Disposition'] = f'attachment; filename="{nombre}.csv"'
+    return response
+
+
+def respuesta_xlsx(nombre, encabezados, filas, titulo='Datos'):
+    from openpyxl import Workbook
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.styles import Font
+
+    libro = Workbook(write_only=True)
+    hoja = libro.create_sheet(titulo)
+    encabezado = []
+    for texto in encabezados:
+        celda = WriteOnlyCell(hoja, value=texto)
+        celda.font = Font(bold=True)
+        encabezado.append(celda)
+    hoja.append(encabezado)
+    for fila in filas:
+        hoja.append([_valor(valor) for valor in fila])
+
+    archivo = tempfile.TemporaryFile()
+    libro.save(archivo)
+    archivo.seek(0)
+    return FileResponse(
+        archivo,
+        as_attachment=True,
+        filename=f'{nombre}.xlsx',
+        content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    )
+
+
+def respuesta(formato, nombre, encabezados, filas, titulo='Datos'):
+    """Descarga en el formato pedido ('xlsx' o, por defecto, 'csv')"""
+    if formato == 'xlsx':
+        return respuesta_xlsx(nombre, encabezados, filas, titulo)
+    return respuesta_csv(nombre, encabezados, filas)
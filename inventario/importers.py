@@ -0,0 +1,622 @@
+"""
+Importacion masiva de productos y plantilla Excel.
+
+El archivo se lee fila a fila (modulo csv, u openpyxl en modo read_only para
+.xlsx), sin cargarlo completo en memoria, y se procesa en lotes de
+TAMANO_LOTE filas. Cada lote pasa a un DataFrame y se valida con operaciones
+por columna (mascaras, to_numeric, joins contra las tablas de categorias y de
+SKU existentes), sin recorrer las filas en Python; despues se escribe en su
+propia transaccion con bulk_create y UPDATE masivos. Asi un catalogo de 100
+mil filas usa memoria acotada y un numero de consultas proporcional a la
+cantidad de lotes, no de filas.
+
+Este modulo es el unico que carga openpyxl y pandas (pesados: cientos de ms y
+decenas de MB por proceso). Las vistas lo importan dentro de la funcion, asi que
+los workers no pagan ese costo hasta que alguien importa o descarga la plantilla.
+"""
+import csv
+import io
+import math
+
+import numpy as np
+import pandas as pd
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from openpyxl import Workbook, load_workbook
+from openpyxl.styles import Font, PatternFill
+
+from .models import Categoria, MovimientoStock, Producto, Subcategoria
+from .secuencias import sincronizar_codigos_sku
+from .signals import notificar_stock
+
+TAMANO_LOTE = 1000
+COLUMNAS_REQUERIDAS = ['codigo_sku', 'nombre', 'categoria', 'precio']
+COLUMNAS_TEXTO = ['codigo_sku', 'nombre', 'categoria', 'subcategoria', 'descripcion']
+# Columnas enteras opcionales y su valor por defecto
+COLUMNAS_ENTERAS = {'stock': 0, 'stock_minimo': 5, 'stock_critico': 2}
+
+ERROR_FORMATO = 'Error de formato en los datos. Revise que todas las columnas tengan el formato correcto.'
+
+
+class ImportacionError(Exception):
+    """El archivo no se puede importar (ej: faltan columnas requeridas)"""
+
+
+# ---- Lectura ----
+
+def _vacio(valor):
+    if valor is None:
+        return True
+    if isinstance(valor, float):
+        return math.isnan(valor)
+    return isinstance(valor, str) and not valor.strip()
+
+
+def _texto(valor):
+    """Texto de una celda ('' si esta vacia); 1234.0 de Excel -> '1234'"""
+    if _vacio(valor):
+        return ''
+    if isinstance(valor, float) and valor.is_integer():
+        valor = int(valor)
+    return str(valor).strip()
+
+
+def _leer_csv(archivo):
+    texto = io.TextIOWrapper(archivo, encoding='utf-8-sig', newline='')
+    muestra = texto.read(4096)
+    texto.seek(0)
+    try:
+        dialecto = csv.Sniffer().sniff(muestra, delimiters=',;')
+    except csv.Error:
+        dialecto = csv.excel
+    lector = csv.reader(texto, dialecto)
+    yield from lector
+
+
+def _leer_xlsx(archivo):
+    libro = load_workbook(archivo, read_only=True, data_only=True)
+    try:
+        yield from libro.active.iter_rows(values_only=True)
+    finally:
+        libro.close()
+
+
+def _leer_xls(archivo):
+    # Formato antiguo: openpyxl no lo lee, se usa pandas (carga la hoja completa)
+    import pandas as pd
+    df = pd.read_excel(archivo, dtype=object)
+    yield list(df.columns)
+    for fila in df.itertuples(index=False, name=None):
+        yield [None if _vacio(valor) else valor for valor in fila]
+
+
+def leer_filas(archivo):
+    """
+    Encabezados del archivo y un iterador de (numero de fila, valores), con los
+    valores ajustados a la cantidad de encabezados. Las filas vacias se omiten.
+    """
+    nombre = archivo.name.lower()
+    if nombre.endswith('.csv'):
+        filas = _leer_csv(archivo)
+    elif nombre.endswith('.xls'):
+        filas = _leer_xls(archivo)
+    else:
+        filas = _leer_xlsx(archivo)
+
+    encabezados = [_texto(columna) for columna in next(filas, [])]
+    ancho = len(encabezados)
+
+    def registros():
+        for fila_num, fila in enumerate(filas, start=2):
+            if all(_vacio(valor) for valor in fila):
+                continue
+            fila = list(fila[:ancho])
+            yield fila_num, fila + [None] * (ancho - len(fila))
+
+    return encabezados, registros()
+
+
+def lotes(registros, tamano=TAMANO_LOTE):
+    """Agrupa un iterador en listas de hasta `tamano` elementos"""
+    lote = []
+    for registro in registros:
+        lote.append(registro)
+        if len(lote) >= tamano:
+            yield lote
+            lote = []
+    if lote:
+        yield lote
+
+
+# ---- Validacion ----
+
+def _columna_texto(marco, columna):
+    if columna not in marco.columns:
+        return pd.Series('', index=marco.index, dtype=object)
+    return marco[columna].map(_texto).astype(object)
+
+
+def _normalizar(lote, encabezados):
+    """
+    DataFrame del lote indexado por numero de fila, con las columnas de texto
+    limpias y las numericas convertidas (NaN si el valor no es un numero).
+    """
+    marco = pd.DataFrame(
+        [valores for _, valores in lote],
+        index=[fila_num for fila_num, _ in lote],
+        columns=encabezados,
+        dtype=object,
+    )
+    # Encabezados repetidos: vale la primera columna
+    marco = marco.loc[:, ~marco.columns.duplicated()]
+
+    datos = pd.DataFrame({columna: _columna_texto(marco, columna) for columna in COLUMNAS_TEXTO})
+    precio = _columna_texto(marco, 'precio')
+    datos['falta_precio'] = precio == ''
+    datos['precio'] = pd.to_numeric(precio.where(~datos['falta_precio']), errors='coerce')
+
+    formato_invalido = pd.Series(False, index=marco.index)
+    for columna, defecto in COLUMNAS_ENTERAS.items():
+        texto = _columna_texto(marco, columna)
+        numero = pd.to_numeric(texto.where(texto != ''), errors='coerce')
+        formato_invalido |= (texto != '') & (numero.isna() | np.isinf(numero))
+        # int(float(valor)): trunca hacia cero
+        datos[columna] = np.trunc(numero.where(np.isfinite(numero), defecto)).astype('int64')
+    datos['formato_invalido'] = formato_invalido
+    return datos
+
+
+def _tablas_referencia():
+    """Nombre -> id de categorias y subcategorias, e id -> nombre para los mensajes"""
+    categorias = pd.DataFrame(list(Categoria.objects.values('id', 'nombre')), columns=['id', 'nombre'])
+    subcategorias = pd.DataFrame(list(Subcategoria.objects.values('id', 'nombre')), columns=['id', 'nombre'])
+    return {
+        'categorias': categorias.drop_duplicates('nombre').set_index('nombre')['id'],
+        'subcategorias': subcategorias.drop_duplicates('nombre').set_index('nombre')['id'],
+        'nombres_categoria': categorias.set_index('id')['nombre'],
+        'nombres_subcategoria': subcategorias.set_index('id')['nombre'],
+    }
+
+
+def _existentes(skus, bloquear=True):
+    """Productos existentes con esos SKU (bloqueados hasta el fin de la transaccion)"""
+    productos = Producto.objects.select_for_update() if bloquear else Producto.objects.all()
+    filas = (
+        productos
+        .filter(codigo_sku__in=skus)
+        .values_list('codigo_sku', 'id', 'nombre', 'categoria_id', 'subcategoria_id', 'stock')
+    )
+    columnas = ['codigo_sku', 'producto_id', 'nombre_registrado', 'categoria_registrada',
+                'subcategoria_registrada', 'stock_actual']
+    return pd.DataFrame(list(filas), columns=columnas).set_index('codigo_sku')
+
+
+def _validar_lote(datos, existentes, referencias):
+    """
+    Aplica las reglas de validacion como mascaras sobre todo el lote.
+
+    Retorna (validas, errores): `validas` son las filas que se pueden escribir,
+    con categoria_id, subcategoria_id y los datos del producto existente
+    (producto_id NaN si el SKU es nuevo); `errores` es una Serie con el mensaje
+    de cada fila rechazada (la primera regla que no cumple), indexada por fila.
+    """
+    errores = pd.Series(None, index=datos.index, dtype=object)
+
+    def rechazar(mascara, mensaje):
+        # `mensaje` es un texto o una funcion que arma los mensajes solo para las filas rechazadas
+        nuevas = mascara & errores.isna()
+        if nuevas.any():
+            filas = datos[nuevas]
+            texto = mensaje(filas) if callable(mensaje) else mensaje
+            errores[nuevas] = 'Fila ' + filas.index.astype(str).to_series(index=filas.index) + ': ' + texto
+
+    datos = datos.assign(
+        categoria_id=datos['categoria'].map(referencias['categorias']),
+        subcategoria_id=datos['subcategoria'].map(referencias['subcategorias']),
+    )
+
+    rechazar(datos['codigo_sku'] == '', 'Falta el código SKU del producto')
+    rechazar(datos['nombre'] == '', 'Falta el nombre del producto')
+    rechazar(datos['falta_precio'], 'Falta el precio del producto')
+    rechazar(datos['precio'].isna(), 'El precio tiene un formato inválido')
+    rechazar(datos['precio'] <= 0, 'El precio debe ser mayor a 0')
+    rechazar(datos['categoria'] == '', 'Falta la categoría del producto')
+    rechazar(
+        datos['categoria_id'].isna(),
+        lambda filas: "La categoría '" + filas['categoria']
+        + "' no existe en el sistema. Créela primero en el admin.",
+    )
+    rechazar(
+        (datos['subcategoria'] != '') & datos['subcategoria_id'].isna(),
+        lambda filas: "La subcategoría '" + filas['subcategoria']
+        + "' no existe en el sistema. Créela primero en el admin.",
+    )
+    rechazar(datos['formato_invalido'], ERROR_FORMATO)
+
+    # Conflictos de SKU contra lo registrado: el producto existente o, si el SKU
+    # es nuevo y se repite en el lote, la primera fila valida que lo trae
+    datos = datos.join(existentes, on='codigo_sku')
+    nuevas_con_sku = errores.isna() & datos['nombre_registrado'].isna()
+    if datos.loc[nuevas_con_sku, 'codigo_sku'].duplicated().any():
+        primeras = (
+            datos.loc[nuevas_con_sku, ['codigo_sku', 'nombre', 'categoria_id', 'subcategoria_id']]
+            .drop_duplicates('codigo_sku')
+            .set_index('codigo_sku')
+        )
+        repetidas = datos.loc[nuevas_con_sku, ['codigo_sku']].join(primeras, on='codigo_sku')
+        datos.loc[nuevas_con_sku, 'nombre_registrado'] = repetidas['nombre']
+        datos.loc[nuevas_con_sku, 'categoria_registrada'] = repetidas['categoria_id']
+        datos.loc[nuevas_con_sku, 'subcategoria_registrada'] = repetidas['subcategoria_id']
+
+    registrado = datos['nombre_registrado'].notna()
+    nombres_categoria = referencias['nombres_categoria']
+    nombres_subcategoria = referencias['nombres_subcategoria']
+    rechazar(
+        registrado & (datos['nombre'].str.lower() != datos['nombre_registrado'].str.lower()),
+        lambda filas: "El código SKU '" + filas['codigo_sku'] + "' ya existe con un producto diferente ('"
+        + filas['nombre_registrado'] + "'). No se puede usar el mismo SKU para productos distintos.",
+    )
+    rechazar(
+        registrado & (datos['categoria_id'] != datos['categoria_registrada']),
+        lambda filas: "El código SKU '" + filas['codigo_sku']
+        + "' existe pero con categoría diferente. SKU registrado: '"
+        + filas['categoria_registrada'].map(nombres_categoria).fillna('') + "', Excel: '"
+        + filas['categoria_id'].map(nombres_categoria).fillna('') + "'",
+    )
+    rechazar(
+        registrado & datos['subcategoria_registrada'].notna() & datos['subcategoria_id'].notna()
+        & (datos['subcategoria_id'] != datos['subcategoria_registrada']),
+        lambda filas: "El código SKU '" + filas['codigo_sku']
+        + "' existe pero con subcategoría diferente. SKU registrado: '"
+        + filas['subcategoria_registrada'].map(nombres_subcategoria).fillna('') + "', Excel: '"
+        + filas['subcategoria_id'].map(nombres_subcategoria).fillna('') + "'",
+    )
+
+    return datos[errores.isna()], errores.dropna()
+
+
+# ---- Escritura ----
+
+def _id(valor):
+    return None if pd.isna(valor) else int(valor)
+
+
+def _escribir_lote(validas, usuario):
+    """
+    Crea los productos nuevos y suma el stock de los existentes de un lote ya
+    validado. Retorna (productos_nuevos, productos_actualizados).
+    """
+    existente = validas['producto_id'].notna()
+
+    # SKU nuevos: un producto por SKU, con el stock de la primera fila mas las
+    # entradas positivas de las filas repetidas
+    nuevas = validas[~existente]
+    primera = ~nuevas['codigo_sku'].duplicated()
+    repetidas = nuevas[~primera]
+    extra = repetidas['stock'].clip(lower=0).groupby(repetidas['codigo_sku']).sum()
+    filas_nuevas = nuevas[primera]
+    stock_inicial = filas_nuevas['stock'] + filas_nuevas['codigo_sku'].map(extra).fillna(0).astype('int64')
+
+    nuevos = [
+        Producto(
+            codigo_sku=fila.codigo_sku,
+            nombre=fila.nombre,
+            categoria_id=int(fila.categoria_id),
+            subcategoria_id=_id(fila.subcategoria_id),
+            descripcion=fila.descripcion,
+            precio=fila.precio,
+            stock=int(stock),
+            stock_minimo=int(fila.stock_minimo),
+            stock_critico=int(fila.stock_critico),
+        )
+        for fila, stock in zip(filas_nuevas.itertuples(), stock_inicial)
+    ]
+    if nuevos:
+        # bulk_create no pasa por Producto.save(): los SKU MC-XXXX del archivo
+        # se registran en la secuencia para que no se vuelvan a generar
+        sincronizar_codigos_sku(producto.codigo_sku for producto in nuevos)
+        Producto.objects.bulk_create(nuevos)
+
+    # SKU existentes: un movimiento por fila, con el stock acumulado en orden de fila
+    entradas = validas[existente & (validas['stock'] > 0)]
+    stock_nuevo = entradas['stock_actual'] + entradas.groupby('producto_id')['stock'].cumsum()
+    movimientos = [
+        MovimientoStock(
+            producto_id=int(fila.producto_id),
+            tipo='ENTRADA',
+            cantidad=int(fila.stock),
+            stock_anterior=int(nuevo - fila.stock),
+            stock_nuevo=int(nuevo),
+            motivo='Importación masiva desde Excel',
+            observaciones=f'Importado desde archivo Excel - Fila {fila.Index}',
+            usuario=usuario,
+        )
+        for fila, nuevo in zip(entradas.itertuples(), stock_nuevo)
+    ]
+    if movimientos:
+        # Un UPDATE por cantidad distinta (los catalogos de proveedor suelen
+        # repetir pocas cantidades); bulk_update arma un CASE por fila y es
+        # mucho mas lento en Python para lotes grandes
+        por_producto = entradas.groupby('producto_id')['stock'].sum()
+        ahora = timezone.now()
+        for cantidad, ids in por_producto.groupby(por_producto).groups.items():
+            Producto.objects.filter(id__in=[int(producto_id) for producto_id in ids]).update(
+                stock=F('stock') + int(cantidad),
+                fecha_modificacion=ahora,
+            )
+        MovimientoStock.objects.bulk_create(movimientos)
+
+    notificar_stock(
+        [producto.pk for producto in nuevos]
+        + [int(producto_id) for producto_id in entradas['producto_id'].unique()]
+    )
+    return len(nuevos), len(movimientos)
+
+
+def _abrir(archivo):
+    """Encabezados y filas del archivo, validando que esten las columnas requeridas"""
+    encabezados, registros = leer_filas(archivo)
+
+    columnas_faltantes = [col for col in COLUMNAS_REQUERIDAS if col not in encabezados]
+    if columnas_faltantes:
+        raise ImportacionError(f'Faltan columnas requeridas: {", ".join(columnas_faltantes)}')
+    return encabezados, registros
+
+
+def importar_productos(archivo, usuario=None, tamano_lote=TAMANO_LOTE, progreso=None):
+    """
+    Crea los productos nuevos del archivo (.csv, .xlsx o .xls) y suma el stock de
+    los existentes. Retorna (productos_nuevos, productos_actualizados, errores).
+
+    `progreso(filas_procesadas, productos_nuevos, productos_actualizados, errores)`
+    se llama despues de escribir cada lote, con los acumulados hasta ese momento.
+    """
+    encabezados, registros = _abrir(archivo)
+
+    # Categorias y subcategorias una sola vez para todo el archivo
+    referencias = _tablas_referencia()
+
+    filas_procesadas = 0
+    productos_nuevos = 0
+    productos_actualizados = 0
+    errores = []
+
+    for lote in lotes(registros, tamano_lote):
+        datos = _normalizar(lote, encabezados)
+        skus = datos.loc[datos['codigo_sku'] != '', 'codigo_sku'].unique().tolist()
+        with transaction.atomic():
+            validas, errores_lote = _validar_lote(datos, _existentes(skus), referencias)
+            nuevos, actualizados = _escribir_lote(validas, usuario)
+        productos_nuevos += nuevos
+        productos_actualizados += actualizados
+        errores.extend(errores_lote.tolist())
+        filas_procesadas += len(lote)
+        if progreso:
+            progreso(filas_procesadas, productos_nuevos, productos_actualizados, errores)
+
+    return productos_nuevos, productos_actualizados, errores
+
+
+# ---- Simulacion (dry-run) ----
+
+def planificar_importacion(archivo, tamano_lote=TAMANO_LOTE, progreso=None):
+    """
+    Simula la importacion sin escribir nada. Retorna el plan (serializable a JSON):
+
+    - nuevos: productos a crear, uno por SKU (las filas repetidas suman su stock)
+    - entradas: stock a sumar por producto existente, sumando las filas repetidas
+    - errores: filas rechazadas, con los mismos mensajes de la importacion directa
+    - filas: filas procesadas del archivo
+
+    `progreso` se llama despues de cada lote igual que en importar_productos.
+    """
+    encabezados, registros = _abrir(archivo)
+    referencias = _tablas_referencia()
+    nombres_categoria = referencias['nombres_categoria']
+
+    # SKU -> producto nuevo; los SKU de lotes anteriores aun no existen en la
+    # base de datos, asi que se validan contra la primera fila que los trajo
+    pendientes = {}
+    entradas = {}
+    errores = []
+    filas_procesadas = 0
+
+    for lote in lotes(registros, tamano_lote):
+        datos = _normalizar(lote, encabezados)
+        skus = datos.loc[datos['codigo_sku'] != '', 'codigo_sku'].unique().tolist()
+        existentes = _existentes(skus, bloquear=False)
+        previos = [pendientes[sku] for sku in skus if sku in pendientes]
+        if previos:
+            existentes = pd.concat([existentes, pd.DataFrame({
+                'producto_id': np.nan,
+                'nombre_registrado': [producto['nombre'] for producto in previos],
+                'categoria_registrada': [producto['categoria_id'] for producto in previos],
+                'subcategoria_registrada': [producto['subcategoria_id'] for producto in previos],
+                'stock_actual': np.nan,
+            }, index=pd.Index([producto['codigo_sku'] for producto in previos], name='codigo_sku'))])
+
+        validas, errores_lote = _validar_lote(datos, existentes, referencias)
+        errores.extend(errores_lote.tolist())
+
+        # Stock a sumar a productos existentes, agrupado por producto
+        suma = validas[validas['producto_id'].notna() & (validas['stock'] > 0)]
+        agrupado = suma.assign(fila=suma.index).groupby('producto_id', sort=False).agg(
+            codigo_sku=('codigo_sku', 'first'),
+            nombre=('nombre_registrado', 'first'),
+            stock_actual=('stock_actual', 'first'),
+            cantidad=('stock', 'sum'),
+            filas=('fila', list),
+        )
+        for producto_id, fila in zip(agrupado.index, agrupado.itertuples()):
+            entrada = entradas.setdefault(int(producto_id), {
+                'producto_id': int(producto_id),
+                'codigo_sku': fila.codigo_sku,
+                'nombre': fila.nombre,
+                'stock_actual': int(fila.stock_actual),
+                'cantidad': 0,
+                'filas': [],
+            })
+            entrada['cantidad'] += int(fila.cantidad)
+            entrada['filas'].extend(int(numero) for numero in fila.filas)
+
+        # Productos nuevos; las filas con un SKU ya planificado solo suman stock
+        for fila in validas[validas['producto_id'].isna()].itertuples():
+            if fila.codigo_sku in pendientes:
+                if fila.stock > 0:
+                    pendientes[fila.codigo_sku]['stock'] += int(fila.stock)
+                    pendientes[fila.codigo_sku]['filas'].append(int(fila.Index))
+                continue
+            producto = {
+                'codigo_sku': fila.codigo_sku,
+                'nombre': fila.nombre,
+                'categoria_id': int(fila.categoria_id),
+                'categoria': nombres_categoria.get(int(fila.categoria_id), ''),
+                'subcategoria_id': _id(fila.subcategoria_id),
+                'descripcion': fila.descripcion,
+                'precio': float(fila.precio),
+                'stock': int(fila.stock),
+                'stock_minimo': int(fila.stock_minimo),
+                'stock_critico': int(fila.stock_critico),
+                'filas': [int(fila.Index)],
+            }
+            pendientes[fila.codigo_sku] = producto
+
+        filas_procesadas += len(lote)
+        if progreso:
+            progreso(filas_procesadas, len(pendientes), len(entradas), errores)
+
+    nuevos = sorted(pendientes.values(), key=lambda producto: producto['filas'][0])
+    return {
+        'nuevos': nuevos,
+        'entradas': list(entradas.values()),
+        'errores': errores,
+        'filas': filas_procesadas,
+    }
+
+
+def _filas_texto(filas, maximo=20):
+    texto = ', '.join(str(fila) for fila in filas[:maximo])
+    if len(filas) > maximo:
+        texto += f' y {len(filas) - maximo} más'
+    return texto
+
+
+def aplicar_plan(plan, usuario=None):
+    """
+    Aplica un plan de planificar_importacion en una sola transaccion: crea los
+    productos nuevos y suma el stock de los existentes con un solo movimiento por
+    producto. Si desde la simulacion se creo alguno de los SKU nuevos o se elimino
+    algun producto a actualizar, no aplica nada y lanza ImportacionError.
+    Retorna (productos_nuevos, productos_actualizados).
+    """
+    datos_nuevos = plan['nuevos']
+    entradas = plan['entradas']
+
+    with transaction.atomic():
+        skus = [producto['codigo_sku'] for producto in datos_nuevos]
+        ocupados = []
+        for bloque in lotes(skus):
+            ocupados.extend(Producto.objects.filter(codigo_sku__in=bloque).values_list('codigo_sku', flat=True))
+        if ocupados:
+            raise ImportacionError(
+                f'Los SKU {", ".join(ocupados[:10])} se crearon después de la simulación. '
+                'Vuelva a simular la importación.'
+            )
+
+        # Stock actual de los productos a actualizar, bloqueados hasta terminar
+        stock_actual = {}
+        for bloque in lotes([entrada['producto_id'] for entrada in entradas]):
+            stock_actual.update(Producto.objects.select_for_update().filter(id__in=bloque).values_list('id', 'stock'))
+        eliminados = [entrada['codigo_sku'] for entrada in entradas if entrada['producto_id'] not in stock_actual]
+        if eliminados:
+            raise ImportacionError(
+                f'Los productos {", ".join(eliminados[:10])} se eliminaron después de la simulación. '
+                'Vuelva a simular la importación.'
+            )
+
+        nuevos = [
+            Producto(
+                codigo_sku=producto['codigo_sku'],
+                nombre=producto['nombre'],
+                categoria_id=producto['categoria_id'],
+                subcategoria_id=producto['subcategoria_id'],
+                descripcion=producto['descripcion'],
+                precio=producto['precio'],
+                stock=producto['stock'],
+                stock_minimo=producto['stock_minimo'],
+                stock_critico=producto['stock_critico'],
+            )
+            for producto in datos_nuevos
+        ]
+        if nuevos:
+            sincronizar_codigos_sku(producto.codigo_sku for producto in nuevos)
+            Producto.objects.bulk_create(nuevos, batch_size=TAMANO_LOTE)
+
+        if entradas:
+            por_cantidad = {}
+            for entrada in entradas:
+                por_cantidad.setdefault(entrada['cantidad'], []).append(entrada['producto_id'])
+            ahora = timezone.now()
+            for cantidad, ids in por_cantidad.items():
+                for bloque in lotes(ids):
+                    Producto.objects.filter(id__in=bloque).update(
+                        stock=F('stock') + cantidad,
+                        fecha_modificacion=ahora,
+                    )
+            MovimientoStock.objects.bulk_create([
+                MovimientoStock(
+                    producto_id=entrada['producto_id'],
+                    tipo='ENTRADA',
+                    cantidad=entrada['cantidad'],
+                    stock_anterior=stock_actual[entrada['producto_id']],
+                    stock_nuevo=stock_actual[entrada['producto_id']] + entrada['cantidad'],
+                    motivo='Importación masiva desde Excel',
+                    observaciones=f'Importado desde archivo Excel - Filas {_filas_texto(entrada["filas"])}',
+                    usuario=usuario,
+                )
+                for entrada in entradas
+            ], batch_size=TAMANO_LOTE)
+
+        notificar_stock([producto.pk for producto in nuevos] + list(stock_actual))
+
+    return len(nuevos), len(entradas)
+
+
+def plantilla_productos():
+    """Libro Excel con los encabezados esperados y filas de ejemplo"""
+    wb = Workbook()
+    ws = wb.active
+    ws.title = "Plantilla Productos"
+    
+    headers = ['codigo_sku', 'nombre', 'categoria', 'subcategoria', 'descripcion', 'precio', 'stock', 'stock_minimo', 'stock_critico']
+    
+    header_fill = PatternFill(start_color='4472C4', end_color='4472C4', fill_type="solid")
+    header_font = Font(bold=True, color="FFFFFF")
+    
+    for col_num, header in enumerate(headers, 1):
+        cell = ws.cell(row=1, column=col_num, value=header)
+        cell.fill = header_fill
+        cell.font = header_font
+        
+    ejemplos = [
+        ['MC-0001', 'Starter Deck Digimon TCG', 'Decks', 'Digimon', 'Deck de inicio', 15990, 10, 5, 2],
+        ['MC-0002', 'Sobre Pokemon Escarlata', 'Sobres', 'Pokemon', 'Sobre de expansión', 4500, 50, 10, 3],
+        ['MC-0003', 'Figura Luffy Gear 5', 'Figuras', 'One Piece', 'Figura coleccionable', 45990, 5, 2, 1],
+    ]
+    
+    for row_num, ejemplo in enumerate(ejemplos, 2):
+        for col_num, value in enumerate(ejemplo, 1):
+            ws.cell(row=row_num, column=col_num, value=value)
+            
+    ws.column_dimensions['A'].width = 15
+    ws.column_dimensions['B'].width = 35
+    ws.column_dimensions['C'].width = 15
+    ws.column_dimensions['D'].width = 15
+    ws.column_dimensions['E'].width = 30
+    ws.column_dimensions['F'].width = 12
+    ws.column_dimensions['G'].width = 10
+    ws.column_dimensions['H'].width = 15
+    ws.column_dimensions['I'].width = 15
+
+    return wb
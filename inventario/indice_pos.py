@@ -0,0 +1,276 @@
+"""
+Indice en memoria para la busqueda de productos del POS.
+
+Cada proceso mantiene los productos activos con stock disponible (sin lo
+reservado por pedidos web en pago) en tres estructuras:
+un diccionario SKU -> producto (lectura de codigo de barras / SKU exacto), una
+lista ordenada de (token, sku, id) que funciona como indice de prefijos sobre el
+nombre y el SKU normalizados (sin tildes ni mayusculas), y los datos ya listos
+para responder en JSON. Asi cada tecla en el POS no genera una consulta.
+
+El indice se actualiza con las señales de Producto y MovimientoStock (ver
+inventario/signals.py), que anotan los productos cambiados en la tabla
+CambioIndicePOS. Cada proceso (otros workers, el worker de importaciones) lee
+esa tabla como maximo cada VERIFICAR_SEGUNDOS y recarga solo los productos
+anotados, con una consulta; el indice completo se reconstruye solo al cambiar
+una categoria, al partir o si el proceso estuvo sin buscar mas de lo que se
+guardan los cambios (RETENCION_SEGUNDOS).
+
+Los cambios se leen por fecha (de la base de datos) y no por id: un cambio con
+id menor puede confirmarse despues que uno mayor. Por eso se vuelven a leer los
+ultimos MARGEN_SEGUNDOS y se omiten los ya aplicados.
+"""
+import heapq
+import re
+import threading
+import time
+import unicodedata
+from bisect import bisect_left, insort
+from datetime import timedelta
+
+VERIFICAR_SEGUNDOS = 2
+MARGEN_SEGUNDOS = 10
+RETENCION_SEGUNDOS = 60 * 60
+# Con mas cambios pendientes conviene reconstruir (ej: despues de una importacion)
+MAXIMO_CAMBIOS = 5000
+FIN_PREFIJO = '\U0010ffff'
+
+
+def normalizar(texto):
+    """Minusculas y sin tildes: 'Pokémon' -> 'pokemon'"""
+    texto = str(texto or '')
+    if not texto.isascii():
+        texto = unicodedata.normalize('NFKD', texto)
+        texto = ''.join(c for c in texto if not unicodedata.combining(c))
+    return texto.casefold().strip()
+
+
+def tokenizar(texto):
+    """Palabras normalizadas de un texto (separa por espacios y signos)"""
+    return [token for token in re.split(r'[\W_]+', normalizar(texto)) if token]
+
+
+class IndicePOS:
+    """Indice de busqueda de productos para el POS (uno por proceso)"""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._cargado = False
+        self._revisado = 0     # time.monotonic() de la ultima lectura de cambios
+        self._pendiente = False   # este proceso anoto cambios que aun no lee
+        self._desde = None     # fecha desde la que se leen los cambios
+        self._aplicados = set()   # ids de los cambios ya aplicados desde _desde
+        self._podado = 0
+        self._productos = {}   # id -> datos para la respuesta JSON
+        self._tokens_producto = {}   # id -> tokens del producto
+        self._por_sku = {}     # sku normalizado -> id
+        self._tokens = []      # lista ordenada de (token, sku, id)
+
+    # ---- Carga y actualizacion ----
+
+    def _consulta(self):
+        from django.db.models import F
+        from .models import Producto
+        return Producto.objects.disponibles().annotate(disponible=F('stock') - F('stock_reservado')).values_list(
+            'id', 'codigo_sku', 'nombre', 'precio', 'disponible', 'imagen',
+            'categoria__nombre', 'subcategoria__nombre',
+        )
+
+    def _datos(self, fila):
+        from .models import Producto
+        producto_id, codigo_sku, nombre, precio, stock, imagen, categoria, subcategoria = fila
+        if imagen:
+            imagen_url = Producto._meta.get_field('imagen').storage.url(imagen)
+        else:
+            imagen_url = '/static/images/no-image.png'  # Igual que Producto.get_imagen_url
+        return {
+            'id': producto_id,
+            'codigo_sku': codigo_sku,
+            'nombre': nombre,
+            'precio': float(precio),
+            'stock': stock,
+            'imagen_url': imagen_url,
+            'categoria': categoria,
+            'subcategoria': subcategoria or '',
+        }
+
+    def _tokens_de(self, datos):
+        sku = normalizar(datos['codigo_sku'])
+        return sorted(set(tokenizar(datos['nombre']) + tokenizar(sku) + [sku]))
+
+    def _agregar(self, datos):
+        tokens = self._tokens_de(datos)
+        self._productos[datos['id']] = datos
+        self._tokens_producto[datos['id']] = tokens
+        self._por_sku[normalizar(datos['codigo_sku'])] = datos['id']
+        for token in tokens:
+            insort(self._tokens, (token, datos['codigo_sku'], datos['id']))
+
+    def _quitar(self, producto_id):
+        datos = self._productos.pop(producto_id, None)
+        if datos is None:
+            return
+        self._por_sku.pop(normalizar(datos['codigo_sku']), None)
+        for token in self._tokens_producto.pop(producto_id, []):
+            entrada = (token, datos['codigo_sku'], producto_id)
+            posicion = bisect_left(self._tokens, entrada)
+            if posicion < len(self._tokens) and self._tokens[posicion] == entrada:
+                del self._tokens[posicion]
+
+    def _cambios(self, desde):
+        """(id, producto_id, fecha) de los cambios desde la fecha `desde`, en orden de fecha"""
+        from .models import CambioIndicePOS
+        cambios = CambioIndicePOS.objects.order_by('fecha', 'id')
+        if desde is not None:
+            cambios = cambios.filter(fecha__gte=desde)
+        return list(cambios.values_list('id', 'producto_id', 'fecha')[:MAXIMO_CAMBIOS + 1])
+
+    def _ultimos_cambios(self):
+        """Cambios de los ultimos MARGEN_SEGUNDOS antes del mas reciente (dos consultas)"""
+        from django.db.models import Max
+        from .models import CambioIndicePOS
+        ultimo = CambioIndicePOS.objects.aggregate(fecha=Max('fecha'))['fecha']
+        if ultimo is None:
+            return []
+        return self._cambios(ultimo - timedelta(seconds=MARGEN_SEGUNDOS))
+
+    def _marcar(self, cambios):
+        """Recuerda los cambios leidos; los de los ultimos MARGEN_SEGUNDOS se vuelven a leer"""
+        if cambios:
+            self._desde = cambios[-1][2] - timedelta(seconds=MARGEN_SEGUNDOS)
+        self._aplicados = {cambio_id for cambio_id, _, fecha in cambios if self._desde is None or fecha >= self._desde}
+        self._revisado = time.monotonic()
+        self._pendiente = False
+
+    def construir(self):
+        """Carga todos los productos activos con stock (una consulta, mas las de los cambios)"""
+        # Los cambios anotados hasta ahora ya estan en los productos que se leen despues
+        cambios = self._ultimos_cambios()
+        productos = {}
+        tokens_producto = {}
+        por_sku = {}
+        tokens = []
+        for fila in self._consulta().iterator(chunk_size=2000):
+            datos = self._datos(fila)
+            tokens_p = self._tokens_de(datos)
+            productos[datos['id']] = datos
+            tokens_producto[datos['id']] = tokens_p
+            por_sku[normalizar(datos['codigo_sku'])] = datos['id']
+            tokens.extend((token, datos['codigo_sku'], datos['id']) for token in tokens_p)
+        tokens.sort()
+
+        with self._lock:
+            self._productos = productos
+            self._tokens_producto = tokens_producto
+            self._por_sku = por_sku
+            self._tokens = tokens
+            self._marcar(cambios)
+            self._cargado = True
+
+    def _sincronizar(self):
+        """Aplica los cambios anotados por este u otros procesos desde la ultima lectura"""
+        cambios = self._cambios(self._desde)
+        nuevos = [cambio for cambio in cambios if cambio[0] not in self._aplicados]
+        if len(cambios) > MAXIMO_CAMBIOS or any(producto_id is None for _, producto_id, _ in nuevos):
+            self.construir()
+            return
+        producto_ids = {producto_id for _, producto_id, _ in nuevos}
+        vigentes = {}
+        if producto_ids:
+            vigentes = {fila[0]: self._datos(fila) for fila in self._consulta().filter(id__in=producto_ids)}
+        with self._lock:
+            for producto_id in producto_ids:
+                self._quitar(producto_id)
+                if producto_id in vigentes:
+                    self._agregar(vigentes[producto_id])
+            self._marcar(cambios)
+
+    def _anotar(self, producto_ids):
+        from .models import CambioIndicePOS
+        CambioIndicePOS.objects.bulk_create([CambioIndicePOS(producto_id=producto_id) for producto_id in producto_ids])
+        # Los cambios de este proceso se ven en su siguiente busqueda
+        self._pendiente = True
+        if time.monotonic() - self._podado > RETENCION_SEGUNDOS / 4:
+            self._podado = time.monotonic()
+            self._podar()
+
+    def _podar(self):
+        from django.utils import timezone
+        from .models import CambioIndicePOS
+        CambioIndicePOS.objects.filter(fecha__lt=timezone.now() - timedelta(seconds=RETENCION_SEGUNDOS)).delete()
+
+    def actualizar(self, producto_ids):
+        """Anota los productos cambiados; cada proceso los recarga en su siguiente busqueda"""
+        producto_ids = set(producto_ids)
+        if producto_ids:
+            self._anotar(producto_ids)
+
+    def invalidar(self):
+        """Fuerza la reconstruccion en todos los procesos (ej: cambio de nombre de categoria)"""
+        self._anotar([None])
+
+    def _vigente(self):
+        transcurrido = time.monotonic() - self._revisado
+        if not self._cargado or transcurrido > RETENCION_SEGUNDOS / 2:
+            # Los cambios que faltan pueden haberse podado
+            self.construir()
+        elif self._pendiente or transcurrido >= VERIFICAR_SEGUNDOS:
+            self._sincronizar()
+
+    # ---- Busqueda ----
+
+    def _recorrer(self, token):
+        """
+        Ids de los productos con alguna palabra que empieza con `token`, en orden
+        de SKU. Dentro de cada palabra las entradas ya estan ordenadas por SKU,
+        asi que basta mezclar las corridas y se puede cortar apenas haya resultados.
+        """
+        inicio = bisect_left(self._tokens, (token,))
+        fin = bisect_left(self._tokens, (token + FIN_PREFIJO,))
+        corridas = []
+        while inicio < fin:
+            palabra = self._tokens[inicio][0]
+            corte = bisect_left(self._tokens, (palabra, FIN_PREFIJO), inicio, fin)
+            corridas.append(self._tokens[i] for i in range(inicio, corte))
+            inicio = corte
+        vistos = set()
+        for _, _, producto_id in heapq.merge(*corridas, key=lambda entrada: entrada[1]):
+            if producto_id not in vistos:
+                vistos.add(producto_id)
+                yield producto_id
+
+    def _cantidad(self, token):
+        return bisect_left(self._tokens, (token + FIN_PREFIJO,)) - bisect_left(self._tokens, (token,))
+
+    def buscar(self, texto, limite=10):
+        """Productos cuyo SKU coincide exacto o cuyas palabras empiezan con las del texto"""
+        self._vigente()
+        consulta = normalizar(texto)
+        tokens = tokenizar(texto)
+        if not consulta:
+            return []
+
+        with self._lock:
+            exacto = self._por_sku.get(consulta)
+            if exacto is not None:
+                # Lectura de codigo de barras / SKU: respuesta directa
+                return [self._productos[exacto]]
+
+            if not tokens:
+                return []
+
+            # Recorrer el token con menos coincidencias y filtrar con los demas
+            tokens.sort(key=self._cantidad)
+            resto = tokens[1:]
+            resultados = []
+            for producto_id in self._recorrer(tokens[0]):
+                tokens_p = self._tokens_producto[producto_id]
+                if all(any(t.startswith(token) for t in tokens_p) for token in resto):
+                    resultados.append(self._productos[producto_id])
+                    if len(resultados) >= limite:
+                        break
+
+        return resultados
+
+
+indice = IndicePOS()
@@ -0,0 +1,100 @@
+import json
+import os
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Dependencias que no deben cargarse al arrancar un worker (solo al usarlas)
+MODULOS_PESADOS = ('pandas', 'numpy', 'openpyxl', 'transbank')
+
+# Se ejecuta en un proceso nuevo: lo mismo que hace un worker de gunicorn al
+# arrancar (importar la aplicacion WSGI y cargar las URLs en la primera peticion)
+SCRIPT = """
+import json, resource, sys, time
+inicio = time.perf_counter()
+import mundo_cartas.wsgi
+from django.urls import get_resolver
+get_resolver().url_patterns
+segundos = time.perf_counter() - inicio
+rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+rss_mb = rss / (1024 * 1024) if sys.platform == 'darwin' else rss / 1024
+print(json.dumps({
+    'segundos': segundos,
+    'rss_mb': rss_mb,
+    'modulos': [m for m in %r if m in sys.modules],
+}))
+""" % (MODULOS_PESADOS,)
+
+
+class Command(BaseCommand):
+    help = (
+        'Mide el tiempo y la memoria (RSS) de importar mundo_cartas.wsgi en un proceso nuevo '
+        'y falla si supera los limites, si empeora respecto a una medicion base o si se '
+        'cargan dependencias pesadas (pandas, openpyxl, transbank) al arrancar'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeticiones', type=int, default=3,
+                            help='Mediciones a realizar; se usa la mejor (default: 3)')
+        parser.add_argument('--max-segundos', type=float, default=None,
+                            help='Tiempo maximo de arranque en segundos')
+        parser.add_argument('--max-mb', type=float, default=None,
+                            help='RSS maximo al arrancar en MB')
+        parser.add_argument('--base', help='Archivo JSON con una medicion anterior para comparar')
+        parser.add_argument('--tolerancia', type=float, default=20.0,
+                            help='Porcentaje de empeoramiento permitido respecto a --base (default: 20)')
+        parser.add_argument('--guardar', help='Guardar la medicion en este archivo JSON (para usar como --base)')
+
+    def _medir(self):
+        entorno = dict(os.environ, DJANGO_SETTINGS_MODULE=settings.SETTINGS_MODULE)
+        resultado = subprocess.run(
+            [sys.executable, '-c', SCRIPT],
+            capture_output=True, text=True, env=entorno, cwd=settings.BASE_DIR,
+        )
+        if resultado.returncode != 0:
+            raise CommandError(f'No se pudo importar la aplicacion:\n{resultado.stderr}')
+        return json.loads(resultado.stdout.strip().splitlines()[-1])
+
+    def handle(self, *args, **options):
+        mediciones = [self._medir() for _ in range(max(1, options['repeticiones']))]
+        medicion = {
+            'segundos': min(m['segundos'] for m in mediciones),
+            'rss_mb': min(m['rss_mb'] for m in mediciones),
+            'modulos': sorted({modulo for m in mediciones for modulo in m['modulos']}),
+        }
+        self.stdout.write(
+            f"Arranque: {medicion['segundos']:.3f} s, {medicion['rss_mb']:.1f} MB RSS "
+            f"(mejor de {len(mediciones)})"
+        )
+
+        errores = []
+        if medicion['modulos']:
+            errores.append(f"Se cargan dependencias pesadas al arrancar: {', '.join(medicion['modulos'])}")
+        if options['max_segundos'] is not None and medicion['segundos'] > options['max_segundos']:
+            errores.append(f"Tiempo de arranque {medicion['segundos']:.3f} s > {options['max_segundos']} s")
+        if options['max_mb'] is not None and medicion['rss_mb'] > options['max_mb']:
+            errores.append(f"Memoria al arrancar {medicion['rss_mb']:.1f} MB > {options['max_mb']} MB")
+
+        if options['base']:
+            try:
+                with open(options['base']) as archivo:
+                    base = json.load(archivo)
+            except (OSError, ValueError) as e:
+                raise CommandError(f"No se pudo leer la medicion base: {e}")
+            factor = 1 + options['tolerancia'] / 100
+            for campo, unidad in (('segundos', 's'), ('rss_mb', 'MB')):
+                if medicion[campo] > base[campo] * factor:
+                    errores.append(
+                        f"{campo}: {medicion[campo]:.3f} {unidad} empeora mas de {options['tolerancia']:.0f}% "
+                        f"respecto a la base ({base[campo]:.3f} {unidad})"
+                    )
+
+        if options['guardar']:
+            with open(options['guardar'], 'w') as archivo:
+                json.dump(medicion, archivo, indent=2)
+
+        if errores:
+            raise CommandError('Regresion en el arranque:\n- ' + '\n- '.join(errores))
+        self.stdout.write(self.style.SUCCESS('Arranque dentro de los limites'))
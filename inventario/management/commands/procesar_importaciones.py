@@ -0,0 +1,58 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from django.utils import timezone
+
+from inventario.tareas import liberar_interrumpidas, procesar, tomar_siguiente
+
+
+class Command(BaseCommand):
+    help = (
+        'Worker de importaciones masivas: procesa las tareas de importacion pendientes '
+        'en orden de llegada y queda esperando nuevas (usar --una-vez para terminar al vaciar la cola)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--una-vez', action='store_true',
+                            help='Procesar las tareas pendientes y terminar')
+        parser.add_argument('--intervalo', type=float, default=2.0,
+                            help='Segundos entre consultas a la cola cuando esta vacia (default: 2)')
+        parser.add_argument('--minutos-sin-avance', type=int, default=30,
+                            help='Marcar como fallidas las tareas en proceso sin avance en estos minutos (default: 30)')
+
+    def handle(self, *args, **options):
+        limite = timedelta(minutes=options['minutos_sin_avance'])
+        self.stdout.write('Esperando importaciones...' if not options['una_vez'] else 'Procesando cola de importaciones')
+        try:
+            while True:
+                close_old_connections()
+                interrumpidas = liberar_interrumpidas(timezone.now() - limite)
+                if interrumpidas:
+                    self.stdout.write(self.style.WARNING(f'{interrumpidas} importaciones interrumpidas marcadas como fallidas'))
+
+                tarea = tomar_siguiente()
+                if tarea is None:
+                    if options['una_vez']:
+                        break
+                    time.sleep(options['intervalo'])
+                    continue
+
+                self.stdout.write(f'Importando {tarea.nombre_archivo} (tarea {tarea.pk})...')
+                tarea = procesar(tarea)
+                if tarea.estado == 'COMPLETADA':
+                    self.stdout.write(self.style.SUCCESS(
+                        f'Tarea {tarea.pk}: {tarea.filas_procesadas} filas, {tarea.productos_nuevos} nuevos, '
+                        f'{tarea.productos_actualizados} actualizados, {tarea.filas_fallidas} con errores'
+                    ))
+                elif tarea.estado == 'SIMULADA':
+                    self.stdout.write(
+                        f'Tarea {tarea.pk} simulada: {tarea.productos_nuevos} nuevos, '
+                        f'{tarea.productos_actualizados} a actualizar, {tarea.filas_fallidas} con errores '
+                        f'(esperando confirmacion)'
+                    )
+                else:
+                    self.stdout.write(self.style.ERROR(f'Tarea {tarea.pk}: {tarea.mensaje}'))
+        except KeyboardInterrupt:
+            self.stdout.write('Worker detenido')
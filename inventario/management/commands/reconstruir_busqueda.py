@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from inventario.busqueda import motor_para
+
+
+class Command(BaseCommand):
+    help = 'Reconstruye el indice de busqueda de productos (FTS5 en SQLite, GIN en PostgreSQL)'
+
+    def handle(self, *args, **options):
+        motor = motor_para(connection)
+        with transaction.atomic():
+            motor.reconstruir(connection)
+        self.stdout.write(self.style.SUCCESS(f'Indice de busqueda reconstruido (motor: {motor.nombre})'))
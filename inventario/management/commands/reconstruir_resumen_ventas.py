@@ -0,0 +1,26 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from inventario.resumen_ventas import reconstruir_resumen
+
+
+class Command(BaseCommand):
+    help = 'Recalcula el resumen diario de ventas (dia x vendedor x canal x estado) desde las ventas'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--desde',
+            help='Recalcular solo desde esta fecha (YYYY-MM-DD); por defecto todo el historial',
+        )
+
+    def handle(self, *args, **options):
+        desde = options['desde']
+        if desde:
+            try:
+                desde = date.fromisoformat(desde)
+            except ValueError:
+                raise CommandError('La fecha --desde debe tener formato YYYY-MM-DD')
+
+        filas = reconstruir_resumen(desde)
+        self.stdout.write(self.style.SUCCESS(f'Resumen de ventas reconstruido ({filas} filas)'))
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.18 on 2026-10-16 23:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventario', '0006_venta_iva_alter_venta_subtotal'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Secuencia',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('clave', models.CharField(help_text='Ej: SKU, VENTA, PEDIDO-20250101', max_length=50, unique=True, verbose_name='Clave')),
+                ('valor', models.BigIntegerField(default=0, verbose_name='Ultimo valor entregado')),
+            ],
+            options={
+                'verbose_name': 'Secuencia',
+                'verbose_name_plural': 'Secuencias',
+                'ordering': ['clave'],
+            },
+        ),
+    ]
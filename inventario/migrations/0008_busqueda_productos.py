@@ -0,0 +1,36 @@
+import django.db.models.deletion
+import inventario.busqueda
+from django.db import migrations, models
+
+
+def instalar_busqueda(apps, schema_editor):
+    from inventario.busqueda import motor_para
+    # Crea la tabla FTS5 / indice GIN y la llena con los productos existentes
+    motor_para(schema_editor.connection).reconstruir(schema_editor.connection)
+
+
+def desinstalar_busqueda(apps, schema_editor):
+    from inventario.busqueda import motor_para
+    motor_para(schema_editor.connection).desinstalar(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventario', '0007_secuencia'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductoBusqueda',
+            fields=[
+                ('producto', models.OneToOneField(db_column='rowid', on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='busqueda', serialize=False, to='inventario.producto')),
+                ('documento', inventario.busqueda.CampoFTS(db_column='inventario_producto_fts')),
+            ],
+            options={
+                'db_table': 'inventario_producto_fts',
+                'managed': False,
+            },
+        ),
+        migrations.RunPython(instalar_busqueda, desinstalar_busqueda),
+    ]
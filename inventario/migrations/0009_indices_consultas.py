@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-16 23:16
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventario', '0008_busqueda_productos'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='movimientostock',
+            index=models.Index(fields=['producto', '-fecha_movimiento'], name='movimiento_producto_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='movimientostock',
+            index=models.Index(fields=['usuario', '-fecha_movimiento'], name='movimiento_usuario_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='producto',
+            index=models.Index(condition=models.Q(('activo', True)), fields=['stock'], name='producto_activo_stock_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='producto',
+            index=models.Index(condition=models.Q(('activo', True)), fields=['categoria', 'subcategoria'], name='producto_activo_cat_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='venta',
+            index=models.Index(fields=['estado', 'fecha_venta', 'id'], name='venta_estado_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='venta',
+            index=models.Index(fields=['usuario', 'estado', 'fecha_venta'], name='venta_usuario_estado_idx'),
+        ),
+    ]
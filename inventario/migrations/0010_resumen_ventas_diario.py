@@ -0,0 +1,77 @@
+# Generated by Django 5.2.18 on 2026-10-16 23:17
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+
+
+def marcar_ventas_web(apps, schema_editor):
+    """Las ventas creadas por retorno_pago (compras web) se reconocen por sus observaciones"""
+    Venta = apps.get_model('inventario', 'Venta')
+    Venta.objects.filter(observaciones__startswith='Compra por sitio web').update(canal='WEB')
+
+
+def poblar_resumen(apps, schema_editor):
+    """Carga inicial del resumen diario (mismo calculo que reconstruir_resumen_ventas)"""
+    Venta = apps.get_model('inventario', 'Venta')
+    ResumenVentasDiario = apps.get_model('inventario', 'ResumenVentasDiario')
+    grupos = (
+        Venta.objects.annotate(dia=TruncDate('fecha_venta'))
+        .values('dia', 'usuario', 'canal', 'estado')
+        .annotate(cantidad=Count('id'), suma_subtotal=Sum('subtotal'), suma_iva=Sum('iva'), suma_total=Sum('total'))
+        .order_by()
+    )
+    ResumenVentasDiario.objects.bulk_create([
+        ResumenVentasDiario(
+            fecha=grupo['dia'],
+            usuario_id=grupo['usuario'],
+            canal=grupo['canal'],
+            estado=grupo['estado'],
+            cantidad=grupo['cantidad'],
+            subtotal=grupo['suma_subtotal'] or 0,
+            iva=grupo['suma_iva'] or 0,
+            total=grupo['suma_total'] or 0,
+        )
+        for grupo in grupos
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventario', '0009_indices_consultas'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='venta',
+            name='canal',
+            field=models.CharField(choices=[('POS', 'Punto de venta'), ('WEB', 'Sitio web')], default='POS', max_length=10, verbose_name='Canal de Venta'),
+        ),
+        migrations.CreateModel(
+            name='ResumenVentasDiario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField(verbose_name='Fecha')),
+                ('canal', models.CharField(choices=[('POS', 'Punto de venta'), ('WEB', 'Sitio web')], max_length=10, verbose_name='Canal')),
+                ('estado', models.CharField(choices=[('COMPLETADA', 'Completada'), ('ANULADA', 'Anulada')], max_length=20, verbose_name='Estado')),
+                ('cantidad', models.IntegerField(default=0, verbose_name='Cantidad de ventas')),
+                ('subtotal', models.DecimalField(decimal_places=0, default=0, max_digits=14, verbose_name='Subtotal (neto)')),
+                ('iva', models.DecimalField(decimal_places=0, default=0, max_digits=14, verbose_name='IVA')),
+                ('total', models.DecimalField(decimal_places=0, default=0, max_digits=14, verbose_name='Total')),
+                ('usuario', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='resumenes_ventas', to=settings.AUTH_USER_MODEL, verbose_name='Vendedor')),
+            ],
+            options={
+                'verbose_name': 'Resumen diario de ventas',
+                'verbose_name_plural': 'Resumenes diarios de ventas',
+                'ordering': ['-fecha'],
+                'indexes': [models.Index(fields=['usuario', 'estado', 'fecha'], name='resumen_usuario_estado_idx'), models.Index(fields=['estado', 'fecha'], name='resumen_estado_fecha_idx')],
+                'constraints': [models.UniqueConstraint(fields=('fecha', 'usuario', 'canal', 'estado'), name='resumen_ventas_unico')],
+            },
+        ),
+        migrations.RunPython(marcar_ventas_web, migrations.RunPython.noop),
+        migrations.RunPython(poblar_resumen, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.2.18 on 2026-10-16 23:18
+
+from django.db import migrations, models
+from django.db.models import Sum
+from django.db.models.functions import TruncDate
+
+
+def poblar_unidades(apps, schema_editor):
+    """Unidades vendidas de las filas ya existentes del resumen"""
+    DetalleVenta = apps.get_model('inventario', 'DetalleVenta')
+    ResumenVentasDiario = apps.get_model('inventario', 'ResumenVentasDiario')
+    grupos = (
+        DetalleVenta.objects.annotate(dia=TruncDate('venta__fecha_venta'))
+        .values('dia', 'venta__usuario', 'venta__canal', 'venta__estado')
+        .annotate(suma_unidades=Sum('cantidad'))
+        .order_by()
+    )
+    for grupo in grupos:
+        ResumenVentasDiario.objects.filter(
+            fecha=grupo['dia'],
+            usuario_id=grupo['venta__usuario'],
+            canal=grupo['venta__canal'],
+            estado=grupo['venta__estado'],
+        ).update(unidades=grupo['suma_unidades'] or 0)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventario', '0010_resumen_ventas_diario'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='resumenventasdiario',
+            name='unidades',
+            field=models.IntegerField(default=0, verbose_name='Unidades vendidas'),
+        ),
+        migrations.RunPython(poblar_unidades, migrations.RunPython.noop),
+    ]
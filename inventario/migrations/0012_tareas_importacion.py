@@ -0,0 +1,43 @@
+# Generated by Django 5.2.18 on 2026-10-16 23:34
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventario', '0011_resumen_ventas_unidades'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TareaImportacion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('archivo', models.FileField(upload_to='importaciones/', verbose_name='Archivo')),
+                ('nombre_archivo', models.CharField(max_length=255, verbose_name='Nombre del archivo')),
+                ('estado', models.CharField(choices=[('PENDIENTE', 'Pendiente'), ('PROCESANDO', 'Procesando'), ('COMPLETADA', 'Completada'), ('FALLIDA', 'Fallida')], default='PENDIENTE', max_length=20, verbose_name='Estado')),
+                ('filas_procesadas', models.IntegerField(default=0, verbose_name='Filas procesadas')),
+                ('filas_fallidas', models.IntegerField(default=0, verbose_name='Filas con errores')),
+                ('productos_nuevos', models.IntegerField(default=0, verbose_name='Productos nuevos')),
+                ('productos_actualizados', models.IntegerField(default=0, verbose_name='Productos actualizados')),
+                ('reporte_errores', models.FileField(blank=True, upload_to='importaciones/errores/', verbose_name='Reporte de errores')),
+                ('primeros_errores', models.JSONField(blank=True, default=list, verbose_name='Primeros errores')),
+                ('mensaje', models.TextField(blank=True, help_text='Motivo si la tarea fallo', verbose_name='Mensaje')),
+                ('fecha_creacion', models.DateTimeField(auto_now_add=True, verbose_name='Fecha de creacion')),
+                ('fecha_inicio', models.DateTimeField(blank=True, null=True, verbose_name='Inicio')),
+                ('fecha_fin', models.DateTimeField(blank=True, null=True, verbose_name='Fin')),
+                ('fecha_avance', models.DateTimeField(blank=True, null=True, verbose_name='Ultimo avance')),
+                ('usuario', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='importaciones', to=settings.AUTH_USER_MODEL, verbose_name='Usuario')),
+            ],
+            options={
+                'verbose_name': 'Tarea de importacion',
+                'verbose_name_plural': 'Tareas de importacion',
+                'ordering': ['-fecha_creacion'],
+                'indexes': [models.Index(fields=['estado', 'fecha_creacion'], name='tarea_estado_fecha_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-16 23:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventario', '0012_tareas_importacion'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tareaimportacion',
+            name='plan',
+            field=models.FileField(blank=True, upload_to='importaciones/planes/', verbose_name='Plan'),
+        ),
+        migrations.AddField(
+            model_name='tareaimportacion',
+            name='resumen_plan',
+            field=models.JSONField(blank=True, default=dict, verbose_name='Resumen del plan'),
+        ),
+        migrations.AddField(
+            model_name='tareaimportacion',
+            name='simular',
+            field=models.BooleanField(default=False, verbose_name='Simular antes de importar'),
+        ),
+        migrations.AlterField(
+            model_name='tareaimportacion',
+            name='estado',
+            field=models.CharField(choices=[('PENDIENTE', 'Pendiente'), ('PROCESANDO', 'Procesando'), ('SIMULADA', 'Simulada (esperando confirmacion)'), ('COMPLETADA', 'Completada'), ('FALLIDA', 'Fallida')], default='PENDIENTE', max_length=20, verbose_name='Estado'),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-16 23:53
+
+from django.db import migrations, models
+
+
+def quitar_busqueda(apps, schema_editor):
+    # En SQLite agregar la columna reconstruye inventario_producto, y los
+    # triggers de la busqueda FTS5 impiden renombrar la tabla temporal
+    if schema_editor.connection.vendor == 'sqlite':
+        from inventario.busqueda import motor_para
+        motor_para(schema_editor.connection).desinstalar(schema_editor.connection)
+
+
+def reinstalar_busqueda(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        from inventario.busqueda import motor_para
+        motor_para(schema_editor.connection).reconstruir(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventario', '0013_importacion_simulada'),
+    ]
+
+    operations = [
+        migrations.RunPython(quitar_busqueda, reinstalar_busqueda),
+        migrations.AddField(
+            model_name='producto',
+            name='stock_reservado',
+            field=models.IntegerField(default=0, editable=False, help_text='Unidades apartadas por pedidos web pendientes de pago (ver carrito/reservas.py)', verbose_name='Stock Reservado'),
+        ),
+        migrations.RunPython(reinstalar_busqueda, quitar_busqueda),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:25
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+
+CAMPOS_SUMA = ['cantidad', 'unidades', 'subtotal', 'iva', 'total']
+
+
+def fusionar_repetidas(apps, schema_editor):
+    """Junta las filas sin usuario repetidas (dia, canal, estado) que pudieron crearse antes de la restriccion"""
+    ResumenVentasDiario = apps.get_model('inventario', 'ResumenVentasDiario')
+    sin_usuario = ResumenVentasDiario.objects.filter(usuario__isnull=True)
+    repetidas = (
+        sin_usuario.values('fecha', 'canal', 'estado')
+        .annotate(filas=Count('id'))
+        .filter(filas__gt=1)
+        .order_by()
+    )
+    for grupo in repetidas:
+        filas = list(
+            sin_usuario.filter(fecha=grupo['fecha'], canal=grupo['canal'], estado=grupo['estado']).order_by('id')
+        )
+        primera = filas[0]
+        for campo in CAMPOS_SUMA:
+            setattr(primera, campo, sum(getattr(fila, campo) for fila in filas))
+        primera.save(update_fields=CAMPOS_SUMA)
+        ResumenVentasDiario.objects.filter(id__in=[fila.id for fila in filas[1:]]).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventario', '0014_producto_stock_reservado'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(fusionar_repetidas, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='resumenventasdiario',
+            constraint=models.UniqueConstraint(condition=models.Q(('usuario__isnull', True)), fields=('fecha', 'canal', 'estado'), name='resumen_ventas_unico_sin_usuario'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:36
+
+import django.db.models.functions.datetime
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventario', '0015_resumen_ventas_sin_usuario'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CambioIndicePOS',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('producto_id', models.BigIntegerField(blank=True, null=True, verbose_name='Producto')),
+                ('fecha', models.DateTimeField(db_default=django.db.models.functions.datetime.Now(), verbose_name='Fecha')),
+            ],
+            options={
+                'verbose_name': 'Cambio del indice del POS',
+                'verbose_name_plural': 'Cambios del indice del POS',
+                'ordering': ['id'],
+                'indexes': [models.Index(fields=['fecha'], name='cambio_indice_fecha_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,21 @@
+from django.db import migrations
+
+
+def reinstalar_postgres(apps, schema_editor):
+    from inventario.busqueda import motor_para
+    # El indice GIN anterior no tenia categoria ni franquicia: se cambia por la columna con triggers
+    motor = motor_para(schema_editor.connection)
+    if motor.nombre == 'postgres':
+        motor.desinstalar(schema_editor.connection)
+        motor.reconstruir(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventario', '0016_cambios_indice_pos'),
+    ]
+
+    operations = [
+        migrations.RunPython(reinstalar_postgres, migrations.RunPython.noop),
+    ]
@@ -1,6 +1,9 @@
 from django.db import models
+from django.db.models import Case, CharField, Count, F, Q, Sum, Value, When
+from django.db.models.functions import Coalesce, Now
 from django.core.validators import MinValueValidator
 from decimal import Decimal
+from .busqueda import CampoFTS
 
 class Categoria(models.Model):
     """Tipos de productos que se ingresaran, ejemplos como Decks, Fundas, Figuras, Tapetes, etc"""
@@ -38,6 +41,35 @@ class Subcategoria(models.Model):
     def __str__(self):
         return self.nombre
 
+# Estados de stock como condiciones SQL (mismos umbrales que Producto.get_estado_stock)
+STOCK_CRITICO = Q(stock__lte=F('stock_critico'))
+STOCK_BAJO = Q(stock__gt=F('stock_critico'), stock__lte=F('stock_minimo'))
+
+
+class ProductoQuerySet(models.QuerySet):
+    def disponibles(self):
+        """Productos activos con stock que no este reservado por pedidos web en pago"""
+        return self.filter(activo=True, stock__gt=F('stock_reservado'))
+
+    def con_estado_stock(self):
+        """Anota estado_stock ('CRITICO', 'BAJO' u 'OK') calculado en la base de datos"""
+        return self.annotate(estado_stock=Case(
+            When(STOCK_CRITICO, then=Value('CRITICO')),
+            When(STOCK_BAJO, then=Value('BAJO')),
+            default=Value('OK'),
+            output_field=CharField(),
+        ))
+    
+    def resumen_stock(self):
+        """Totales del inventario en una sola consulta"""
+        return self.aggregate(
+            total_productos=Count('id'),
+            total_unidades=Coalesce(Sum('stock'), 0),
+            stock_bajo=Count('id', filter=STOCK_BAJO),
+            stock_critico=Count('id', filter=STOCK_CRITICO),
+        )
+
+
 class Producto(models.Model):
     # Productos con ID autoincremental
     codigo_sku = models.CharField(max_length=50, unique=True, verbose_name="Codigo SKU", editable=False, help_text="Codigo autogenerado (unico), Ej: MC-0001")
@@ -59,30 +91,52 @@ class Producto(models.Model):
     stock = models.IntegerField(default=0, validators=[MinValueValidator(0)], verbose_name="Stock Disponible", help_text="Cantidades de unidades disponibles")
     stock_minimo = models.IntegerField(default=5, validators=[MinValueValidator(0)], verbose_name="Stock Minimo (Alerta Baja)", help_text="Cantidad que activa alerta de stock bajo")
     stock_critico = models.IntegerField(default=2, validators=[MinValueValidator(0)], verbose_name="Stock Critico (Alerta Critica)", help_text="Cantidad que activa alerta de stock critico")
+    stock_reservado = models.IntegerField(default=0, editable=False, verbose_name="Stock Reservado", help_text="Unidades apartadas por pedidos web pendientes de pago (ver carrito/reservas.py)")
     activo = models.BooleanField(default=True, verbose_name="Producto Activo")
     fecha_creacion = models.DateTimeField(auto_now_add=True, verbose_name="Fecha de creacion")
     fecha_modificacion = models.DateTimeField(auto_now=True, verbose_name="Ultima modificacion")
     
+    objects = ProductoQuerySet.as_manager()
+    
     class Meta:
         verbose_name = "Producto"
         verbose_name_plural = "Productos"
         ordering = ['codigo_sku']
+        indexes = [
+            # Catalogo y POS (activo=True, stock > 0); parciales: solo productos activos
+            models.Index(fields=['stock'], condition=Q(activo=True), name='producto_activo_stock_idx'),
+            models.Index(
+                fields=['categoria', 'subcategoria'], condition=Q(activo=True), name='producto_activo_cat_idx'
+            ),
+        ]
         
     def __str__(self):
         return f"{self.codigo_sku} - {self.nombre}"
     
-    def get_estado_stock(self):
-        """Retorna el estado del stock segun umbrales personalizados"""
-        if self.stock <= self.stock_critico:
+    @property
+    def stock_disponible(self):
+        """Unidades que se pueden vender (stock menos lo reservado por pedidos web)"""
+        return self.stock - self.stock_reservado
+
+    def _estado(self, stock):
+        if stock <= self.stock_critico:
             return 'CRITICO'
-        elif self.stock <= self.stock_minimo:
+        elif stock <= self.stock_minimo:
             return 'BAJO'
         else:
             return 'OK'
-    
-    def get_clase_css_stock(self):
+
+    def get_estado_stock(self):
+        """Retorna el estado del stock segun umbrales personalizados"""
+        return self._estado(self.stock)
+
+    def get_estado_disponible(self):
+        """Estado segun el stock disponible (el que ve el cliente en el catalogo)"""
+        return self._estado(self.stock_disponible)
+
+    def get_clase_css_stock(self, estado=None):
         """Retorna la clase CSS segun el estado del stock"""
-        estado = self.get_estado_stock()
+        estado = estado or self.get_estado_stock()
         if estado == 'CRITICO':
             return 'stock-critical'
         elif estado == 'BAJO':
@@ -90,6 +144,10 @@ class Producto(models.Model):
         else:
             return 'stock-ok'
     
+    def get_clase_css_disponible(self):
+        """Clase CSS segun el estado del stock disponible"""
+        return self.get_clase_css_stock(self.get_estado_disponible())
+
     def get_imagen_url(self):
         """Retorna la URL de la imagen o una imagen por defecto"""
         if self.imagen and hasattr(self.imagen, 'url'):
@@ -99,24 +157,32 @@ class Producto(models.Model):
     def save(self, *args, **kwargs):
         """Generador de codigo SKU autoincremental (si el producto es nuevo)"""
         if not self.codigo_sku:
-            #Obtener el ultimo producto creado
-            ultimo_producto = Producto.objects.all().order_by('id').last()
-            if ultimo_producto and ultimo_producto.codigo_sku:
-                #Extraer el num del ultimo codigo (ej: MC-0001 -> 1)
-                try:
-                    ultimo_numero = int(ultimo_producto.codigo_sku.split('-')[-1])
-                    nuevo_numero = ultimo_numero + 1
-                except:
-                    nuevo_numero = 1
-            else:
-                nuevo_numero = 1
-                
+            from .secuencias import generar_codigos_sku
             #Generar el nuevo codigo con formato "MC-0001, MC-0002, etc"
-            self.codigo_sku = f"MC-{nuevo_numero:04d}"
+            self.codigo_sku = generar_codigos_sku()[0]
+        
+        # stock_reservado solo cambia con los UPDATE F() de carrito/reservas.py: un
+        # save() completo (formularios, admin) escribiria el valor leido al inicio
+        # de la peticion y borraria las reservas o liberaciones hechas entretanto
+        if not self._state.adding and kwargs.get('update_fields') is None and not kwargs.get('force_insert'):
+            kwargs['update_fields'] = [
+                campo.name for campo in self._meta.concrete_fields
+                if not campo.primary_key and campo.name != 'stock_reservado'
+            ]
         
         super().save(*args, **kwargs)
         
 
+class ProductoBusqueda(models.Model):
+    """Fila de la tabla virtual FTS5 de busqueda (solo SQLite, la mantienen triggers; ver inventario/busqueda.py)"""
+    producto = models.OneToOneField(Producto, on_delete=models.DO_NOTHING, primary_key=True, db_column='rowid', related_name='busqueda')
+    documento = CampoFTS(db_column='inventario_producto_fts')
+    
+    class Meta:
+        managed = False
+        db_table = 'inventario_producto_fts'
+
+
 #Movimientos de Stock        
 class MovimientoStock(models.Model):
     TIPO_MOVIMIENTO = [
@@ -143,11 +209,51 @@ class MovimientoStock(models.Model):
         verbose_name = "Movimiento de Stock"
         verbose_name_plural = "Movimientos de Stock"
         ordering = ['-fecha_movimiento']
+        indexes = [
+            # Historial del producto (ajustar_stock) y actividad del usuario (perfil)
+            models.Index(fields=['producto', '-fecha_movimiento'], name='movimiento_producto_fecha_idx'),
+            models.Index(fields=['usuario', '-fecha_movimiento'], name='movimiento_usuario_fecha_idx'),
+        ]
         
     def __str__(self):
         return f"{self.tipo} - {self.producto.codigo_sku} - {self.cantidad} unidades"
 
 
+class Secuencia(models.Model):
+    """Contador atomico para codigos correlativos (SKU, folios de venta, numeros de pedido)"""
+    clave = models.CharField(max_length=50, unique=True, verbose_name="Clave", help_text="Ej: SKU, VENTA, PEDIDO-20250101")
+    valor = models.BigIntegerField(default=0, verbose_name="Ultimo valor entregado")
+    
+    class Meta:
+        verbose_name = "Secuencia"
+        verbose_name_plural = "Secuencias"
+        ordering = ['clave']
+        
+    def __str__(self):
+        return f"{self.clave} = {self.valor}"
+
+
+class CambioIndicePOS(models.Model):
+    """
+    Producto cuyo stock o datos cambiaron, para que cada proceso actualice solo ese
+    producto en su indice del POS (ver inventario/indice_pos.py). Sin producto: el
+    indice se reconstruye completo (ej: cambio el nombre de una categoria).
+    """
+    # Sin clave foranea: tambien se anotan los productos borrados
+    producto_id = models.BigIntegerField(null=True, blank=True, verbose_name="Producto")
+    # Hora de la base de datos: la misma para todos los procesos
+    fecha = models.DateTimeField(db_default=Now(), verbose_name="Fecha")
+
+    class Meta:
+        verbose_name = "Cambio del indice del POS"
+        verbose_name_plural = "Cambios del indice del POS"
+        ordering = ['id']
+        indexes = [models.Index(fields=['fecha'], name='cambio_indice_fecha_idx')]
+
+    def __str__(self):
+        return f"{self.fecha} - {self.producto_id or 'todos'}"
+
+
 # Modelo de Venta / POS
 class Venta(models.Model):
     """Cabecera de la venta (comprobante)"""
@@ -156,6 +262,11 @@ class Venta(models.Model):
         ('ANULADA', 'Anulada'),
     ]
     
+    CANAL_CHOICES = [
+        ('POS', 'Punto de venta'),
+        ('WEB', 'Sitio web'),
+    ]
+    
     # Folio interno autogenerado (ej: V-0001, V-0002)
     folio = models.CharField(
         max_length=50, 
@@ -196,6 +307,13 @@ class Venta(models.Model):
         verbose_name="Estado de la Venta"
     )
     
+    canal = models.CharField(
+        max_length=10,
+        choices=CANAL_CHOICES,
+        default='POS',
+        verbose_name="Canal de Venta"
+    )
+    
     # Información opcional del cliente
     cliente_nombre = models.CharField(
         max_length=200,
@@ -218,6 +336,13 @@ class Venta(models.Model):
         verbose_name = "Venta"
         verbose_name_plural = "Ventas"
         ordering = ['-fecha_venta']
+        indexes = [
+            # lista_ventas filtrada por estado y paginada por (-fecha_venta, -id):
+            # el indice recorrido al reves ya entrega ese orden
+            models.Index(fields=['estado', 'fecha_venta', 'id'], name='venta_estado_fecha_idx'),
+            # Ventas de un vendedor (perfil, lista y edicion de vendedores)
+            models.Index(fields=['usuario', 'estado', 'fecha_venta'], name='venta_usuario_estado_idx'),
+        ]
     
     def __str__(self):
         return f"{self.folio} - ${self.total} - {self.fecha_venta.strftime('%d/%m/%Y %H:%M')}"
@@ -225,36 +350,75 @@ class Venta(models.Model):
     def save(self, *args, **kwargs):
         """Generar folio autoincremental si es nueva venta"""
         if not self.folio:
-            # Obtener la última venta
-            ultima_venta = Venta.objects.all().order_by('id').last()
-            if ultima_venta and ultima_venta.folio:
-                try:
-                    ultimo_numero = int(ultima_venta.folio.split('-')[-1])
-                    nuevo_numero = ultimo_numero + 1
-                except:
-                    nuevo_numero = 1
-            else:
-                nuevo_numero = 1
-            
+            from .secuencias import generar_folio_venta
             # Generar folio con formato V-0001, V-0002, etc.
-            self.folio = f"V-{nuevo_numero:04d}"
+            self.folio = generar_folio_venta()
         
         super().save(*args, **kwargs)
     
-    def calcular_totales(self):
-        """Calcular subtotal, IVA y total basado en los detalles"""
-        from decimal import Decimal
-        detalles = self.detalles.all()
-        self.subtotal = sum(detalle.subtotal for detalle in detalles)
+    def asignar_totales(self, subtotal):
+        """Asignar subtotal, IVA y total a partir del subtotal neto (sin guardar)"""
+        self.subtotal = subtotal
         
         # Calcular IVA (19%)
         self.iva = int(self.subtotal * Decimal('0.19'))
         
         # Total = Subtotal + IVA
         self.total = self.subtotal + self.iva
+    
+    def calcular_totales(self):
+        """Calcular subtotal, IVA y total basado en los detalles"""
+        detalles = self.detalles.all()
+        self.asignar_totales(sum(detalle.subtotal for detalle in detalles))
         self.save()
 
 
+class ResumenVentasDiario(models.Model):
+    """
+    Totales de ventas por dia, vendedor, canal y estado. Se mantiene al registrar
+    y anular ventas (ver inventario/resumen_ventas.py) para que las estadisticas
+    de ingresos lean unas pocas filas en vez de recorrer todas las ventas.
+    """
+    fecha = models.DateField(verbose_name="Fecha")
+    usuario = models.ForeignKey(
+        'auth.User',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='resumenes_ventas',
+        verbose_name="Vendedor"
+    )
+    canal = models.CharField(max_length=10, choices=Venta.CANAL_CHOICES, verbose_name="Canal")
+    estado = models.CharField(max_length=20, choices=Venta.ESTADO_CHOICES, verbose_name="Estado")
+    
+    cantidad = models.IntegerField(default=0, verbose_name="Cantidad de ventas")
+    unidades = models.IntegerField(default=0, verbose_name="Unidades vendidas")
+    subtotal = models.DecimalField(max_digits=14, decimal_places=0, default=0, verbose_name="Subtotal (neto)")
+    iva = models.DecimalField(max_digits=14, decimal_places=0, default=0, verbose_name="IVA")
+    total = models.DecimalField(max_digits=14, decimal_places=0, default=0, verbose_name="Total")
+    
+    class Meta:
+        verbose_name = "Resumen diario de ventas"
+        verbose_name_plural = "Resumenes diarios de ventas"
+        ordering = ['-fecha']
+        constraints = [
+            models.UniqueConstraint(fields=['fecha', 'usuario', 'canal', 'estado'], name='resumen_ventas_unico'),
+            # Ventas web y del POS sin usuario: NULL no choca con NULL en el indice unico,
+            # asi que esas filas necesitan su propia restriccion
+            models.UniqueConstraint(
+                fields=['fecha', 'canal', 'estado'], condition=Q(usuario__isnull=True),
+                name='resumen_ventas_unico_sin_usuario',
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['usuario', 'estado', 'fecha'], name='resumen_usuario_estado_idx'),
+            models.Index(fields=['estado', 'fecha'], name='resumen_estado_fecha_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.fecha} - {self.usuario or 'Web/Sistema'} - {self.canal} {self.estado}: ${self.total}"
+
+
 class DetalleVenta(models.Model):
     """Detalle de la venta (productos vendidos)"""
     venta = models.ForeignKey(
@@ -300,4 +464,72 @@ class DetalleVenta(models.Model):
     def save(self, *args, **kwargs):
         """Calcular subtotal automáticamente"""
         self.subtotal = self.cantidad * self.precio_unitario
-        super().save(*args, **kwargs)
\ No newline at end of file
+        super().save(*args, **kwargs)
+
+class TareaImportacion(models.Model):
+    """
+    Importacion masiva de productos en cola. La vista solo guarda el archivo y
+    crea la tarea; el comando `procesar_importaciones` la ejecuta fuera de la
+    peticion HTTP e informa el avance, que la pagina de importacion consulta.
+    
+    Con `simular` la primera pasada solo calcula el plan (productos nuevos,
+    stock a sumar y conflictos) y deja la tarea SIMULADA; al confirmarla vuelve
+    a la cola y el worker aplica el plan guardado en una sola transaccion.
+    """
+    ESTADO_CHOICES = [
+        ('PENDIENTE', 'Pendiente'),
+        ('PROCESANDO', 'Procesando'),
+        ('SIMULADA', 'Simulada (esperando confirmacion)'),
+        ('COMPLETADA', 'Completada'),
+        ('FALLIDA', 'Fallida'),
+    ]
+    
+    archivo = models.FileField(upload_to='importaciones/', verbose_name="Archivo")
+    nombre_archivo = models.CharField(max_length=255, verbose_name="Nombre del archivo")
+    usuario = models.ForeignKey(
+        'auth.User',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='importaciones',
+        verbose_name="Usuario"
+    )
+    estado = models.CharField(max_length=20, choices=ESTADO_CHOICES, default='PENDIENTE', verbose_name="Estado")
+    simular = models.BooleanField(default=False, verbose_name="Simular antes de importar")
+    
+    # Plan de la simulacion (JSON completo) y un extracto para la vista previa
+    plan = models.FileField(upload_to='importaciones/planes/', blank=True, verbose_name="Plan")
+    resumen_plan = models.JSONField(default=dict, blank=True, verbose_name="Resumen del plan")
+    
+    # Avance (se actualiza despues de cada lote)
+    filas_procesadas = models.IntegerField(default=0, verbose_name="Filas procesadas")
+    filas_fallidas = models.IntegerField(default=0, verbose_name="Filas con errores")
+    productos_nuevos = models.IntegerField(default=0, verbose_name="Productos nuevos")
+    productos_actualizados = models.IntegerField(default=0, verbose_name="Productos actualizados")
+    
+    # Reporte completo de errores (CSV) y los primeros para mostrar en pantalla
+    reporte_errores = models.FileField(upload_to='importaciones/errores/', blank=True, verbose_name="Reporte de errores")
+    primeros_errores = models.JSONField(default=list, blank=True, verbose_name="Primeros errores")
+    mensaje = models.TextField(blank=True, verbose_name="Mensaje", help_text="Motivo si la tarea fallo")
+    
+    fecha_creacion = models.DateTimeField(auto_now_add=True, verbose_name="Fecha de creacion")
+    fecha_inicio = models.DateTimeField(null=True, blank=True, verbose_name="Inicio")
+    fecha_fin = models.DateTimeField(null=True, blank=True, verbose_name="Fin")
+    fecha_avance = models.DateTimeField(null=True, blank=True, verbose_name="Ultimo avance")
+    
+    class Meta:
+        verbose_name = "Tarea de importacion"
+        verbose_name_plural = "Tareas de importacion"
+        ordering = ['-fecha_creacion']
+        indexes = [
+            # El worker toma la pendiente mas antigua
+            models.Index(fields=['estado', 'fecha_creacion'], name='tarea_estado_fecha_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.nombre_archivo} - {self.get_estado_display()}"
+    
+    @property
+    def terminada(self):
+        """No hay nada en curso (la pagina deja de consultar el avance)"""
+        return self.estado in ('SIMULADA', 'COMPLETADA', 'FALLIDA')
@@ -0,0 +1,128 @@
+"""
+Paginacion por cursor (keyset) para los listados del catalogo, inventario, POS y ventas.
+
+En vez de OFFSET (que obliga a la base de datos a recorrer todas las filas
+anteriores), cada pagina se pide "despues de" los valores de orden del ultimo
+elemento mostrado: WHERE (codigo_sku > 'MC-0050') ORDER BY codigo_sku LIMIT n.
+El costo de cada pagina depende solo de su tamaño. El cursor viaja en la URL
+(?cursor=...) y las paginas siguientes se piden con ?parcial=1, que responde
+JSON con el HTML de las filas para el scroll infinito.
+"""
+import base64
+import datetime
+import json
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+from django.http import JsonResponse
+from django.template.loader import render_to_string
+
+
+class Pagina:
+    """Elementos de una pagina y el cursor de la siguiente (None si es la ultima)"""
+
+    def __init__(self, items, siguiente, url_siguiente):
+        self.items = items
+        self.siguiente = siguiente
+        self.url_siguiente = url_siguiente
+
+    @property
+    def tiene_siguiente(self):
+        return self.siguiente is not None
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+
+class _EncoderCursor(DjangoJSONEncoder):
+    """Fechas con microsegundos (DjangoJSONEncoder las corta a milisegundos)"""
+
+    def default(self, o):
+        if isinstance(o, datetime.datetime):
+            return o.isoformat()
+        return super().default(o)
+
+
+def _codificar(valores):
+    texto = json.dumps(valores, cls=_EncoderCursor)
+    return base64.urlsafe_b64encode(texto.encode()).decode().rstrip('=')
+
+
+def _decodificar(cursor, modelo, campos):
+    try:
+        texto = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        valores = json.loads(texto)
+    except (ValueError, UnicodeDecodeError):
+        return None
+    if not isinstance(valores, list) or len(valores) != len(campos):
+        return None
+
+    convertidos = []
+    for campo, valor in zip(campos, valores):
+        if isinstance(valor, (list, dict)):
+            return None
+        try:
+            convertidos.append(modelo._meta.get_field(campo).to_python(valor))
+        except FieldDoesNotExist:
+            # Anotaciones (ej: relevancia) viajan tal cual
+            convertidos.append(valor)
+        except (ValidationError, TypeError):
+            # Cursor alterado: valor que no corresponde al campo
+            return None
+    return convertidos
+
+
+def _despues_de(orden, valores):
+    """(a > x) OR (a = x AND b > y) ... respetando la direccion de cada campo"""
+    condicion = Q()
+    iguales = Q()
+    for campo, valor in zip(orden, valores):
+        nombre = campo.lstrip('-')
+        operador = 'lt' if campo.startswith('-') else 'gt'
+        condicion |= iguales & Q(**{f'{nombre}__{operador}': valor})
+        iguales &= Q(**{nombre: valor})
+    return condicion
+
+
+def paginar_keyset(request, queryset, orden, tamano=50):
+    """
+    Pagina `queryset` ordenado por `orden` (tupla de campos que juntos deben ser
+    unicos, ej: ('-fecha_venta', '-id')) a partir de request.GET['cursor'].
+    """
+    campos = [campo.lstrip('-') for campo in orden]
+    queryset = queryset.order_by(*orden)
+
+    cursor = request.GET.get('cursor')
+    valores = _decodificar(cursor, queryset.model, campos) if cursor else None
+    if valores is not None:
+        queryset = queryset.filter(_despues_de(orden, valores))
+
+    items = list(queryset[:tamano + 1])
+    siguiente = None
+    url_siguiente = None
+    if len(items) > tamano:
+        items = items[:tamano]
+        siguiente = _codificar([getattr(items[-1], campo) for campo in campos])
+        parametros = request.GET.copy()
+        parametros.pop('parcial', None)
+        parametros['cursor'] = siguiente
+        url_siguiente = f"{request.path}?{parametros.urlencode()}"
+
+    return Pagina(items, siguiente, url_siguiente)
+
+
+def es_parcial(request):
+    """La peticion viene del scroll infinito (solo quiere las filas nuevas)"""
+    return request.GET.get('parcial') == '1'
+
+
+def respuesta_parcial(request, template, context, pagina):
+    """JSON con el HTML de las filas de la pagina y la URL de la siguiente"""
+    return JsonResponse({
+        'html': render_to_string(template, context, request=request),
+        'siguiente': pagina.url_siguiente,
+    })
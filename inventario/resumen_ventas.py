@@ -0,0 +1,193 @@
+"""
+Resumen diario de ventas (tabla ResumenVentasDiario).
+
+Cada venta suma sus totales en la fila (dia, vendedor, canal, estado) con un
+UPDATE atomico (F()), dentro de la misma transaccion que registra o anula la
+venta. Las estadisticas de ingresos (historial de ventas, perfil, vendedores)
+suman estas pocas filas en vez de recorrer todas las ventas.
+
+Si el resumen se desajusta (ej: ventas cargadas a mano en la base de datos),
+el comando `reconstruir_resumen_ventas` lo recalcula desde las ventas.
+"""
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import DetalleVenta, ResumenVentasDiario, Venta
+
+
+def _fecha(venta):
+    """Dia de la venta en la zona horaria local (igual que fecha_venta__date)"""
+    if timezone.is_aware(venta.fecha_venta):
+        return timezone.localdate(venta.fecha_venta)
+    return venta.fecha_venta.date()
+
+
+def _unidades(venta):
+    return DetalleVenta.objects.filter(venta=venta).aggregate(unidades=Sum('cantidad'))['unidades'] or 0
+
+
+def _sumar(filtro, **montos):
+    """Suma `montos` a la fila `filtro`, creandola si no existe"""
+    cambios = {campo: F(campo) + valor for campo, valor in montos.items()}
+    filas = ResumenVentasDiario.objects.filter(**filtro)
+    if filas.update(**cambios):
+        return
+    try:
+        with transaction.atomic():
+            ResumenVentasDiario.objects.create(**filtro, **montos)
+    except IntegrityError:
+        # Otro proceso creo la fila primero
+        filas.update(**cambios)
+
+
+def _acumular(venta, estado, signo, unidades):
+    filtro = {
+        'fecha': _fecha(venta),
+        'usuario_id': venta.usuario_id,
+        'canal': venta.canal,
+        'estado': estado,
+    }
+    _sumar(
+        filtro,
+        cantidad=signo,
+        unidades=signo * unidades,
+        subtotal=signo * venta.subtotal,
+        iva=signo * venta.iva,
+        total=signo * venta.total,
+    )
+
+
+def sumar_venta(venta, unidades=None):
+    """
+    Agrega una venta recien registrada al resumen de su dia. `unidades` (total
+    de productos vendidos) se calcula desde los detalles si no se indica.
+    """
+    if unidades is None:
+        unidades = _unidades(venta)
+    with transaction.atomic():
+        _acumular(venta, venta.estado, 1, unidades)
+
+
+def cambiar_estado(venta, estado_anterior, unidades=None):
+    """Mueve la venta desde la fila de `estado_anterior` a la de su estado actual (ej: anulacion)"""
+    if unidades is None:
+        unidades = _unidades(venta)
+    with transaction.atomic():
+        _acumular(venta, estado_anterior, -1, unidades)
+        _acumular(venta, venta.estado, 1, unidades)
+
+
+def fusionar_vendedor(usuario_id):
+    """
+    Pasa las filas de un vendedor que se va a borrar a las filas sin usuario.
+    Sus ventas quedan sin usuario (SET_NULL), y una fila suya que quedara con
+    usuario NULL chocaria con la fila sin usuario del mismo dia, canal y estado.
+    """
+    with transaction.atomic():
+        filas = ResumenVentasDiario.objects.select_for_update().filter(usuario_id=usuario_id)
+        for fila in filas:
+            _sumar(
+                {'fecha': fila.fecha, 'usuario_id': None, 'canal': fila.canal, 'estado': fila.estado},
+                cantidad=fila.cantidad,
+                unidades=fila.unidades,
+                subtotal=fila.subtotal,
+                iva=fila.iva,
+                total=fila.total,
+            )
+        filas.delete()
+
+
+def filas_resumen(desde=None, hasta=None, usuario=None, estado=None, canal=None):
+    """Filas del resumen filtradas por rango de fechas, vendedor, estado y canal"""
+    filas = ResumenVentasDiario.objects.all()
+    if desde:
+        filas = filas.filter(fecha__gte=desde)
+    if hasta:
+        filas = filas.filter(fecha__lte=hasta)
+    if usuario is not None:
+        filas = filas.filter(usuario=usuario)
+    if estado:
+        filas = filas.filter(estado=estado)
+    if canal:
+        filas = filas.filter(canal=canal)
+    return filas
+
+
+def totales(filas):
+    """Cantidad de ventas y montos sumados de un conjunto de filas del resumen"""
+    resultado = filas.aggregate(
+        cantidad=Sum('cantidad'),
+        unidades=Sum('unidades'),
+        subtotal=Sum('subtotal'),
+        iva=Sum('iva'),
+        total=Sum('total'),
+    )
+    return {campo: valor or 0 for campo, valor in resultado.items()}
+
+
+def totales_por_estado(filas):
+    """{'COMPLETADA': {'cantidad', 'total'}, 'ANULADA': {...}} (estados sin ventas en 0)"""
+    por_estado = {estado: {'cantidad': 0, 'total': 0} for estado, _ in Venta.ESTADO_CHOICES}
+    agrupado = filas.values('estado').annotate(cantidad_estado=Sum('cantidad'), total_estado=Sum('total')).order_by()
+    for fila in agrupado:
+        por_estado[fila['estado']] = {'cantidad': fila['cantidad_estado'] or 0, 'total': fila['total_estado'] or 0}
+    return por_estado
+
+
+def reconstruir_resumen(desde=None):
+    """
+    Recalcula el resumen desde las ventas (todas, o desde la fecha `desde`).
+    Retorna la cantidad de filas creadas.
+    """
+    ventas = Venta.objects.all()
+    detalles = DetalleVenta.objects.all()
+    filas = ResumenVentasDiario.objects.all()
+    if desde:
+        ventas = ventas.filter(fecha_venta__date__gte=desde)
+        detalles = detalles.filter(venta__fecha_venta__date__gte=desde)
+        filas = filas.filter(fecha__gte=desde)
+
+    grupos = (
+        ventas.annotate(dia=TruncDate('fecha_venta'))
+        .values('dia', 'usuario', 'canal', 'estado')
+        .annotate(
+            cantidad=Count('id'),
+            suma_subtotal=Sum('subtotal'),
+            suma_iva=Sum('iva'),
+            suma_total=Sum('total'),
+        )
+        .order_by()
+    )
+    # Las unidades se suman aparte: el JOIN con los detalles duplicaria los totales de la venta
+    unidades = (
+        detalles.annotate(dia=TruncDate('venta__fecha_venta'))
+        .values('dia', 'venta__usuario', 'venta__canal', 'venta__estado')
+        .annotate(suma_unidades=Sum('cantidad'))
+        .order_by()
+    )
+
+    with transaction.atomic():
+        unidades_por_grupo = {
+            (fila['dia'], fila['venta__usuario'], fila['venta__canal'], fila['venta__estado']): fila['suma_unidades']
+            for fila in unidades.iterator()
+        }
+        filas.delete()
+        creadas = ResumenVentasDiario.objects.bulk_create([
+            ResumenVentasDiario(
+                fecha=grupo['dia'],
+                usuario_id=grupo['usuario'],
+                canal=grupo['canal'],
+                estado=grupo['estado'],
+                cantidad=grupo['cantidad'],
+                unidades=unidades_por_grupo.get(
+                    (grupo['dia'], grupo['usuario'], grupo['canal'], grupo['estado']), 0
+                ) or 0,
+                subtotal=grupo['suma_subtotal'] or 0,
+                iva=grupo['suma_iva'] or 0,
+                total=grupo['suma_total'] or 0,
+            )
+            for grupo in grupos.iterator()
+        ], batch_size=1000)
+    return len(creadas)
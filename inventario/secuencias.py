@@ -0,0 +1,115 @@
+"""
+Generacion de codigos correlativos (SKU, folios de venta y numeros de pedido).
+
+Cada codigo sale de una fila de la tabla Secuencia que se incrementa con un
+UPDATE atomico (valor = valor + n), en vez de leer el ultimo registro y sumarle
+uno. Asi dos terminales POS o dos checkouts simultaneos nunca obtienen el mismo
+numero, y los procesos masivos (importacion) pueden reservar un bloque completo
+de numeros con una sola consulta.
+"""
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from .models import Producto, Secuencia, Venta
+
+PREFIJO_SKU = 'MC-'
+PREFIJO_VENTA = 'V-'
+PREFIJO_PEDIDO = 'PED-'
+
+
+def maximo_sufijo(queryset, campo, prefijo):
+    """Mayor numero usado en los codigos con el prefijo dado (ej: MC-0042 -> 42)"""
+    maximo = 0
+    codigos = queryset.filter(**{f'{campo}__startswith': prefijo}).values_list(campo, flat=True)
+    for codigo in codigos.iterator():
+        try:
+            maximo = max(maximo, int(codigo[len(prefijo):]))
+        except ValueError:
+            continue
+    return maximo
+
+
+def _crear_si_no_existe(clave, valor_inicial):
+    """Crea la fila de la secuencia, partiendo desde los datos ya existentes"""
+    if Secuencia.objects.filter(clave=clave).exists():
+        return
+    inicial = valor_inicial() if valor_inicial else 0
+    try:
+        with transaction.atomic():
+            Secuencia.objects.create(clave=clave, valor=inicial)
+    except IntegrityError:
+        # Otro proceso la creo primero
+        pass
+
+
+def reservar_bloque(clave, cantidad=1, valor_inicial=None):
+    """
+    Reserva `cantidad` numeros consecutivos de la secuencia y retorna el primero.
+    `valor_inicial` es una funcion que se usa solo la primera vez, para continuar
+    la numeracion de los registros creados antes de existir la secuencia.
+    """
+    if cantidad < 1:
+        raise ValueError('La cantidad a reservar debe ser mayor a 0')
+
+    with transaction.atomic():
+        secuencia = Secuencia.objects.filter(clave=clave)
+        if not secuencia.update(valor=F('valor') + cantidad):
+            _crear_si_no_existe(clave, valor_inicial)
+            secuencia.update(valor=F('valor') + cantidad)
+        # La fila queda bloqueada por el UPDATE hasta el fin de la transaccion
+        valor = secuencia.values_list('valor', flat=True).get()
+
+    return valor - cantidad + 1
+
+
+def asegurar_minimo(clave, minimo, valor_inicial=None):
+    """Avanza la secuencia para que nunca vuelva a entregar un numero <= minimo"""
+    with transaction.atomic():
+        _crear_si_no_existe(clave, valor_inicial)
+        Secuencia.objects.filter(clave=clave).update(valor=Greatest(F('valor'), minimo))
+
+
+def _ultimo_sku():
+    return maximo_sufijo(Producto.objects.all(), 'codigo_sku', PREFIJO_SKU)
+
+
+def _ultimo_folio():
+    return maximo_sufijo(Venta.objects.all(), 'folio', PREFIJO_VENTA)
+
+
+def generar_codigos_sku(cantidad=1):
+    """Lista de `cantidad` codigos SKU nuevos: MC-0001, MC-0002, etc"""
+    primero = reservar_bloque('SKU', cantidad, _ultimo_sku)
+    return [f"{PREFIJO_SKU}{numero:04d}" for numero in range(primero, primero + cantidad)]
+
+
+def sincronizar_codigos_sku(codigos):
+    """Registra SKU ingresados manualmente (ej: importacion) para no volver a generarlos"""
+    prefijo = len(PREFIJO_SKU)
+    numeros = [
+        int(codigo[prefijo:]) for codigo in codigos
+        if codigo.startswith(PREFIJO_SKU) and codigo[prefijo:].isdigit()
+    ]
+    if numeros:
+        asegurar_minimo('SKU', max(numeros), _ultimo_sku)
+
+
+def generar_folio_venta():
+    """Folio de venta con formato V-0001, V-0002, etc"""
+    return f"{PREFIJO_VENTA}{reservar_bloque('VENTA', 1, _ultimo_folio):04d}"
+
+
+def generar_numero_pedido():
+    """Numero de pedido con formato PED-YYYYMMDD-XXXX (correlativo reinicia cada dia)"""
+    from carrito.models import Pedido
+
+    fecha = timezone.now().strftime('%Y%m%d')
+    prefijo = f"{PREFIJO_PEDIDO}{fecha}-"
+
+    def ultimo_pedido_del_dia():
+        return maximo_sufijo(Pedido.objects.all(), 'numero_pedido', prefijo)
+
+    numero = reservar_bloque(f"PEDIDO-{fecha}", 1, ultimo_pedido_del_dia)
+    return f"{prefijo}{numero:04d}"
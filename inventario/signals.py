@@ -0,0 +1,65 @@
+"""
+Señales del inventario.
+
+`stock_actualizado` se envia desde los procesos masivos (ventas del POS,
+importacion) que escriben con update()/bulk_create() y por lo tanto no disparan
+post_save. Los receptores de este modulo mantienen al dia el indice del POS,
+las categorias en cache (inventario/taxonomia.py) y el resumen de ventas de los
+vendedores que se borran.
+"""
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import Signal, receiver
+
+from . import taxonomia
+from .indice_pos import indice
+from .models import Categoria, MovimientoStock, Producto, Subcategoria
+from .resumen_ventas import fusionar_vendedor
+
+# Argumentos: producto_ids (lista de ids cuyo stock o datos cambiaron)
+stock_actualizado = Signal()
+
+
+def notificar_stock(producto_ids):
+    """Envia stock_actualizado cuando la transaccion en curso se confirme"""
+    producto_ids = list(producto_ids)
+    transaction.on_commit(
+        lambda: stock_actualizado.send(sender=Producto, producto_ids=producto_ids)
+    )
+
+
+@receiver(post_save, sender=Producto)
+@receiver(post_delete, sender=Producto)
+def producto_modificado(sender, instance, **kwargs):
+    # El pk se lee ahora: al borrar, Django lo deja en None antes de confirmar
+    producto_id = instance.pk
+    transaction.on_commit(lambda: indice.actualizar([producto_id]))
+    taxonomia.invalidar_facetas()
+
+
+@receiver(post_save, sender=MovimientoStock)
+def movimiento_registrado(sender, instance, **kwargs):
+    producto_id = instance.producto_id
+    transaction.on_commit(lambda: indice.actualizar([producto_id]))
+
+
+@receiver(stock_actualizado)
+def stock_actualizado_en_bloque(sender, producto_ids, **kwargs):
+    indice.actualizar(producto_ids)
+
+
+@receiver(post_save, sender=Categoria)
+@receiver(post_save, sender=Subcategoria)
+@receiver(post_delete, sender=Categoria)
+@receiver(post_delete, sender=Subcategoria)
+def taxonomia_modificada(sender, **kwargs):
+    taxonomia.invalidar()
+    # El nombre de la categoria va dentro de los resultados del POS
+    transaction.on_commit(indice.invalidar)
+
+
+@receiver(pre_delete, sender=settings.AUTH_USER_MODEL)
+def vendedor_borrado(sender, instance, **kwargs):
+    # Antes de que SET_NULL deje sus filas del resumen sin usuario
+    fusionar_vendedor(instance.pk)
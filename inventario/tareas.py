@@ -0,0 +1,207 @@
+"""
+Cola de importaciones masivas en la base de datos (sin broker externo).
+
+La vista de importacion guarda el archivo y crea una TareaImportacion
+PENDIENTE. El comando `procesar_importaciones` toma las tareas en orden de
+llegada y las ejecuta con el importador por lotes, actualizando el avance
+despues de cada lote; la pagina de importacion lo consulta por JSON. Al
+terminar se guarda el reporte completo de errores como CSV descargable.
+
+Las tareas con `simular` pasan primero por una simulacion que guarda el plan
+(JSON) y queda SIMULADA hasta que el usuario lo confirma; la confirmacion
+vuelve a encolar la tarea y el worker aplica el plan en una sola transaccion.
+
+Una tarea se toma con un UPDATE condicionado al estado PENDIENTE, asi que
+varios workers pueden correr a la vez sin procesar dos veces el mismo archivo.
+"""
+import csv
+import io
+import json
+import logging
+import re
+
+from django.core.files.base import ContentFile
+from django.utils import timezone
+
+from .models import TareaImportacion
+
+logger = logging.getLogger(__name__)
+
+# Errores que se guardan en la tarea para mostrarlos en pantalla
+MAX_ERRORES_EN_PANTALLA = 20
+# Filas de la vista previa de la simulacion
+MAX_FILAS_VISTA_PREVIA = 50
+
+_FILA = re.compile(r'^Fila (\d+): (.*)$', re.S)
+
+
+def encolar_importacion(archivo, usuario=None, simular=False):
+    """Guarda el archivo subido y crea la tarea pendiente"""
+    tarea = TareaImportacion(
+        nombre_archivo=archivo.name,
+        usuario=usuario if usuario is not None and usuario.is_authenticated else None,
+        simular=simular,
+    )
+    tarea.archivo.save(archivo.name, archivo, save=False)
+    tarea.save()
+    return tarea
+
+
+def tomar_siguiente():
+    """La tarea pendiente mas antigua, marcada PROCESANDO (None si no hay)"""
+    while True:
+        tarea = TareaImportacion.objects.filter(estado='PENDIENTE').order_by('fecha_creacion', 'id').first()
+        if tarea is None:
+            return None
+        tomada = TareaImportacion.objects.filter(pk=tarea.pk, estado='PENDIENTE').update(
+            estado='PROCESANDO',
+            fecha_inicio=timezone.now(),
+            fecha_avance=timezone.now(),
+        )
+        if tomada:
+            tarea.refresh_from_db()
+            return tarea
+        # Otro worker la tomo primero: probar con la siguiente
+
+
+def _reporte_csv(errores):
+    salida = io.StringIO()
+    escritor = csv.writer(salida)
+    escritor.writerow(['fila', 'error'])
+    for error in errores:
+        coincidencia = _FILA.match(error)
+        if coincidencia:
+            escritor.writerow([coincidencia.group(1), coincidencia.group(2)])
+        else:
+            escritor.writerow(['', error])
+    # BOM para que Excel reconozca los acentos
+    return ContentFile(('\ufeff' + salida.getvalue()).encode('utf-8'))
+
+
+def confirmar_plan(tarea):
+    """
+    Vuelve a encolar una tarea SIMULADA para aplicar su plan. Retorna False si
+    la tarea no estaba esperando confirmacion (ej: doble click).
+    """
+    return bool(TareaImportacion.objects.filter(pk=tarea.pk, estado='SIMULADA').update(
+        estado='PENDIENTE',
+        fecha_fin=None,
+    ))
+
+
+def _resumen_plan(plan):
+    """Totales y las primeras filas del plan, para la vista previa"""
+    return {
+        'unidades_nuevas': sum(producto['stock'] for producto in plan['nuevos']),
+        'unidades_entrada': sum(entrada['cantidad'] for entrada in plan['entradas']),
+        'nuevos': [
+            {
+                'codigo_sku': producto['codigo_sku'],
+                'nombre': producto['nombre'],
+                'categoria': producto['categoria'],
+                'precio': producto['precio'],
+                'stock': producto['stock'],
+                'filas': len(producto['filas']),
+            }
+            for producto in plan['nuevos'][:MAX_FILAS_VISTA_PREVIA]
+        ],
+        'entradas': [
+            {
+                'codigo_sku': entrada['codigo_sku'],
+                'nombre': entrada['nombre'],
+                'stock_actual': entrada['stock_actual'],
+                'cantidad': entrada['cantidad'],
+                'stock_nuevo': entrada['stock_actual'] + entrada['cantidad'],
+                'filas': len(entrada['filas']),
+            }
+            for entrada in plan['entradas'][:MAX_FILAS_VISTA_PREVIA]
+        ],
+    }
+
+
+def _guardar_errores(tarea, errores):
+    tarea.filas_fallidas = len(errores)
+    tarea.primeros_errores = errores[:MAX_ERRORES_EN_PANTALLA]
+    if errores:
+        tarea.reporte_errores.save(f'errores_importacion_{tarea.pk}.csv', _reporte_csv(errores), save=False)
+
+
+def procesar(tarea):
+    """Ejecuta la importacion (o la simulacion, o el plan confirmado) de la tarea"""
+    from . import importers
+
+    filas = TareaImportacion.objects.filter(pk=tarea.pk)
+
+    def progreso(filas_procesadas, productos_nuevos, productos_actualizados, errores):
+        filas.update(
+            filas_procesadas=filas_procesadas,
+            filas_fallidas=len(errores),
+            productos_nuevos=productos_nuevos,
+            productos_actualizados=productos_actualizados,
+            fecha_avance=timezone.now(),
+        )
+
+    try:
+        if tarea.plan:
+            # Plan confirmado: todo o nada
+            with tarea.plan.open('rb') as archivo:
+                plan = json.load(archivo)
+            tarea.productos_nuevos, tarea.productos_actualizados = importers.aplicar_plan(plan, usuario=tarea.usuario)
+            tarea.estado = 'COMPLETADA'
+        elif tarea.simular:
+            with tarea.archivo.open('rb') as archivo:
+                plan = importers.planificar_importacion(archivo, progreso=progreso)
+            tarea.plan.save(
+                f'plan_importacion_{tarea.pk}.json',
+                ContentFile(json.dumps(plan, ensure_ascii=False).encode('utf-8')),
+                save=False,
+            )
+            tarea.resumen_plan = _resumen_plan(plan)
+            tarea.filas_procesadas = plan['filas']
+            tarea.productos_nuevos = len(plan['nuevos'])
+            tarea.productos_actualizados = len(plan['entradas'])
+            _guardar_errores(tarea, plan['errores'])
+            tarea.estado = 'SIMULADA'
+        else:
+            with tarea.archivo.open('rb') as archivo:
+                productos_nuevos, productos_actualizados, errores = importers.importar_productos(
+                    archivo, usuario=tarea.usuario, progreso=progreso
+                )
+            tarea.refresh_from_db(fields=['filas_procesadas'])
+            tarea.productos_nuevos = productos_nuevos
+            tarea.productos_actualizados = productos_actualizados
+            _guardar_errores(tarea, errores)
+            tarea.estado = 'COMPLETADA'
+    except importers.ImportacionError as e:
+        _fallar(tarea, str(e))
+        return tarea
+    except Exception as e:
+        logger.exception('Error al procesar la importacion %s', tarea.pk)
+        _fallar(tarea, f'Error al procesar el archivo: {e}')
+        return tarea
+
+    tarea.fecha_fin = timezone.now()
+    tarea.save()
+    return tarea
+
+
+def _fallar(tarea, mensaje):
+    tarea.refresh_from_db(fields=['filas_procesadas', 'filas_fallidas', 'productos_nuevos', 'productos_actualizados'])
+    tarea.estado = 'FALLIDA'
+    tarea.mensaje = mensaje
+    tarea.fecha_fin = timezone.now()
+    tarea.save()
+
+
+def liberar_interrumpidas(antes_de):
+    """
+    Marca como FALLIDA las tareas PROCESANDO sin avance desde `antes_de` (el
+    worker se detuvo a mitad). No se reintentan: los lotes ya escritos sumaron
+    stock y volver a procesar el archivo lo duplicaria.
+    """
+    return TareaImportacion.objects.filter(estado='PROCESANDO', fecha_avance__lt=antes_de).update(
+        estado='FALLIDA',
+        mensaje='La importacion se interrumpio antes de terminar. Revise el stock de los productos '
+                'procesados antes de volver a importar el archivo.',
+        fecha_fin=timezone.now(),
+    )
@@ -0,0 +1,92 @@
+"""
+Categorias y subcategorias en cache para los filtros de los listados.
+
+El catalogo, la lista de productos y el POS muestran en cada peticion las
+categorias y subcategorias activas, que casi nunca cambian. Se guardan en el
+cache de Django (CACHES) bajo una clave con numero de version: post_save y
+post_delete de Categoria y Subcategoria suben la version (ver
+inventario/signals.py). La version esta en la base de datos (ver
+inventario/versiones.py) y no en el cache, que por defecto es de cada proceso:
+los demas procesos la releen como maximo cada VERIFICAR_SEGUNDOS y, si cambio,
+vuelven a leer las categorias con dos consultas.
+
+Las facetas (productos disponibles por categoria y subcategoria) se calculan
+con una sola consulta y se guardan con la version de la taxonomia y la de los
+productos, que sube al crear, editar o borrar un producto. Las ventas y las
+reservas no la suben (cambiarian el conteo a cada rato), asi que el conteo
+puede atrasarse hasta FACETAS_SEGUNDOS.
+"""
+from django.core.cache import cache
+from django.db.models import Count
+
+from .models import Categoria, Producto, Subcategoria
+from .versiones import VersionCompartida
+
+VERIFICAR_SEGUNDOS = 2
+VERSION = VersionCompartida('TAXONOMIA', VERIFICAR_SEGUNDOS)
+VERSION_PRODUCTOS = VersionCompartida('TAXONOMIA-PRODUCTOS', VERIFICAR_SEGUNDOS)
+DURACION = 60 * 60 * 24  # segundos
+FACETAS_SEGUNDOS = 5 * 60
+
+
+def version():
+    """Version actual de las categorias (ej: para la clave de fragmentos que muestran sus nombres)"""
+    return VERSION.actual()
+
+
+def taxonomia():
+    """{'categorias': [...], 'subcategorias': [...]}: todas, activas o no, ordenadas por nombre"""
+    clave = f'inventario:taxonomia:{VERSION.actual()}'
+    datos = cache.get(clave)
+    if datos is None:
+        datos = {
+            'categorias': list(Categoria.objects.all()),
+            'subcategorias': list(Subcategoria.objects.all()),
+        }
+        cache.set(clave, datos, DURACION)
+    return datos
+
+
+def categorias_activas():
+    return [categoria for categoria in taxonomia()['categorias'] if categoria.activo]
+
+
+def subcategorias_activas():
+    return [subcategoria for subcategoria in taxonomia()['subcategorias'] if subcategoria.activo]
+
+
+def facetas():
+    """{'categorias': {id: productos}, 'subcategorias': {id: productos}} con los productos disponibles"""
+    clave = f'inventario:taxonomia:facetas:{VERSION.actual()}:{VERSION_PRODUCTOS.actual()}'
+    datos = cache.get(clave)
+    if datos is None:
+        datos = {'categorias': {}, 'subcategorias': {}}
+        filas = (
+            Producto.objects.disponibles()
+            .order_by()
+            .values_list('categoria_id', 'subcategoria_id')
+            .annotate(total=Count('id'))
+        )
+        for categoria_id, subcategoria_id, total in filas:
+            datos['categorias'][categoria_id] = datos['categorias'].get(categoria_id, 0) + total
+            if subcategoria_id is not None:
+                datos['subcategorias'][subcategoria_id] = datos['subcategorias'].get(subcategoria_id, 0) + total
+        cache.set(clave, datos, FACETAS_SEGUNDOS)
+    return datos
+
+
+def con_conteo(items, conteos):
+    """Deja en cada categoria/subcategoria `total_productos` (para mostrarlo en el filtro)"""
+    for item in items:
+        item.total_productos = conteos.get(item.id, 0)
+    return items
+
+
+def invalidar():
+    """Cambio una categoria o subcategoria (se aplica al confirmar la transaccion en curso)"""
+    VERSION.subir_al_confirmar()
+
+
+def invalidar_facetas():
+    """Cambio un producto: el conteo por categoria se recalcula en la siguiente peticion"""
+    VERSION_PRODUCTOS.subir_al_confirmar()
@@ -1,3 +1,523 @@
-from django.test import TestCase
+import csv
+import io
+import re
+import shutil
+import tempfile
+import threading
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import IntegrityError, connection, transaction
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db.models import F
+from django.test import Client, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from openpyxl import Workbook, load_workbook
+
+from carrito.models import Pedido
+from registration.models import PerfilUsuario, Rol
+from . import indice_pos, taxonomia
+from .busqueda import buscar_productos
+from .importers import aplicar_plan, importar_productos, planificar_importacion
+from .models import (
+    CambioIndicePOS, Categoria, DetalleVenta, MovimientoStock, Producto, ResumenVentasDiario, Subcategoria,
+    TareaImportacion, Venta,
+)
+from .paginacion import _codificar, _decodificar
+from .resumen_ventas import sumar_venta
+from .secuencias import generar_codigos_sku, generar_folio_venta, generar_numero_pedido, reservar_bloque
+from .signals import notificar_stock
+from .tareas import confirmar_plan, encolar_importacion, procesar, tomar_siguiente
+from .ventas import VentaError, registrar_venta
+
+HILOS = 8
+# Consultas de registrar_venta con las secuencias y el resumen del dia ya creados
+CONSULTAS_VENTA = 14
+REPETICIONES = 25
+
+
+def en_paralelo(funcion, hilos=HILOS, repeticiones=REPETICIONES):
+    """
+    Ejecuta `funcion` `repeticiones` veces en cada uno de `hilos` hilos que parten
+    a la vez (cada hilo con su propia conexion). Retorna todos los resultados.
+    """
+    barrera = threading.Barrier(hilos)
+    resultados = []
+    errores = []
+
+    def trabajar():
+        try:
+            barrera.wait()
+            for _ in range(repeticiones):
+                resultados.append(funcion())
+        except Exception as e:
+            errores.append(e)
+        finally:
+            connection.close()
+
+    trabajadores = [threading.Thread(target=trabajar) for _ in range(hilos)]
+    for trabajador in trabajadores:
+        trabajador.start()
+    for trabajador in trabajadores:
+        trabajador.join()
+    if errores:
+        raise errores[0]
+    return resultados
+
+
+class SecuenciasConcurrentesTest(TransactionTestCase):
+    """Varios procesos (terminales POS, checkouts) pidiendo codigos a la vez nunca obtienen el mismo"""
+
+    def test_codigos_sku_en_bloque(self):
+        bloques = en_paralelo(lambda: generar_codigos_sku(3))
+        codigos = [codigo for bloque in bloques for codigo in bloque]
+        self.assertEqual(len(codigos), HILOS * REPETICIONES * 3)
+        self.assertEqual(len(set(codigos)), len(codigos))
+
+    def test_folios_de_venta(self):
+        folios = en_paralelo(generar_folio_venta)
+        self.assertEqual(len(set(folios)), HILOS * REPETICIONES)
+
+    def test_numeros_de_pedido(self):
+        numeros = en_paralelo(generar_numero_pedido)
+        self.assertEqual(len(set(numeros)), HILOS * REPETICIONES)
+
+    def test_productos_creados_en_paralelo(self):
+        categoria = Categoria.objects.create(nombre='Cartas sueltas')
+        en_paralelo(lambda: Producto.objects.create(nombre='Carta', categoria=categoria, precio=1000).codigo_sku)
+        codigos = list(Producto.objects.values_list('codigo_sku', flat=True))
+        self.assertEqual(len(codigos), HILOS * REPETICIONES)
+        self.assertEqual(len(set(codigos)), len(codigos))
+
+    def test_ventas_y_pedidos_creados_en_paralelo(self):
+        usuario = User.objects.create_user('cliente', password='clave12345')
+        en_paralelo(lambda: (Venta.objects.create(canal='WEB'), Pedido.objects.create(usuario=usuario)))
+        self.assertEqual(Venta.objects.values('folio').distinct().count(), HILOS * REPETICIONES)
+        self.assertEqual(Pedido.objects.values('numero_pedido').distinct().count(), HILOS * REPETICIONES)
+
+
+class VentasConcurrentesTest(TransactionTestCase):
+    """Varias cajas vendiendo el mismo producto a la vez nunca venden mas que el stock"""
+
+    def test_sin_sobreventa(self):
+        categoria = Categoria.objects.create(nombre='Sobres')
+        producto = Producto.objects.create(nombre='Sobre', categoria=categoria, precio=3000, stock=5)
+
+        def vender():
+            try:
+                return registrar_venta([{'producto_id': producto.pk, 'cantidad': 1}]).pk
+            except VentaError:
+                return None
+
+        vendidas = [venta for venta in en_paralelo(vender, repeticiones=1) if venta is not None]
+        self.assertEqual(len(vendidas), 5)
+        producto.refresh_from_db()
+        self.assertEqual(producto.stock, 0)
+        self.assertEqual(MovimientoStock.objects.filter(producto=producto, tipo='VENTA').count(), 5)
+
+
+class StockReservadoTest(TestCase):
+    """Un save() completo de Producto no pisa las reservas hechas despues de leerlo"""
+
+    def test_save_conserva_reserva_concurrente(self):
+        categoria = Categoria.objects.create(nombre='Sobres')
+        producto = Producto.objects.create(nombre='Sobre', categoria=categoria, precio=3000, stock=10)
+        # Otra peticion reserva 3 unidades mientras se edita el producto
+        Producto.objects.filter(pk=producto.pk).update(stock_reservado=F('stock_reservado') + 3)
+        producto.nombre = 'Sobre booster'
+        producto.save()
+        producto.refresh_from_db()
+        self.assertEqual(producto.nombre, 'Sobre booster')
+        self.assertEqual(producto.stock_reservado, 3)
+
+
+class RegistrarVentaTest(TestCase):
+    """Una venta del POS hace las mismas consultas con 3 o 30 lineas y nunca vende de mas"""
+
+    def setUp(self):
+        self.usuario = User.objects.create_user('cajero')
+        categoria = Categoria.objects.create(nombre='Cartas sueltas')
+        self.productos = [
+            Producto.objects.create(nombre=f'Carta {numero}', categoria=categoria, precio=1000, stock=5)
+            for numero in range(30)
+        ]
+        # Primera venta: crea las secuencias y la fila del resumen del dia
+        registrar_venta([{'producto_id': self.productos[0].pk, 'cantidad': 1}], usuario=self.usuario)
+
+    def _items(self, cantidad_lineas):
+        return [{'producto_id': producto.pk, 'cantidad': 2} for producto in self.productos[:cantidad_lineas]]
+
+    def test_consultas_fijas(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            with self.assertNumQueries(CONSULTAS_VENTA):
+                registrar_venta(self._items(3), usuario=self.usuario)
+            with self.assertNumQueries(CONSULTAS_VENTA):
+                registrar_venta(self._items(30), usuario=self.usuario)
+        self.assertEqual(DetalleVenta.objects.filter(venta__usuario=self.usuario).count(), 1 + 3 + 30)
+
+    def test_stock_insuficiente_no_escribe_nada(self):
+        items = self._items(2) + [{'producto_id': self.productos[1].pk, 'cantidad': 4}]
+        ventas = Venta.objects.count()
+        with self.assertRaises(VentaError):
+            registrar_venta(items, usuario=self.usuario)
+        self.assertEqual(Venta.objects.count(), ventas)
+        self.assertEqual(
+            list(Producto.objects.filter(pk__in=[p.pk for p in self.productos[:2]]).values_list('stock', flat=True)),
+            [4, 5],
+        )
+        self.assertFalse(MovimientoStock.objects.filter(producto=self.productos[1]).exists())
+
+
+class AjustarStockTest(TestCase):
+    """Un ajuste manual no toca las unidades reservadas por pedidos web en pago"""
+
+    def setUp(self):
+        usuario = User.objects.create_user('bodega', password='clave12345')
+        PerfilUsuario.objects.create(user=usuario, rol=Rol.objects.get_or_create(nombre='Administrador')[0])
+        self.cliente = Client()
+        self.cliente.force_login(usuario)
+        categoria = Categoria.objects.create(nombre='Sobres')
+        self.producto = Producto.objects.create(nombre='Sobre', categoria=categoria, precio=3000, stock=10)
+        Producto.objects.filter(pk=self.producto.pk).update(stock_reservado=6)
+
+    def _ajustar(self, tipo, cantidad):
+        self.cliente.post(f'/inventario/ajustar-stock/{self.producto.pk}/', {
+            'tipo_movimiento': tipo, 'cantidad': cantidad, 'motivo': 'Conteo', 'observaciones': '',
+        })
+        self.producto.refresh_from_db()
+        return self.producto.stock
+
+    def test_salida_limitada_al_disponible(self):
+        self.assertEqual(self._ajustar('SALIDA', 5), 10)
+        self.assertEqual(self._ajustar('SALIDA', 4), 6)
+
+    def test_ajuste_no_baja_de_lo_reservado(self):
+        self.assertEqual(self._ajustar('AJUSTE', 5), 10)
+        self.assertEqual(self._ajustar('AJUSTE', 6), 6)
+        self.assertEqual(MovimientoStock.objects.filter(producto=self.producto, tipo='AJUSTE').count(), 1)
+
+
+class ExportacionesTest(TestCase):
+    """Los reportes descargados traen los encabezados y una fila por producto o linea de venta"""
+
+    def setUp(self):
+        self.usuario = User.objects.create_user('gerencia', password='clave12345')
+        PerfilUsuario.objects.create(user=self.usuario, rol=Rol.objects.get_or_create(nombre='Administrador')[0])
+        self.cliente = Client()
+        self.cliente.force_login(self.usuario)
+        categoria = Categoria.objects.create(nombre='Sobres')
+        self.sobre = Producto.objects.create(nombre='Sobre Ñandú', categoria=categoria, precio=3000, stock=10)
+        self.mazo = Producto.objects.create(nombre='Mazo', categoria=categoria, precio=15000, stock=4)
+        # Los productos inactivos no salen en el reporte por defecto
+        Producto.objects.create(nombre='Retirado', categoria=categoria, precio=1000, stock=1, activo=False)
+
+    def _descargar(self, url):
+        respuesta = self.cliente.get(url)
+        self.assertEqual(respuesta.status_code, 200)
+        return b''.join(respuesta.streaming_content)
+
+    def test_productos_csv(self):
+        encabezados, *filas = csv.reader(io.StringIO(self._descargar('/inventario/exportar/productos/').decode('utf-8-sig')))
+        self.assertEqual(encabezados[:9], [
+            'SKU', 'Nombre', 'Categoria', 'Subcategoria', 'Precio', 'Stock', 'Stock minimo', 'Stock critico', 'Activo',
+        ])
+        self.assertEqual(
+            sorted(fila[:9] for fila in filas),
+            sorted([
+                [self.sobre.codigo_sku, 'Sobre Ñandú', 'Sobres', '', '3000', '10', '5', '2', 'True'],
+                [self.mazo.codigo_sku, 'Mazo', 'Sobres', '', '15000', '4', '5', '2', 'True'],
+            ]),
+        )
+
+    def test_ventas_xlsx(self):
+        venta = registrar_venta(
+            [{'producto_id': self.sobre.pk, 'cantidad': 2}, {'producto_id': self.mazo.pk, 'cantidad': 1}],
+            usuario=self.usuario,
+        )
+        libro = load_workbook(io.BytesIO(self._descargar('/inventario/exportar/ventas/?formato=xlsx')))
+        encabezados, *filas = libro.active.iter_rows(values_only=True)
+        self.assertEqual(encabezados[:3], ('Folio', 'Fecha', 'Estado'))
+        columnas = {titulo: posicion for posicion, titulo in enumerate(encabezados)}
+        self.assertEqual(
+            sorted((fila[columnas['SKU']], fila[columnas['Cantidad']], fila[columnas['Subtotal linea']]) for fila in filas),
+            sorted([(self.sobre.codigo_sku, 2, 6000), (self.mazo.codigo_sku, 1, 15000)]),
+        )
+        self.assertEqual({fila[columnas['Folio']] for fila in filas}, {venta.folio})
+        self.assertEqual({fila[columnas['Vendedor']] for fila in filas}, {'gerencia'})
+
+
+class IndicePOSTest(TestCase):
+    """El indice del POS sigue los cambios de este proceso y de los demas"""
+
+    def setUp(self):
+        self.categoria = Categoria.objects.create(nombre='Promos')
+        self.producto = Producto.objects.create(nombre='Pikachu promo', categoria=self.categoria, precio=5000, stock=4)
+        indice_pos.indice.construir()
+
+    def test_borrar_en_transaccion_lo_quita_del_indice(self):
+        sku = self.producto.codigo_sku
+        self.assertEqual(len(indice_pos.indice.buscar(sku)), 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                self.producto.delete()
+        self.assertEqual(indice_pos.indice.buscar(sku), [])
+
+    def test_cambios_de_otro_proceso(self):
+        # Otro proceso (ej: worker de importaciones) crea un producto sin señales y lo anota
+        nuevo = Producto(codigo_sku='EXT-0001', nombre='Charizard externo', categoria=self.categoria, precio=9000, stock=1)
+        Producto.objects.bulk_create([nuevo])
+        CambioIndicePOS.objects.create(producto_id=Producto.objects.get(codigo_sku='EXT-0001').pk)
+        # Se aplica solo ese producto, sin reconstruir el indice
+        with mock.patch.object(indice_pos, 'VERIFICAR_SEGUNDOS', 0), \
+                mock.patch.object(indice_pos.indice, 'construir', side_effect=AssertionError('reconstruido')):
+            self.assertEqual([p['codigo_sku'] for p in indice_pos.indice.buscar('charizard')], ['EXT-0001'])
+            self.assertEqual(len(indice_pos.indice.buscar('pikachu')), 1)
+
+    def test_venta_no_reconstruye(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            Producto.objects.filter(pk=self.producto.pk).update(stock=F('stock') - 1)
+            notificar_stock([self.producto.pk])
+        with mock.patch.object(indice_pos.indice, 'construir', side_effect=AssertionError('reconstruido')):
+            self.assertEqual(indice_pos.indice.buscar('pikachu')[0]['stock'], 3)
+
+    def test_cambio_de_categoria_reconstruye(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.categoria.nombre = 'Promociones'
+            self.categoria.save()
+        self.assertEqual(indice_pos.indice.buscar('pikachu')[0]['categoria'], 'Promociones')
+
+
+class BusquedaTest(TestCase):
+    """Los motores de busqueda (FTS5 en SQLite, tsvector en PostgreSQL) indexan los mismos campos"""
+
+    def setUp(self):
+        self.categoria = Categoria.objects.create(nombre='Accesorios')
+        self.franquicia = Subcategoria.objects.create(nombre='Pokémon')
+        self.producto = Producto.objects.create(
+            nombre='Fundas protectoras', categoria=self.categoria, subcategoria=self.franquicia, precio=4000,
+        )
+
+    def _buscar(self, texto):
+        return list(buscar_productos(Producto.objects.all(), texto).values_list('nombre', flat=True))
+
+    def test_categoria_y_franquicia(self):
+        self.assertEqual(self._buscar('pokemon'), ['Fundas protectoras'])
+        self.assertEqual(self._buscar('accesorios fundas'), ['Fundas protectoras'])
+
+    def test_cambio_de_nombre_de_la_franquicia(self):
+        self.franquicia.nombre = 'Digimon'
+        self.franquicia.save()
+        self.assertEqual(self._buscar('digimon'), ['Fundas protectoras'])
+        self.assertEqual(self._buscar('pokemon'), [])
+
+
+class CursorTest(SimpleTestCase):
+    """Un cursor alterado se ignora (primera pagina) en vez de responder un error"""
+
+    def test_valores_que_no_calzan_con_los_campos(self):
+        for valores in (['no-es-fecha', 1], [[1], 1], ['2025-01-01T00:00:00', 'uno'], ['2025-01-01T00:00:00']):
+            with self.subTest(valores=valores):
+                self.assertIsNone(_decodificar(_codificar(valores), Venta, ['fecha_venta', 'id']))
+        self.assertIsNone(_decodificar('%%%', Venta, ['fecha_venta', 'id']))
+
+    def test_cursor_valido(self):
+        fecha, venta_id = _decodificar(_codificar(['2025-01-01T10:00:00', 7]), Venta, ['fecha_venta', 'id'])
+        self.assertEqual((fecha.hour, venta_id), (10, 7))
+
+
+@skipUnless(connection.vendor == 'sqlite', 'Los planes se leen con EXPLAIN QUERY PLAN de SQLite')
+class IndicesConsultasTest(TestCase):
+    """Las consultas de los listados usan los indices compuestos y parciales (EXPLAIN QUERY PLAN)"""
+
+    def assertUsaIndice(self, queryset, indice, ordenado=False):
+        plan = queryset.explain()
+        self.assertRegex(plan, rf'USING (COVERING )?INDEX {re.escape(indice)}\b')
+        if ordenado:
+            # El indice ya entrega el orden: sin ordenar en una tabla temporal
+            self.assertNotIn('TEMP B-TREE', plan)
+
+    def setUp(self):
+        self.usuario = User.objects.create_user('vendedor')
+
+    def test_catalogo_y_pos_por_categoria(self):
+        self.assertUsaIndice(Producto.objects.disponibles().filter(categoria_id=1), 'producto_activo_cat_idx')
+        self.assertUsaIndice(
+            Producto.objects.disponibles().filter(categoria_id=1, subcategoria_id=2), 'producto_activo_cat_idx'
+        )
+
+    def test_lista_ventas(self):
+        ventas = Venta.objects.filter(estado='COMPLETADA').order_by('-fecha_venta', '-id')[:50]
+        self.assertUsaIndice(ventas, 'venta_estado_fecha_idx', ordenado=True)
+
+    def test_ventas_del_vendedor(self):
+        self.assertUsaIndice(Venta.objects.filter(usuario=self.usuario, estado='COMPLETADA'), 'venta_usuario_estado_idx')
+
+    def test_historial_de_stock(self):
+        movimientos = MovimientoStock.objects.filter(producto_id=1).order_by('-fecha_movimiento')[:20]
+        self.assertUsaIndice(movimientos, 'movimiento_producto_fecha_idx', ordenado=True)
+        movimientos = MovimientoStock.objects.filter(usuario=self.usuario).order_by('-fecha_movimiento')[:20]
+        self.assertUsaIndice(movimientos, 'movimiento_usuario_fecha_idx', ordenado=True)
+
+    def test_pedidos_del_cliente_y_retorno_de_webpay(self):
+        pedidos = Pedido.objects.filter(usuario=self.usuario).order_by('-fecha_pedido')
+        self.assertUsaIndice(pedidos, 'pedido_usuario_fecha_idx', ordenado=True)
+        # El indice de token_ws paso a ser la restriccion unica del retorno idempotente
+        self.assertUsaIndice(Pedido.objects.filter(token_ws='abc'), 'pedido_token_ws_unico')
+
+
+class ResumenVentasTest(TransactionTestCase):
+    """Las ventas sin vendedor (web, POS sin usuario) se suman en una sola fila por dia"""
+
+    def test_una_fila_sin_usuario_por_dia(self):
+        ventas = [Venta.objects.create(canal='WEB', subtotal=1000, iva=190, total=1190) for _ in range(HILOS)]
+        pendientes = list(ventas)
+        en_paralelo(lambda: sumar_venta(pendientes.pop(), unidades=1), repeticiones=1)
+        fila = ResumenVentasDiario.objects.get(usuario=None, canal='WEB', estado='COMPLETADA')
+        self.assertEqual((fila.cantidad, fila.total), (HILOS, 1190 * HILOS))
+
+    def test_restriccion_sin_usuario(self):
+        venta = Venta.objects.create(canal='WEB', total=1190)
+        sumar_venta(venta, unidades=1)
+        fila = ResumenVentasDiario.objects.get(usuario=None)
+        with self.assertRaises(IntegrityError):
+            ResumenVentasDiario.objects.create(fecha=fila.fecha, canal='WEB', estado='COMPLETADA')
+
+    def test_borrar_vendedores_del_mismo_dia(self):
+        vendedores = [User.objects.create_user(f'vendedor{numero}') for numero in range(2)]
+        for usuario in [None, *vendedores]:
+            venta = Venta.objects.create(canal='POS', usuario=usuario, subtotal=1000, iva=190, total=1190)
+            sumar_venta(venta, unidades=2)
+        for vendedor in vendedores:
+            vendedor.delete()
+        fila = ResumenVentasDiario.objects.get()
+        self.assertIsNone(fila.usuario_id)
+        self.assertEqual((fila.cantidad, fila.unidades, fila.total), (3, 6, 1190 * 3))
+
+
+ENCABEZADOS = ['codigo_sku', 'nombre', 'categoria', 'subcategoria', 'descripcion', 'precio', 'stock']
+
+
+def archivo_csv(filas, nombre='productos.csv'):
+    salida = io.StringIO()
+    salida.write(','.join(ENCABEZADOS) + '\n')
+    for fila in filas:
+        salida.write(','.join(str(valor) for valor in fila) + '\n')
+    return SimpleUploadedFile(nombre, salida.getvalue().encode('utf-8'))
+
+
+def archivo_xlsx(filas, nombre='productos.xlsx'):
+    libro = Workbook()
+    libro.active.append(ENCABEZADOS)
+    for fila in filas:
+        libro.active.append(list(fila))
+    salida = io.BytesIO()
+    libro.save(salida)
+    return SimpleUploadedFile(nombre, salida.getvalue())
+
+
+class ImportacionTest(TestCase):
+    """Importacion por lotes (CSV y Excel), stock de SKU existentes y simulacion"""
+
+    def setUp(self):
+        self.usuario = User.objects.create_user('bodega')
+        self.categoria = Categoria.objects.create(nombre='Sobres')
+        Subcategoria.objects.create(nombre='Pokemon')
+        self.existente = Producto.objects.create(
+            codigo_sku='EX-0001', nombre='Sobre Escarlata', categoria=self.categoria, precio=4500, stock=5,
+        )
+
+    FILAS = [
+        ['NV-0001', 'Sobre Destinos', 'Sobres', 'Pokemon', 'Sobre', 5000, 10],
+        ['NV-0002', 'Sobre sin precio', 'Sobres', '', '', 'abc', 1],
+        ['EX-0001', 'Sobre Escarlata', 'Sobres', '', '', 4500, 3],
+        ['NV-0003', 'Mazo', 'Mazos', '', '', 9000, 1],
+        ['NV-0001', 'Sobre Destinos', 'Sobres', 'Pokemon', 'Sobre', 5000, 2],
+    ]
+
+    def _revisar(self, resultado, actualizados=1):
+        self.assertEqual(resultado[:2], (1, actualizados))
+        errores = resultado[2]
+        self.assertEqual(errores, [
+            'Fila 3: El precio tiene un formato inválido',
+            "Fila 5: La categoría 'Mazos' no existe en el sistema. Créela primero en el admin.",
+        ])
+        nuevo = Producto.objects.get(codigo_sku='NV-0001')
+        self.assertEqual((nuevo.stock, nuevo.subcategoria.nombre), (12, 'Pokemon'))
+        movimiento = MovimientoStock.objects.get(producto=self.existente)
+        self.assertEqual(
+            (movimiento.tipo, movimiento.cantidad, movimiento.stock_anterior, movimiento.stock_nuevo),
+            ('ENTRADA', 3, 5, 8),
+        )
+        self.existente.refresh_from_db()
+        self.assertEqual(self.existente.stock, 8)
+
+    def test_csv_en_lotes(self):
+        # Lotes de 2 filas: el SKU nuevo repetido cae en otro lote y ahi ya existe (suma stock)
+        self._revisar(importar_productos(archivo_csv(self.FILAS), usuario=self.usuario, tamano_lote=2), actualizados=2)
+        self.assertEqual(MovimientoStock.objects.get(producto__codigo_sku='NV-0001').stock_nuevo, 12)
+
+    def test_xlsx(self):
+        self._revisar(importar_productos(archivo_xlsx(self.FILAS), usuario=self.usuario))
+
+    def test_simulacion_y_confirmacion(self):
+        plan = planificar_importacion(archivo_csv(self.FILAS), tamano_lote=2)
+        self.assertEqual(len(plan['nuevos']), 1)
+        self.assertEqual(plan['nuevos'][0]['stock'], 12)
+        self.assertEqual(plan['entradas'][0]['cantidad'], 3)
+        self.assertEqual(len(plan['errores']), 2)
+        # La simulacion no escribe nada
+        self.assertFalse(Producto.objects.filter(codigo_sku='NV-0001').exists())
+        self.assertFalse(MovimientoStock.objects.exists())
+
+        self.assertEqual(aplicar_plan(plan, usuario=self.usuario), (1, 1))
+        self.assertEqual(Producto.objects.get(codigo_sku='NV-0001').stock, 12)
+        self.existente.refresh_from_db()
+        self.assertEqual(self.existente.stock, 8)
+        self.assertEqual(MovimientoStock.objects.get(producto=self.existente).cantidad, 3)
+
+
+class TareaImportacionTest(TestCase):
+    """Una importacion simulada pasa por la cola hasta quedar aplicada"""
+
+    def setUp(self):
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media, ignore_errors=True)
+        configuracion = override_settings(MEDIA_ROOT=media)
+        configuracion.enable()
+        self.addCleanup(configuracion.disable)
+        Categoria.objects.create(nombre='Sobres')
+
+    def _estado(self, tarea):
+        tarea.refresh_from_db()
+        return tarea.estado
+
+    def test_estados_de_la_simulacion(self):
+        tarea = encolar_importacion(archivo_csv([
+            ['NV-0001', 'Sobre Destinos', 'Sobres', '', '', 5000, 10],
+            ['NV-0002', 'Sobre', 'Mazos', '', '', 5000, 1],
+        ]), simular=True)
+        self.assertEqual(self._estado(tarea), 'PENDIENTE')
+
+        tomada = tomar_siguiente()
+        self.assertEqual((tomada.pk, tomada.estado), (tarea.pk, 'PROCESANDO'))
+        self.assertIsNone(tomar_siguiente())
+
+        procesar(tomada)
+        self.assertEqual(self._estado(tarea), 'SIMULADA')
+        self.assertEqual((tarea.productos_nuevos, tarea.filas_fallidas), (1, 1))
+        self.assertEqual(tarea.resumen_plan['nuevos'][0]['codigo_sku'], 'NV-0001')
+        self.assertTrue(tarea.reporte_errores)
+        self.assertFalse(Producto.objects.exists())
+
+        self.assertTrue(confirmar_plan(tarea))
+        self.assertFalse(confirmar_plan(tarea))  # Doble click
+        self.assertEqual(self._estado(tarea), 'PENDIENTE')
+        procesar(tomar_siguiente())
+        self.assertEqual(self._estado(tarea), 'COMPLETADA')
+        self.assertEqual(Producto.objects.get().codigo_sku, 'NV-0001')
+
+    def test_archivo_sin_columnas_falla(self):
+        tarea = encolar_importacion(SimpleUploadedFile('productos.csv', b'nombre,precio\nSobre,1000\n'))
+        procesar(tomar_siguiente())
+        self.assertEqual(self._estado(tarea), 'FALLIDA')
+        self.assertIn('codigo_sku', tarea.mensaje)
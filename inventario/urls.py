@@ -11,6 +11,9 @@ urlpatterns = [
     path('eliminar/<int:pk>/', views.eliminar_producto, name='eliminar_producto'),
     path('ajustar-stock/<int:pk>/', views.ajustar_stock, name='ajustar_stock'),
     path('importar/', views.importar_productos, name='importar_productos'),
+    path('importar/<int:pk>/estado/', views.estado_importacion, name='estado_importacion'),
+    path('importar/<int:pk>/confirmar/', views.confirmar_importacion, name='confirmar_importacion'),
+    path('importar/<int:pk>/errores/', views.reporte_errores_importacion, name='reporte_errores_importacion'),
     path('descargar-plantilla/', views.descargar_plantilla, name='descargar_plantilla'),
     
     # POS / Ventas
@@ -20,4 +23,9 @@ urlpatterns = [
     path('ventas/', views.lista_ventas, name='lista_ventas'),
     path('ventas/<int:pk>/comprobante/', views.comprobante_venta, name='comprobante_venta'),
     path('ventas/<int:pk>/anular/', views.anular_venta, name='anular_venta'),
+    
+    # Exportaciones
+    path('exportar/ventas/', views.exportar_ventas, name='exportar_ventas'),
+    path('exportar/movimientos/', views.exportar_movimientos, name='exportar_movimientos'),
+    path('exportar/productos/', views.exportar_productos, name='exportar_productos'),
 ]
\ No newline at end of file
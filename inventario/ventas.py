@@ -0,0 +1,112 @@
+"""
+Motor de ventas del POS.
+
+Registra una venta completa en una sola transaccion y con un numero fijo de
+consultas, sin importar cuantas lineas tenga: bloquea los productos de una vez,
+descuenta el stock con un UPDATE (F()), y crea detalles y movimientos con
+bulk_create.
+"""
+from collections import OrderedDict
+
+from django.db import transaction
+from django.db.models import Case, F, When
+from django.utils import timezone
+
+from .models import DetalleVenta, MovimientoStock, Producto, Venta
+from .resumen_ventas import sumar_venta
+from .signals import notificar_stock
+
+
+class VentaError(Exception):
+    """Error de validacion al registrar una venta (carrito vacio, stock insuficiente, etc)"""
+
+
+def _agrupar_items(items):
+    """Suma las cantidades por producto (un producto puede venir repetido en el carrito)"""
+    cantidades = OrderedDict()
+    for item in items:
+        try:
+            producto_id = int(item['producto_id'])
+            cantidad = int(item['cantidad'])
+        except (KeyError, TypeError, ValueError):
+            raise VentaError('El carrito contiene un item con formato inválido')
+        if cantidad <= 0:
+            raise VentaError('Las cantidades deben ser mayores a 0')
+        cantidades[producto_id] = cantidades.get(producto_id, 0) + cantidad
+    return cantidades
+
+
+def registrar_venta(items, usuario=None, cliente_nombre=None, motivo='Venta {folio}', observaciones=None,
+                    canal='POS'):
+    """
+    Registra una venta a partir de una lista de items {'producto_id', 'cantidad'}.
+    Lanza VentaError si el carrito esta vacio, un producto no existe o no hay stock suficiente.
+    """
+    cantidades = _agrupar_items(items)
+    if not cantidades:
+        raise VentaError('El carrito está vacío')
+
+    with transaction.atomic():
+        # Bloquear todas las filas involucradas en una sola consulta
+        productos = Producto.objects.select_for_update().in_bulk(list(cantidades))
+
+        for producto_id, cantidad in cantidades.items():
+            producto = productos.get(producto_id)
+            if producto is None or not producto.activo:
+                raise VentaError(f'El producto {producto_id} no existe o no está activo')
+            # Lo reservado por pedidos web en pago no se puede vender en el POS
+            if producto.stock_disponible < cantidad:
+                raise VentaError(
+                    f'Stock insuficiente para {producto.nombre}. Disponible: {max(producto.stock_disponible, 0)}'
+                )
+
+        # Totales en memoria (mismo calculo que Venta.calcular_totales)
+        subtotal = sum(productos[pid].precio * cantidad for pid, cantidad in cantidades.items())
+        venta = Venta(
+            cliente_nombre=cliente_nombre or None,
+            usuario=usuario,
+            observaciones=observaciones,
+            canal=canal,
+        )
+        venta.asignar_totales(subtotal)
+        venta.save()
+        sumar_venta(venta, unidades=sum(cantidades.values()))
+
+        # Descontar stock de todos los productos con un solo UPDATE
+        actualizados = Producto.objects.filter(
+            id__in=list(cantidades),
+            stock__gte=F('stock_reservado') + Case(*[When(id=pid, then=cantidad) for pid, cantidad in cantidades.items()]),
+        ).update(
+            stock=Case(*[When(id=pid, then=F('stock') - cantidad) for pid, cantidad in cantidades.items()]),
+            fecha_modificacion=timezone.now(),
+        )
+        if actualizados != len(cantidades):
+            raise VentaError('El stock cambió durante la venta, intente nuevamente')
+
+        DetalleVenta.objects.bulk_create([
+            DetalleVenta(
+                venta=venta,
+                producto=productos[pid],
+                cantidad=cantidad,
+                precio_unitario=productos[pid].precio,
+                subtotal=cantidad * productos[pid].precio,
+            )
+            for pid, cantidad in cantidades.items()
+        ])
+
+        MovimientoStock.objects.bulk_create([
+            MovimientoStock(
+                producto=productos[pid],
+                tipo='VENTA',
+                cantidad=cantidad,
+                stock_anterior=productos[pid].stock,
+                stock_nuevo=productos[pid].stock - cantidad,
+                motivo=motivo.format(folio=venta.folio),
+                usuario=usuario,
+            )
+            for pid, cantidad in cantidades.items()
+        ])
+
+        notificar_stock(cantidades)
+
+    return venta
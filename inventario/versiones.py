@@ -0,0 +1,44 @@
+"""
+Numeros de version compartidos entre procesos.
+
+El cache de Django por defecto es de cada proceso (LocMemCache), asi que un
+numero de version guardado ahi no avisa a los demas workers ni al worker de
+importaciones. VersionCompartida lo guarda en la tabla Secuencia (ver
+inventario/secuencias.py), con un UPDATE atomico al subirlo.
+
+Cada proceso relee el valor como maximo cada `segundos`: consultarlo en cada
+peticion no cuesta una consulta, y los cambios de otro
+proceso se ven con ese atraso. Los cambios hechos en el mismo proceso se ven de
+inmediato.
+"""
+import time
+
+from django.db import transaction
+
+
+class VersionCompartida:
+    """Version `clave` de la tabla Secuencia, releida como maximo cada `segundos`"""
+
+    def __init__(self, clave, segundos=2):
+        self.clave = clave
+        self.segundos = segundos
+        self._valor = None
+        self._leida = 0
+
+    def actual(self):
+        if self._valor is None or time.monotonic() - self._leida >= self.segundos:
+            from .models import Secuencia
+            self._valor = Secuencia.objects.filter(clave=self.clave).values_list('valor', flat=True).first() or 0
+            self._leida = time.monotonic()
+        return self._valor
+
+    def subir(self):
+        """Sube la version (en su propia transaccion si no hay una en curso) y retorna la nueva"""
+        from .secuencias import reservar_bloque
+        self._valor = reservar_bloque(self.clave)
+        self._leida = time.monotonic()
+        return self._valor
+
+    def subir_al_confirmar(self):
+        """Sube la version cuando se confirme la transaccion en curso (asi no bloquea la fila antes)"""
+        transaction.on_commit(self.subir)
@@ -1,23 +1,30 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib import messages
-from .models import Producto, Categoria, Subcategoria, MovimientoStock, Venta, DetalleVenta
-from django.http import JsonResponse
-from django.db.models import Q
+from .models import Producto, Categoria, Subcategoria, MovimientoStock, Venta, DetalleVenta, TareaImportacion
+from django.http import FileResponse, Http404, HttpResponse, JsonResponse
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import Count, Q, Sum
 from decimal import Decimal
+from .ventas import registrar_venta, VentaError
+from .busqueda import buscar_productos
+from .paginacion import es_parcial, paginar_keyset, respuesta_parcial
+from .resumen_ventas import cambiar_estado, filas_resumen, totales_por_estado
+from .indice_pos import indice as indice_pos
+from .tareas import confirmar_plan, encolar_importacion
+from . import exportaciones, taxonomia
 from registration.decorators import rol_requerido, solo_administrador, solo_vendedor_o_admin
-#imports para excel
-import pandas as pd
-from django.http import HttpResponse
-from openpyxl import Workbook
-from openpyxl.styles import Font, PatternFill
 
 
 @solo_vendedor_o_admin
 def lista_productos(request):
     """Vista principal del inventario - Solo vendedores y admin"""
-    productos = Producto.objects.filter(activo=True).select_related('categoria', 'subcategoria')
-    categorias = Categoria.objects.filter(activo=True)
-    subcategorias = Subcategoria.objects.filter(activo=True)
+    productos = Producto.objects.filter(activo=True).select_related('categoria', 'subcategoria').con_estado_stock()
+    categorias = taxonomia.categorias_activas()
+    subcategorias = taxonomia.subcategorias_activas()
     
     # Filtros
     categoria_filtro = request.GET.get('categoria')
@@ -31,24 +38,27 @@ def lista_productos(request):
         productos = productos.filter(subcategoria_id=subcategoria_filtro)
     
     if busqueda:
-        productos = productos.filter(nombre__icontains=busqueda) | productos.filter(codigo_sku__icontains=busqueda)
+        productos = buscar_productos(productos, busqueda)
     
-    # Estadisticas
-    total_productos = productos.count()
-    total_unidades = sum(p.stock for p in productos)
+    # Pagina actual (keyset); las siguientes llegan por scroll infinito
+    orden = ('-relevancia', 'codigo_sku') if busqueda else ('codigo_sku',)
+    pagina = paginar_keyset(request, productos, orden, tamano=50)
+    if es_parcial(request):
+        return respuesta_parcial(request, 'inventario/_filas_productos.html', {'productos': pagina.items}, pagina)
     
-    # Contar productos con stock bajo y critico
-    stock_bajo = sum(1 for p in productos if p.get_estado_stock() == 'BAJO')
-    stock_critico = sum(1 for p in productos if p.get_estado_stock() == 'CRITICO')
+    # Estadisticas (unidades y productos con stock bajo/critico en una sola consulta)
+    resumen = productos.resumen_stock()
     
     context = {
-        'productos': productos,
+        'productos': pagina.items,
+        'pagina': pagina,
         'categorias': categorias,
         'subcategorias': subcategorias,
-        'total_productos': total_productos,
-        'total_unidades': total_unidades,
-        'stock_bajo': stock_bajo,
-        'stock_critico': stock_critico,
+        'total_productos': resumen['total_productos'],
+        'total_unidades': resumen['total_unidades'],
+        'stock_bajo': resumen['stock_bajo'],
+        'stock_critico': resumen['stock_critico'],
+        'parametros_exportacion': _parametros_exportacion(request),
     }
  
     return render(request, 'inventario/lista_productos.html', context)
@@ -253,7 +263,7 @@ def eliminar_producto(request, pk):
     
     if request.method == 'POST':
         producto.activo = False
-        producto.save()
+        producto.save(update_fields=['activo', 'fecha_modificacion'])
         messages.success(request, f'Producto {producto.codigo_sku} dado de baja exitosamente')
     
     return redirect('inventario:lista_productos')
@@ -264,9 +274,8 @@ def ajustar_stock(request, pk):
     """Vista para ajustar stock de un producto con historial - Vendedores y Admin"""
     producto = get_object_or_404(Producto, pk=pk)
     
-    # Obtener perfil del usuario
-    perfil = request.user.perfilusuario
-    es_vendedor = perfil.rol.nombre == 'Vendedor'
+    # Rol del usuario (resuelto por PerfilMiddleware)
+    es_vendedor = request.rol == 'Vendedor'
     
     #Obtener historial de movimientos del producto
     movimientos = MovimientoStock.objects.filter(producto=producto).order_by('-fecha_movimiento')[:20]
@@ -293,38 +302,53 @@ def ajustar_stock(request, pk):
                 messages.error (request, 'La cantidad debe ser mayor a 0')
                 return redirect('inventario:ajustar_stock', pk=pk)
             
-            #Guardar stock anterior
-            stock_anterior = producto.stock
-            
-            #Calcular nuevo stock segun el tipo de movimiento
-            if tipo_movimiento == 'ENTRADA':
-                producto.stock += cantidad
+            with transaction.atomic():
+                # Releer con bloqueo: una venta o reserva simultanea no se pierde
+                producto = Producto.objects.select_for_update().get(pk=pk)
                 
-            elif tipo_movimiento == 'SALIDA':
+                #Guardar stock anterior
+                stock_anterior = producto.stock
                 
-                if producto.stock < cantidad:
-                    messages.error(request, f'Stock insuficiente. Stock actual: {producto.stock}')
-                    return redirect('inventario:ajustar_stock', pk=pk)
-                producto.stock -= cantidad
+                #Calcular nuevo stock segun el tipo de movimiento
+                if tipo_movimiento == 'ENTRADA':
+                    producto.stock += cantidad
+                    
+                elif tipo_movimiento == 'SALIDA':
+                    # Lo reservado por pedidos web en pago no se puede sacar
+                    if producto.stock_disponible < cantidad:
+                        messages.error(
+                            request,
+                            f'Stock insuficiente. Disponible: {max(producto.stock_disponible, 0)} '
+                            f'(reservado por pedidos web: {producto.stock_reservado})'
+                        )
+                        return redirect('inventario:ajustar_stock', pk=pk)
+                    producto.stock -= cantidad
+                    
+                elif tipo_movimiento == 'AJUSTE':
+                    if cantidad < producto.stock_reservado:
+                        messages.error(
+                            request,
+                            f'El stock no puede quedar bajo {producto.stock_reservado} unidades: '
+                            f'están reservadas por pedidos web en pago'
+                        )
+                        return redirect('inventario:ajustar_stock', pk=pk)
+                    producto.stock = cantidad
+                    
+                stock_nuevo = producto.stock
+                producto.save(update_fields=['stock', 'fecha_modificacion'])
                 
-            elif tipo_movimiento == 'AJUSTE':
-                producto.stock = cantidad
+                #Registrar producto en el historial
+                MovimientoStock.objects.create(
+                    producto = producto,
+                    tipo = tipo_movimiento,
+                    cantidad = cantidad if tipo_movimiento != 'AJUSTE' else abs(stock_nuevo - stock_anterior),
+                    stock_anterior = stock_anterior,
+                    stock_nuevo = stock_nuevo,
+                    motivo = motivo,
+                    observaciones = observaciones,
+                    usuario = request.user if request.user.is_authenticated else None
+                )
                 
-            stock_nuevo = producto.stock
-            producto.save()
-            
-            #Registrar producto en el historial
-            MovimientoStock.objects.create(
-                producto = producto,
-                tipo = tipo_movimiento,
-                cantidad = cantidad if tipo_movimiento != 'AJUSTE' else abs(stock_nuevo - stock_anterior),
-                stock_anterior = stock_anterior,
-                stock_nuevo = stock_nuevo,
-                motivo = motivo,
-                observaciones = observaciones,
-                usuario = request.user if request.user.is_authenticated else None
-            )
-            
             messages.success(request, f'Stock actualizado correctamente, Nuevo Stock: {stock_nuevo}')
             return redirect('inventario:ajustar_stock', pk=pk)
         
@@ -343,17 +367,7 @@ def ajustar_stock(request, pk):
 @solo_vendedor_o_admin
 def importar_productos(request):
     """Vista para importar productos desde Excel/CSV - Vendedores y Admin"""
-    if request.method == 'GET':
-        # Solo limpiar errores si viene con el parámetro 'limpiar' o si no hay errores previos
-        if request.GET.get('limpiar') == '1' or not request.session.get('errores_importacion'):
-            if 'errores_importacion' in request.session:
-                del request.session['errores_importacion']
-                request.session.modified = True
-        
-        return render(request, 'inventario/importar_productos.html')
-    
-    elif request.method == 'POST':
-        # ... (mantén todo el código existente de importación)
+    if request.method == 'POST':
         if 'archivo' not in request.FILES:
             messages.error(request, 'No se ha seleccionado ningun archivo')
             return redirect('inventario:importar_productos')
@@ -364,184 +378,75 @@ def importar_productos(request):
             messages.error(request, 'Formato de archivo no valido. Use .xlsx, .xls o .csv')
             return redirect('inventario:importar_productos')
         
-        try:
-            if archivo.name.endswith('.csv'):
-                df = pd.read_csv(archivo)
-            else:
-                df = pd.read_excel(archivo)
-                
-            columnas_requeridas = ['codigo_sku', 'nombre', 'categoria', 'precio']
-            columnas_faltantes = [col for col in columnas_requeridas if col not in df.columns]
-            
-            if columnas_faltantes:
-                messages.error(request, f'Faltan columnas requeridas: {", ".join(columnas_faltantes)}')
-                return redirect('inventario:importar_productos')
-            
-            productos_validos = []
-            productos_actualizados = 0
-            errores = []
-            
-            for index, row in df.iterrows():
-                fila_num = index + 2
-                
-                try:
-                    if pd.isna(row['codigo_sku']):
-                        errores.append(f'Fila {fila_num}: Falta el código SKU del producto')
-                        continue
-                    
-                    if pd.isna(row['nombre']):
-                        errores.append(f'Fila {fila_num}: Falta el nombre del producto')
-                        continue
-                        
-                    if pd.isna(row['precio']):
-                        errores.append(f'Fila {fila_num}: Falta el precio del producto')
-                        continue
-                    
-                    try:
-                        precio = float(row['precio'])
-                        if precio <= 0:
-                            errores.append(f'Fila {fila_num}: El precio debe ser mayor a 0')
-                            continue
-                    except:
-                        errores.append(f'Fila {fila_num}: El precio tiene un formato inválido')
-                        continue
-                    
-                    if pd.isna(row['categoria']):
-                        errores.append(f'Fila {fila_num}: Falta la categoría del producto')
-                        continue
-                        
-                    try:
-                        categoria = Categoria.objects.get(nombre=row['categoria'])
-                    except Categoria.DoesNotExist:
-                        errores.append(f"Fila {fila_num}: La categoría '{row['categoria']}' no existe en el sistema. Créela primero en el admin.")
-                        continue
-                    
-                    subcategoria = None
-                    if not pd.isna(row.get('subcategoria')):
-                        try:
-                            subcategoria = Subcategoria.objects.get(nombre=row['subcategoria'])
-                        except Subcategoria.DoesNotExist:
-                            errores.append(f"Fila {fila_num}: La subcategoría '{row['subcategoria']}' no existe en el sistema. Créela primero en el admin.")
-                            continue
-                    
-                    producto_existente = Producto.objects.filter(codigo_sku=row['codigo_sku']).first()
-
-                    if producto_existente:
-                        if producto_existente.nombre.lower() != str(row['nombre']).lower():
-                            errores.append(f"Fila {fila_num}: El código SKU '{row['codigo_sku']}' ya existe con un producto diferente ('{producto_existente.nombre}'). No se puede usar el mismo SKU para productos distintos.")
-                            continue
-                        
-                        if producto_existente.categoria != categoria:
-                            errores.append(f"Fila {fila_num}: El código SKU '{row['codigo_sku']}' existe pero con categoría diferente. SKU registrado: '{producto_existente.categoria.nombre}', Excel: '{categoria.nombre}'")
-                            continue
-                        
-                        if producto_existente.subcategoria and subcategoria:
-                            if producto_existente.subcategoria != subcategoria:
-                                errores.append(f"Fila {fila_num}: El código SKU '{row['codigo_sku']}' existe pero con subcategoría diferente. SKU registrado: '{producto_existente.subcategoria.nombre}', Excel: '{subcategoria.nombre}'")
-                                continue
-                        
-                        stock_a_sumar = int(row.get('stock', 0)) if not pd.isna(row.get('stock')) else 0
-                        
-                        if stock_a_sumar > 0:
-                            stock_anterior = producto_existente.stock
-                            producto_existente.stock += stock_a_sumar
-                            producto_existente.save()
-                            
-                            MovimientoStock.objects.create(
-                                producto=producto_existente,
-                                tipo='ENTRADA',
-                                cantidad=stock_a_sumar,
-                                stock_anterior=stock_anterior,
-                                stock_nuevo=producto_existente.stock,
-                                motivo=f'Importación masiva desde Excel',
-                                observaciones=f'Importado desde archivo Excel - Fila {fila_num}',
-                                usuario=request.user if request.user.is_authenticated else None
-                            )
-                            
-                            productos_actualizados += 1
-                        
-                        continue
-                    
-                    producto = Producto(
-                        codigo_sku=str(row['codigo_sku']),
-                        nombre=str(row['nombre']),
-                        categoria=categoria,
-                        subcategoria=subcategoria,
-                        descripcion=str(row.get('descripcion', '')) if not pd.isna(row.get('descripcion')) else '',
-                        precio=precio,
-                        stock=int(row.get('stock', 0)) if not pd.isna(row.get('stock')) else 0,
-                        stock_minimo=int(row.get('stock_minimo', 5)) if not pd.isna(row.get('stock_minimo')) else 5,
-                        stock_critico=int(row.get('stock_critico', 2)) if not pd.isna(row.get('stock_critico')) else 2,
-                    )
-                    
-                    productos_validos.append(producto)
-                    
-                except Exception as e:
-                    errores.append(f"Fila {fila_num}: Error de formato en los datos. Revise que todas las columnas tengan el formato correcto.")
-            
-            productos_nuevos = 0
-            if productos_validos:
-                Producto.objects.bulk_create(productos_validos)
-                productos_nuevos = len(productos_validos)
-
-            if productos_nuevos > 0 and productos_actualizados > 0:
-                messages.success(request, f'✓ Se importaron {productos_nuevos} productos nuevos y se actualizó el stock de {productos_actualizados} productos existentes')
-            elif productos_nuevos > 0:
-                messages.success(request, f'✓ Se importaron {productos_nuevos} productos nuevos exitosamente')
-            elif productos_actualizados > 0:
-                messages.success(request, f'✓ Se actualizó el stock de {productos_actualizados} productos existentes')
-            
-            if errores:
-                request.session['errores_importacion'] = errores[:20]
-                request.session.modified = True
-            else:
-                if 'errores_importacion' in request.session:
-                    del request.session['errores_importacion']
-                    request.session.modified = True
-            
-            return redirect('inventario:importar_productos')
-        
-        except Exception as e:
-            messages.error(request, f'Error al procesar el archivo: {str(e)}')
-            return redirect('inventario:importar_productos')
+        # La importacion corre en el worker (manage.py procesar_importaciones);
+        # la pagina consulta el avance de la tarea
+        tarea = encolar_importacion(archivo, usuario=request.user, simular=request.POST.get('simular') == '1')
+        return redirect(f"{reverse('inventario:importar_productos')}?tarea={tarea.pk}")
+    
+    tarea = None
+    if request.GET.get('tarea', '').isdigit():
+        tarea = _tarea_del_usuario(request, request.GET['tarea'])
+    
+    return render(request, 'inventario/importar_productos.html', {'tarea': tarea})
+
+
+def _tarea_del_usuario(request, pk):
+    """Tarea de importacion del usuario (el administrador ve todas)"""
+    tareas = TareaImportacion.objects.all()
+    if request.rol != 'Administrador':
+        tareas = tareas.filter(usuario=request.user)
+    return get_object_or_404(tareas, pk=pk)
+
+
+@solo_vendedor_o_admin
+def estado_importacion(request, pk):
+    """Avance de una importacion en JSON (la pagina de importacion lo consulta)"""
+    tarea = _tarea_del_usuario(request, pk)
+    return JsonResponse({
+        'estado': tarea.estado,
+        'estado_display': tarea.get_estado_display(),
+        'terminada': tarea.terminada,
+        'filas_procesadas': tarea.filas_procesadas,
+        'filas_fallidas': tarea.filas_fallidas,
+        'productos_nuevos': tarea.productos_nuevos,
+        'productos_actualizados': tarea.productos_actualizados,
+        'mensaje': tarea.mensaje,
+        'url_reporte': reverse('inventario:reporte_errores_importacion', args=[tarea.pk]) if tarea.reporte_errores else None,
+    })
+
+
+@solo_vendedor_o_admin
+def confirmar_importacion(request, pk):
+    """Aplicar el plan de una importacion simulada (vuelve a la cola del worker)"""
+    tarea = _tarea_del_usuario(request, pk)
+    if request.method == 'POST':
+        if confirmar_plan(tarea):
+            messages.success(request, 'Importación confirmada, se aplicará en unos segundos')
+        else:
+            messages.error(request, 'La importación no está esperando confirmación')
+    return redirect(f"{reverse('inventario:importar_productos')}?tarea={tarea.pk}")
+
+
+@solo_vendedor_o_admin
+def reporte_errores_importacion(request, pk):
+    """Descargar el reporte completo de errores de una importacion (CSV)"""
+    tarea = _tarea_del_usuario(request, pk)
+    if not tarea.reporte_errores:
+        raise Http404('La importacion no tiene errores')
+    return FileResponse(
+        tarea.reporte_errores.open('rb'),
+        as_attachment=True,
+        filename=f'errores_importacion_{tarea.pk}.csv',
+        content_type='text/csv',
+    )
 
 
 @solo_vendedor_o_admin
 def descargar_plantilla(request):
     """Generar y descargar plantilla Excel para importacion - Vendedores y Admin"""
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "Plantilla Productos"
-    
-    headers = ['codigo_sku', 'nombre', 'categoria', 'subcategoria', 'descripcion', 'precio', 'stock', 'stock_minimo', 'stock_critico']
+    from .importers import plantilla_productos
     
-    header_fill = PatternFill(start_color='4472C4', end_color='4472C4', fill_type="solid")
-    header_font = Font(bold=True, color="FFFFFF")
-    
-    for col_num, header in enumerate(headers, 1):
-        cell = ws.cell(row=1, column=col_num, value=header)
-        cell.fill = header_fill
-        cell.font = header_font
-        
-    ejemplos = [
-        ['MC-0001', 'Starter Deck Digimon TCG', 'Decks', 'Digimon', 'Deck de inicio', 15990, 10, 5, 2],
-        ['MC-0002', 'Sobre Pokemon Escarlata', 'Sobres', 'Pokemon', 'Sobre de expansión', 4500, 50, 10, 3],
-        ['MC-0003', 'Figura Luffy Gear 5', 'Figuras', 'One Piece', 'Figura coleccionable', 45990, 5, 2, 1],
-    ]
-    
-    for row_num, ejemplo in enumerate(ejemplos, 2):
-        for col_num, value in enumerate(ejemplo, 1):
-            ws.cell(row=row_num, column=col_num, value=value)
-            
-    ws.column_dimensions['A'].width = 15
-    ws.column_dimensions['B'].width = 35
-    ws.column_dimensions['C'].width = 15
-    ws.column_dimensions['D'].width = 15
-    ws.column_dimensions['E'].width = 30
-    ws.column_dimensions['F'].width = 12
-    ws.column_dimensions['G'].width = 10
-    ws.column_dimensions['H'].width = 15
-    ws.column_dimensions['I'].width = 15
+    wb = plantilla_productos()
     
     response = HttpResponse(
         content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
@@ -559,22 +464,26 @@ def descargar_plantilla(request):
 @solo_vendedor_o_admin
 def pos(request):
     """Vista principal del POS (Punto de Venta) - Solo vendedores y admin"""
-    productos = Producto.objects.filter(activo=True, stock__gt=0).select_related('categoria', 'subcategoria')
-    categorias = Categoria.objects.filter(activo=True)
+    productos = Producto.objects.disponibles().select_related('categoria', 'subcategoria')
+    categorias = taxonomia.con_conteo(taxonomia.categorias_activas(), taxonomia.facetas()['categorias'])
     
     busqueda = request.GET.get('busqueda')
     categoria_filtro = request.GET.get('categoria')
     
     if busqueda:
-        productos = productos.filter(
-            Q(codigo_sku__icontains=busqueda) | Q(nombre__icontains=busqueda)
-        )
+        productos = buscar_productos(productos, busqueda)
     
     if categoria_filtro:
         productos = productos.filter(categoria_id=categoria_filtro)
     
+    orden = ('-relevancia', 'codigo_sku') if busqueda else ('codigo_sku',)
+    pagina = paginar_keyset(request, productos, orden, tamano=40)
+    if es_parcial(request):
+        return respuesta_parcial(request, 'inventario/_tarjetas_pos.html', {'productos': pagina.items}, pagina)
+    
     context = {
-        'productos': productos,
+        'productos': pagina.items,
+        'pagina': pagina,
         'categorias': categorias,
     }
     
@@ -589,24 +498,8 @@ def buscar_producto_ajax(request):
     if len(query) < 2:
         return JsonResponse({'productos': []})
     
-    productos = Producto.objects.filter(
-        Q(codigo_sku__icontains=query) | Q(nombre__icontains=query),
-        activo=True,
-        stock__gt=0
-    ).select_related('categoria', 'subcategoria')[:10]
-    
-    productos_data = []
-    for p in productos:
-        productos_data.append({
-            'id': p.id,
-            'codigo_sku': p.codigo_sku,
-            'nombre': p.nombre,
-            'precio': float(p.precio),
-            'stock': p.stock,
-            'imagen_url': p.get_imagen_url(),
-            'categoria': p.categoria.nombre,
-            'subcategoria': p.subcategoria.nombre if p.subcategoria else '',
-        })
+    # Indice en memoria: SKU exacto o prefijos de palabras, sin consultar la BD
+    productos_data = indice_pos.buscar(query, limite=10)
     
     return JsonResponse({'productos': productos_data})
 
@@ -622,51 +515,12 @@ def procesar_venta(request):
             carrito = data.get('carrito', [])
             cliente_nombre = data.get('cliente_nombre', '').strip()
             
-            if not carrito:
-                return JsonResponse({
-                    'success': False,
-                    'error': 'El carrito está vacío'
-                }, status=400)
-            
-            for item in carrito:
-                producto = Producto.objects.get(id=item['producto_id'])
-                if producto.stock < item['cantidad']:
-                    return JsonResponse({
-                        'success': False,
-                        'error': f'Stock insuficiente para {producto.nombre}. Disponible: {producto.stock}'
-                    }, status=400)
-            
-            venta = Venta.objects.create(
-                cliente_nombre=cliente_nombre if cliente_nombre else None,
-                usuario=request.user if request.user.is_authenticated else None
+            venta = registrar_venta(
+                carrito,
+                usuario=request.user if request.user.is_authenticated else None,
+                cliente_nombre=cliente_nombre,
             )
             
-            for item in carrito:
-                producto = Producto.objects.get(id=item['producto_id'])
-                
-                DetalleVenta.objects.create(
-                    venta=venta,
-                    producto=producto,
-                    cantidad=item['cantidad'],
-                    precio_unitario=producto.precio
-                )
-                
-                stock_anterior = producto.stock
-                producto.stock -= item['cantidad']
-                producto.save()
-                
-                MovimientoStock.objects.create(
-                    producto=producto,
-                    tipo='VENTA',
-                    cantidad=item['cantidad'],
-                    stock_anterior=stock_anterior,
-                    stock_nuevo=producto.stock,
-                    motivo=f'Venta {venta.folio}',
-                    usuario=request.user if request.user.is_authenticated else None
-                )
-            
-            venta.calcular_totales()
-            
             return JsonResponse({
                 'success': True,
                 'venta_id': venta.id,
@@ -674,6 +528,12 @@ def procesar_venta(request):
                 'total': float(venta.total)
             })
             
+        except VentaError as e:
+            return JsonResponse({
+                'success': False,
+                'error': str(e)
+            }, status=400)
+        
         except Exception as e:
             return JsonResponse({
                 'success': False,
@@ -689,16 +549,22 @@ def procesar_venta(request):
 @solo_vendedor_o_admin
 def lista_ventas(request):
     """Lista de ventas realizadas - Solo vendedores y admin"""
-    ventas = Venta.objects.all().select_related('usuario').prefetch_related('detalles__producto')
+    ventas = Venta.objects.all().select_related('usuario')
     
     estado_filtro = request.GET.get('estado')
     fecha_desde = request.GET.get('fecha_desde')
     fecha_hasta = request.GET.get('fecha_hasta')
     busqueda = request.GET.get('busqueda')
+    vendedor_filtro = request.GET.get('vendedor')
+    if vendedor_filtro and not vendedor_filtro.isdigit():
+        vendedor_filtro = None
     
     if estado_filtro:
         ventas = ventas.filter(estado=estado_filtro)
     
+    if vendedor_filtro:
+        ventas = ventas.filter(usuario_id=vendedor_filtro)
+    
     if fecha_desde:
         ventas = ventas.filter(fecha_venta__date__gte=fecha_desde)
     
@@ -711,20 +577,129 @@ def lista_ventas(request):
             Q(cliente_nombre__icontains=busqueda)
         )
     
-    total_ventas = ventas.filter(estado='COMPLETADA').count()
-    total_monto = sum(v.total for v in ventas.filter(estado='COMPLETADA'))
-    ventas_anuladas = ventas.filter(estado='ANULADA').count()
+    # Los detalles se cargan solo para las ventas de la pagina
+    pagina = paginar_keyset(
+        request, ventas.prefetch_related('detalles__producto'), ('-fecha_venta', '-id'), tamano=30
+    )
+    if es_parcial(request):
+        return respuesta_parcial(request, 'inventario/_filas_ventas.html', {'ventas': pagina.items}, pagina)
+    
+    # Estadisticas: desde el resumen diario, salvo que se busque por folio/cliente
+    # (texto que el resumen no tiene); en ese caso, una sola consulta sobre las ventas
+    if busqueda:
+        resumen = ventas.aggregate(
+            total_registros=Count('id'),
+            total_ventas=Count('id', filter=Q(estado='COMPLETADA')),
+            total_monto=Sum('total', filter=Q(estado='COMPLETADA')),
+            ventas_anuladas=Count('id', filter=Q(estado='ANULADA')),
+        )
+    else:
+        por_estado = totales_por_estado(filas_resumen(
+            desde=fecha_desde, hasta=fecha_hasta, estado=estado_filtro, usuario=vendedor_filtro
+        ))
+        resumen = {
+            'total_registros': sum(fila['cantidad'] for fila in por_estado.values()),
+            'total_ventas': por_estado['COMPLETADA']['cantidad'],
+            'total_monto': por_estado['COMPLETADA']['total'],
+            'ventas_anuladas': por_estado['ANULADA']['cantidad'],
+        }
     
     context = {
-        'ventas': ventas,
-        'total_ventas': total_ventas,
-        'total_monto': total_monto,
-        'ventas_anuladas': ventas_anuladas,
+        'ventas': pagina.items,
+        'pagina': pagina,
+        'total_registros': resumen['total_registros'],
+        'total_ventas': resumen['total_ventas'],
+        'total_monto': resumen['total_monto'] or 0,
+        'ventas_anuladas': resumen['ventas_anuladas'],
+        'vendedores': User.objects.filter(
+            perfilusuario__rol__nombre__in=['Vendedor', 'Administrador']
+        ).order_by('username'),
+        'parametros_exportacion': _parametros_exportacion(request),
     }
     
     return render(request, 'inventario/lista_ventas.html', context)
 
 
+# ====================================
+# EXPORTACIONES (CSV / EXCEL)
+# ====================================
+
+def _parametros_exportacion(request):
+    """Filtros actuales del listado para los enlaces de exportacion (sin cursor ni busqueda)"""
+    parametros = request.GET.copy()
+    for clave in ('cursor', 'parcial', 'busqueda'):
+        parametros.pop(clave, None)
+    return parametros.urlencode()
+
+
+def _fecha_param(request, nombre):
+    try:
+        return parse_date(request.GET.get(nombre, ''))
+    except ValueError:
+        return None
+
+
+def _id_param(request, nombre):
+    valor = request.GET.get(nombre, '')
+    return int(valor) if valor.isdigit() else None
+
+
+def _nombre_exportacion(base, desde, hasta):
+    partes = [base]
+    if desde:
+        partes.append(f'desde_{desde:%Y%m%d}')
+    if hasta:
+        partes.append(f'hasta_{hasta:%Y%m%d}')
+    return '_'.join(partes)
+
+
+@solo_vendedor_o_admin
+def exportar_ventas(request):
+    """Ventas con su detalle (una fila por producto vendido) en CSV o Excel"""
+    desde = _fecha_param(request, 'fecha_desde')
+    hasta = _fecha_param(request, 'fecha_hasta')
+    estado = request.GET.get('estado')
+    encabezados, filas = exportaciones.filas_ventas(
+        desde=desde,
+        hasta=hasta,
+        estado=estado if estado in dict(Venta.ESTADO_CHOICES) else None,
+        vendedor=_id_param(request, 'vendedor'),
+        canal=request.GET.get('canal') if request.GET.get('canal') in dict(Venta.CANAL_CHOICES) else None,
+    )
+    return exportaciones.respuesta(
+        request.GET.get('formato'), _nombre_exportacion('ventas', desde, hasta), encabezados, filas, 'Ventas'
+    )
+
+
+@solo_vendedor_o_admin
+def exportar_movimientos(request):
+    """Movimientos de stock en CSV o Excel"""
+    desde = _fecha_param(request, 'fecha_desde')
+    hasta = _fecha_param(request, 'fecha_hasta')
+    tipo = request.GET.get('tipo')
+    encabezados, filas = exportaciones.filas_movimientos(
+        desde=desde,
+        hasta=hasta,
+        tipo=tipo if tipo in dict(MovimientoStock.TIPO_MOVIMIENTO) else None,
+        usuario=_id_param(request, 'vendedor'),
+    )
+    return exportaciones.respuesta(
+        request.GET.get('formato'), _nombre_exportacion('movimientos_stock', desde, hasta), encabezados, filas, 'Movimientos'
+    )
+
+
+@solo_vendedor_o_admin
+def exportar_productos(request):
+    """Inventario (productos activos) en CSV o Excel"""
+    encabezados, filas = exportaciones.filas_productos(
+        categoria=_id_param(request, 'categoria'),
+        subcategoria=_id_param(request, 'subcategoria'),
+    )
+    return exportaciones.respuesta(
+        request.GET.get('formato'), f'inventario_{timezone.localdate():%Y%m%d}', encabezados, filas, 'Inventario'
+    )
+
+
 @solo_vendedor_o_admin
 def comprobante_venta(request, pk):
     """Generar comprobante de venta - Solo vendedores y admin"""
@@ -750,25 +725,38 @@ def anular_venta(request, pk):
             return redirect('inventario:lista_ventas')
         
         try:
-            for detalle in venta.detalles.all():
-                producto = detalle.producto
-                stock_anterior = producto.stock
-                producto.stock += detalle.cantidad
-                producto.save()
+            with transaction.atomic():
+                # Releer con bloqueo: dos anulaciones simultaneas no reponen el stock dos veces
+                venta = Venta.objects.select_for_update().get(pk=pk)
+                if venta.estado == 'ANULADA':
+                    messages.warning(request, f'La venta {venta.folio} ya está anulada')
+                    return redirect('inventario:lista_ventas')
                 
-                MovimientoStock.objects.create(
-                    producto=producto,
-                    tipo='ANULACION',
-                    cantidad=detalle.cantidad,
-                    stock_anterior=stock_anterior,
-                    stock_nuevo=producto.stock,
-                    motivo=f'Anulación de venta {venta.folio}',
-                    observaciones=f'Se repone stock por anulación de venta',
-                    usuario=request.user if request.user.is_authenticated else None
-                )
-            
-            venta.estado = 'ANULADA'
-            venta.save()
+                detalles = list(venta.detalles.all())
+                # Productos bloqueados: una venta simultanea (UPDATE con F()) no se pierde al reponer
+                productos = Producto.objects.select_for_update().in_bulk([detalle.producto_id for detalle in detalles])
+                unidades = 0
+                for detalle in detalles:
+                    unidades += detalle.cantidad
+                    producto = productos[detalle.producto_id]
+                    stock_anterior = producto.stock
+                    producto.stock += detalle.cantidad
+                    producto.save(update_fields=['stock', 'fecha_modificacion'])
+                    
+                    MovimientoStock.objects.create(
+                        producto=producto,
+                        tipo='ANULACION',
+                        cantidad=detalle.cantidad,
+                        stock_anterior=stock_anterior,
+                        stock_nuevo=producto.stock,
+                        motivo=f'Anulación de venta {venta.folio}',
+                        observaciones=f'Se repone stock por anulación de venta',
+                        usuario=request.user if request.user.is_authenticated else None
+                    )
+                
+                venta.estado = 'ANULADA'
+                venta.save()
+                cambiar_estado(venta, 'COMPLETADA', unidades=unidades)
             
             messages.success(request, f'Venta {venta.folio} anulada exitosamente. Stock repuesto.')
             
@@ -776,4 +764,4 @@ def anular_venta(request, pk):
             messages.error(request, f'Error al anular venta: {str(e)}')
         
         return redirect('inventario:lista_ventas')
-    return redirect('inventario:lista_ventas')
\ No newline at end of file
+    return redirect('inventario:lista_ventas')
@@ -49,6 +49,7 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'registration.middleware.PerfilMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -65,6 +66,7 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'carrito.context_processors.carrito',
             ],
         },
     },
@@ -80,10 +82,45 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # SQLite ignora select_for_update: con IMMEDIATE cada transaccion toma el
+        # bloqueo de escritura al empezar, asi las que bloquean filas (ventas,
+        # retorno de Webpay) se ejecutan de a una en vez de fallar con "database is locked"
+        'OPTIONS': {
+            'transaction_mode': 'IMMEDIATE',
+        },
+        # Base de pruebas en archivo (no en memoria): las pruebas de concurrencia
+        # abren una conexion por hilo y todas deben ver la misma base
+        'TEST': {
+            'NAME': BASE_DIR / 'test_db.sqlite3',
+        },
+    }
+}
+
+
+# Cache: resumen del carrito, paginas del catalogo y categorias (con claves
+# versionadas). Por defecto en la memoria de cada proceso: las versiones del
+# catalogo, las categorias y los precios estan en la base de datos
+# (inventario/versiones.py) y el resumen del carrito se guarda poco tiempo. Con
+# varios procesos (gunicorn) uno compartido evita que cada uno arme lo mismo:
+#   'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': BASE_DIR / 'cache'
+#   'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': 'redis://127.0.0.1:6379'
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'mundo-cartas',
+        'OPTIONS': {'MAX_ENTRIES': 10000},
     }
 }
 
 
+# Autenticacion: el usuario se carga junto a su perfil y rol (una consulta).
+# ModelBackend queda para las sesiones iniciadas antes de este cambio.
+AUTHENTICATION_BACKENDS = [
+    'registration.backends.PerfilBackend',
+    'django.contrib.auth.backends.ModelBackend',
+]
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -135,8 +172,24 @@ MEDIA_ROOT = BASE_DIR / 'media'
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Motor de busqueda de productos: 'auto' usa FTS5 en SQLite y tsvector/GIN en PostgreSQL
+# Opciones: 'auto', 'sqlite_fts', 'postgres', 'basica' (icontains)
+BUSQUEDA_PRODUCTOS_BACKEND = 'auto'
+
 TRANSBANK_ENVIRONMENT = 'TEST'  # Cambiar a 'PRODUCTION' en producción
 TRANSBANK_COMMERCE_CODE = '597055555532'  # Código de comercio de pruebas
 TRANSBANK_API_KEY = '579B532A7440BB0C9079DED94D31EA1615BACEB56610332264630D42D0A36B1C'  # API Key de pruebas
+# Servidor Webpay alternativo (ej: 'http://127.0.0.1:8001' con `manage.py webpay_local`); None = el del ambiente
+TRANSBANK_URL = None
+# Segundos maximos para conectar y para recibir la respuesta de Webpay
+TRANSBANK_TIMEOUT_CONEXION = 3.05
+TRANSBANK_TIMEOUT_RESPUESTA = 15
+# Reintentos ante errores de conexion o 502/503/504, y llamadas a Webpay en curso a la vez por proceso
+TRANSBANK_REINTENTOS = 2
+TRANSBANK_CONEXIONES = 100
+
+# Minutos que el stock de un pedido web queda reservado mientras se paga en Webpay
+# (las reservas vencidas se liberan con `python manage.py liberar_reservas`)
+RESERVA_STOCK_MINUTOS = 15
 
 SITE_URL = 'http://127.0.0.1:8000'  # Cambiar en producción
\ No newline at end of file
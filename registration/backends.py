@@ -0,0 +1,18 @@
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+
+
+class PerfilBackend(ModelBackend):
+    """
+    Igual que ModelBackend, pero al cargar el usuario de la sesion trae tambien su
+    perfil y rol en la misma consulta (JOIN). Asi request.user.perfilusuario.rol
+    no genera consultas extra en decoradores, vistas ni templates.
+    """
+
+    def get_user(self, user_id):
+        UserModel = get_user_model()
+        try:
+            user = UserModel._default_manager.select_related('perfilusuario__rol').get(pk=user_id)
+        except UserModel.DoesNotExist:
+            return None
+        return user if self.user_can_authenticate(user) else None
@@ -2,6 +2,16 @@ from django.shortcuts import redirect
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
 from functools import wraps
+from .middleware import perfil_de
+
+
+def rol_de(request):
+    """Nombre del rol del usuario (lo deja PerfilMiddleware en request.rol)"""
+    if hasattr(request, 'rol'):
+        return request.rol
+    perfil = perfil_de(request.user)
+    return perfil.rol.nombre if perfil else None
+
 
 def rol_requerido(*roles_permitidos):
     """
@@ -12,20 +22,20 @@ def rol_requerido(*roles_permitidos):
         @wraps(view_func)
         @login_required
         def wrapper(request, *args, **kwargs):
-            try:
-                perfil = request.user.perfilusuario
-                if perfil.rol.nombre in roles_permitidos:
-                    return view_func(request, *args, **kwargs)
-                else:
-                    messages.error(request, f'⛔ No tienes permisos para acceder a esta sección. Rol requerido: {", ".join(roles_permitidos)}')
-                    # Redirigir según el rol del usuario
-                    if perfil.rol.nombre == 'Cliente':
-                        return redirect('carrito:catalogo')
-                    else:
-                        return redirect('inventario:lista_productos')
-            except:
+            rol = rol_de(request)
+            if rol is None:
                 messages.error(request, '⛔ Debes tener un perfil válido para acceder')
                 return redirect('carrito:catalogo')
+            
+            if rol in roles_permitidos:
+                return view_func(request, *args, **kwargs)
+            
+            messages.error(request, f'⛔ No tienes permisos para acceder a esta sección. Rol requerido: {", ".join(roles_permitidos)}')
+            # Redirigir según el rol del usuario
+            if rol == 'Cliente':
+                return redirect('carrito:catalogo')
+            else:
+                return redirect('inventario:lista_productos')
         return wrapper
     return decorator
 
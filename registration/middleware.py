@@ -0,0 +1,46 @@
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.core.exceptions import ObjectDoesNotExist
+
+
+def perfil_de(user):
+    """Perfil del usuario o None (anonimo o sin perfil)"""
+    if not user.is_authenticated:
+        return None
+    try:
+        return user.perfilusuario
+    except ObjectDoesNotExist:
+        return None
+
+
+class PerfilMiddleware:
+    """
+    Deja en el request el perfil y el nombre del rol del usuario:
+    request.perfil (PerfilUsuario o None) y request.rol ('Administrador',
+    'Vendedor', 'Cliente' o None). Debe ir despues de AuthenticationMiddleware.
+
+    Soporta vistas asincronas (pago con Webpay): con ASGI no obliga a Django a
+    pasar toda la cadena al hilo de codigo sincrono.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.asincrono = iscoroutinefunction(get_response)
+        if self.asincrono:
+            markcoroutinefunction(self)
+
+    @staticmethod
+    def _perfil_y_rol(user):
+        perfil = perfil_de(user)
+        return perfil, perfil.rol.nombre if perfil else None
+
+    def __call__(self, request):
+        if self.asincrono:
+            return self.__acall__(request)
+        request.perfil, request.rol = self._perfil_y_rol(request.user)
+        return self.get_response(request)
+
+    async def __acall__(self, request):
+        request.perfil, request.rol = await sync_to_async(self._perfil_y_rol)(await request.auser())
+        return await self.get_response(request)
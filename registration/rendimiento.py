@@ -0,0 +1,74 @@
+"""
+Ranking de rendimiento de vendedores.
+
+`rendimiento_vendedores()` entrega los perfiles de vendedor anotados con ventas,
+ingresos, ticket promedio, unidades vendidas y fecha de la ultima venta en un
+rango de fechas, todo en una sola consulta: cada metrica es una subconsulta
+correlacionada sobre el resumen diario de ventas (pocas filas por vendedor) y
+la ultima venta sale del indice (usuario, estado, fecha_venta) de Venta.
+"""
+from datetime import datetime, time, timedelta
+
+from django.db.models import Case, DecimalField, F, IntegerField, OuterRef, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from inventario.models import Venta
+from inventario.resumen_ventas import filas_resumen
+from .models import PerfilUsuario
+
+# Criterios de orden aceptados (?orden=...) -> order_by; siempre desempata por usuario
+ORDENES = {
+    'ingresos': (F('total_ingresos').desc(), 'user__username'),
+    'ventas': (F('total_ventas').desc(), 'user__username'),
+    'ticket': (F('ticket_promedio').desc(), 'user__username'),
+    'unidades': (F('unidades').desc(), 'user__username'),
+    'ultima_venta': (F('ultima_venta').desc(nulls_last=True), 'user__username'),
+    'usuario': ('user__username',),
+}
+ORDEN_DEFAULT = 'ingresos'
+
+
+def _suma(filas, campo, output_field):
+    """Suma de `campo` en las filas del resumen del vendedor (0 si no tiene ventas)"""
+    suma = filas.filter(usuario=OuterRef('user')).values('usuario').annotate(suma=Sum(campo)).values('suma')
+    return Coalesce(Subquery(suma, output_field=output_field), Value(0), output_field=output_field)
+
+
+def _inicio_del_dia(fecha):
+    return timezone.make_aware(datetime.combine(fecha, time.min))
+
+
+def rendimiento_vendedores(desde=None, hasta=None, orden=ORDEN_DEFAULT):
+    """
+    Perfiles de vendedor anotados con total_ventas, total_ingresos, ticket_promedio,
+    unidades y ultima_venta, considerando solo ventas completadas entre `desde` y
+    `hasta` (fechas, ambas inclusive). `orden` es una clave de ORDENES.
+    """
+    filas = filas_resumen(desde=desde, hasta=hasta, estado='COMPLETADA').order_by()
+
+    ventas = Venta.objects.filter(usuario=OuterRef('user'), estado='COMPLETADA')
+    if desde:
+        ventas = ventas.filter(fecha_venta__gte=_inicio_del_dia(desde))
+    if hasta:
+        ventas = ventas.filter(fecha_venta__lt=_inicio_del_dia(hasta + timedelta(days=1)))
+
+    monto = DecimalField(max_digits=14, decimal_places=0)
+    return (
+        PerfilUsuario.objects.filter(rol__nombre='Vendedor')
+        .select_related('user')
+        .annotate(
+            total_ventas=_suma(filas, 'cantidad', IntegerField()),
+            total_ingresos=_suma(filas, 'total', monto),
+            unidades=_suma(filas, 'unidades', IntegerField()),
+            ultima_venta=Subquery(ventas.order_by('-fecha_venta').values('fecha_venta')[:1]),
+        )
+        .annotate(
+            ticket_promedio=Case(
+                When(total_ventas__gt=0, then=F('total_ingresos') / F('total_ventas')),
+                default=Value(0),
+                output_field=monto,
+            ),
+        )
+        .order_by(*ORDENES.get(orden, ORDENES[ORDEN_DEFAULT]))
+    )
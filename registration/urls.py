@@ -15,5 +15,6 @@ urlpatterns = [
     
     # Gestión de vendedores (solo Admin)
     path('vendedores/', views.lista_vendedores_view, name='lista_vendedores'),
+    path('vendedores/rendimiento/', views.rendimiento_vendedores_api, name='rendimiento_vendedores'),
     path('vendedores/<int:user_id>/editar/', views.editar_vendedor_view, name='editar_vendedor'),
 ]
\ No newline at end of file
@@ -5,11 +5,30 @@ from django.contrib.auth.models import User
 from django.contrib import messages
 from django.utils import timezone
 from django.db.models import Sum, Count
+from django.core.paginator import Paginator
+from django.http import JsonResponse
+from django.utils.dateparse import parse_date
 from .forms import CustomUserCreationForm, CustomAuthenticationForm
 from .models import PerfilUsuario
 from .decorators import solo_administrador, solo_vendedor_o_admin
+from .rendimiento import ORDEN_DEFAULT, ORDENES, rendimiento_vendedores
 from inventario.models import Producto, Venta, MovimientoStock
-from carrito.models import Carrito
+from inventario.resumen_ventas import filas_resumen, totales
+from carrito import anonimo as carrito_anonimo
+from carrito.resumen import resumen_carrito
+
+def _con_carrito_anonimo(request, destino):
+    """
+    Redirige a `destino` despues de iniciar sesion, pasando al carrito del
+    usuario lo que agrego sin sesion (en ese caso lo lleva a su carrito)
+    """
+    response = redirect(destino)
+    if carrito_anonimo.leer(request):
+        response = redirect('carrito:ver_carrito')
+        if carrito_anonimo.fusionar(request, response):
+            messages.info(request, 'Agregamos a tu carrito los productos que elegiste antes de iniciar sesión')
+    return response
+
 
 def registro_view(request):
     """Vista de registro para nuevos clientes"""
@@ -22,7 +41,7 @@ def registro_view(request):
             user = form.save()
             messages.success(request, f'¡Cuenta creada exitosamente! Bienvenido {user.username}')
             login(request, user)
-            return redirect('carrito:catalogo')
+            return _con_carrito_anonimo(request, 'carrito:catalogo')
         else:
             for error in form.errors.values():
                 messages.error(request, error)
@@ -42,12 +61,8 @@ def login_view(request):
     """Vista de inicio de sesión"""
     if request.user.is_authenticated:
         # Redirigir según el rol
-        try:
-            perfil = request.user.perfilusuario
-            if perfil.rol.nombre in ['Administrador', 'Vendedor']:
-                return redirect('inventario:lista_productos')
-        except:
-            pass
+        if request.rol in ['Administrador', 'Vendedor']:
+            return redirect('inventario:lista_productos')
         return redirect('carrito:catalogo')
     
     if request.method == 'POST':
@@ -67,9 +82,9 @@ def login_view(request):
                 
                 # Redirigir según el rol
                 if perfil.rol.nombre in ['Administrador', 'Vendedor']:
-                    return redirect('inventario:lista_productos')
+                    return _con_carrito_anonimo(request, 'inventario:lista_productos')
                 else:
-                    return redirect('carrito:catalogo')
+                    return _con_carrito_anonimo(request, 'carrito:catalogo')
         else:
             messages.error(request, 'Usuario o contraseña incorrectos')
     else:
@@ -94,7 +109,7 @@ def logout_view(request):
 @login_required
 def perfil_view(request):
     """Vista de perfil de usuario con estadísticas según rol"""
-    perfil = request.user.perfilusuario
+    perfil = request.perfil
     
     # Inicializar variables
     total_productos = 0
@@ -108,8 +123,10 @@ def perfil_view(request):
     
     # Datos específicos para Vendedor y Administrador
     if perfil.rol.nombre in ['Vendedor', 'Administrador']:
-        # Total de productos activos
-        total_productos = Producto.objects.filter(activo=True).count()
+        # Total de productos activos y con stock bajo o crítico (una sola consulta)
+        resumen_stock = Producto.objects.filter(activo=True).resumen_stock()
+        total_productos = resumen_stock['total_productos']
+        productos_stock_bajo = resumen_stock['stock_bajo'] + resumen_stock['stock_critico']
         
         # VENDEDOR: Solo VE sus propias ventas
         # ADMIN: Ve TODAS las ventas
@@ -121,18 +138,13 @@ def perfil_view(request):
         else:  # Administrador
             ventas_usuario = Venta.objects.filter(estado='COMPLETADA')
         
-        # Total de ventas
-        total_ventas = ventas_usuario.count()
-        
-        # Ingresos totales
-        total_ingresos = ventas_usuario.aggregate(total=Sum('total'))['total'] or 0
-        
-        # Productos con stock bajo o crítico
-        productos = Producto.objects.filter(activo=True)
-        productos_stock_bajo = sum(
-            1 for p in productos 
-            if p.get_estado_stock() in ['BAJO', 'CRITICO']
-        )
+        # Total de ventas e ingresos (desde el resumen diario)
+        resumen_ventas = totales(filas_resumen(
+            usuario=request.user if perfil.rol.nombre == 'Vendedor' else None,
+            estado='COMPLETADA',
+        ))
+        total_ventas = resumen_ventas['cantidad']
+        total_ingresos = resumen_ventas['total']
         
         # Últimas 5 ventas (del usuario o todas según rol)
         ventas_recientes = ventas_usuario.order_by('-fecha_venta')[:5]
@@ -152,12 +164,9 @@ def perfil_view(request):
     
     # Datos específicos para Cliente
     elif perfil.rol.nombre == 'Cliente':
-        try:
-            carrito = Carrito.objects.get(usuario=request.user)
-            carrito_items = carrito.cantidad_items()
-            carrito_total = carrito.total()
-        except Carrito.DoesNotExist:
-            pass
+        resumen = resumen_carrito(request.user)
+        carrito_items = resumen['cantidad']
+        carrito_total = resumen['total']
         
         # Obtener pedidos del cliente para la actividad reciente
         from carrito.models import Pedido
@@ -214,7 +223,7 @@ def perfil_view(request):
 @login_required
 def editar_perfil_view(request):
     """Vista para editar el PROPIO perfil del usuario (solo Clientes y Admin)"""
-    perfil = request.user.perfilusuario
+    perfil = request.perfil
     
     # RESTRICCIÓN: Vendedores NO pueden editar su propio perfil
     if perfil.rol.nombre == 'Vendedor':
@@ -256,37 +265,70 @@ def editar_perfil_view(request):
     return render(request, 'registration/editar_perfil.html', context)
 
 
+def _filtros_rendimiento(request):
+    """Rango de fechas y orden del ranking de vendedores desde los parametros GET"""
+    fechas = []
+    for parametro in ('desde', 'hasta'):
+        try:
+            fechas.append(parse_date(request.GET.get(parametro, '')))
+        except ValueError:
+            fechas.append(None)
+    orden = request.GET.get('orden', ORDEN_DEFAULT)
+    if orden not in ORDENES:
+        orden = ORDEN_DEFAULT
+    return fechas[0], fechas[1], orden
+
+
 @solo_administrador
 def lista_vendedores_view(request):
-    """Vista para que el ADMIN vea y gestione todos los vendedores"""
-    vendedores = PerfilUsuario.objects.filter(
-        rol__nombre='Vendedor'
-    ).select_related('user')
+    """Vista para que el ADMIN vea y gestione todos los vendedores (ranking por rendimiento)"""
+    desde, hasta, orden = _filtros_rendimiento(request)
     
-    # Calcular estadísticas por vendedor
-    vendedores_data = []
-    for vendedor_perfil in vendedores:
-        ventas = Venta.objects.filter(
-            usuario=vendedor_perfil.user,
-            estado='COMPLETADA'
-        )
-        total_ventas = ventas.count()
-        total_ingresos = ventas.aggregate(total=Sum('total'))['total'] or 0
-        
-        vendedores_data.append({
-            'perfil': vendedor_perfil,
-            'user': vendedor_perfil.user,
-            'total_ventas': total_ventas,
-            'total_ingresos': total_ingresos,
-        })
+    # Todas las estadísticas salen en la misma consulta que los vendedores
+    vendedores = rendimiento_vendedores(desde, hasta, orden)
+    pagina = Paginator(vendedores, 25).get_page(request.GET.get('page'))
+    
+    parametros = request.GET.copy()
+    parametros.pop('page', None)
     
     context = {
-        'vendedores': vendedores_data,
+        'vendedores': pagina,
+        'pagina': pagina,
+        'desde': desde,
+        'hasta': hasta,
+        'orden': orden,
+        'parametros': parametros.urlencode(),
     }
     
     return render(request, 'registration/lista_vendedores.html', context)
 
 
+@solo_administrador
+def rendimiento_vendedores_api(request):
+    """Ranking de vendedores en JSON (?desde=&hasta=&orden=&page=)"""
+    desde, hasta, orden = _filtros_rendimiento(request)
+    pagina = Paginator(rendimiento_vendedores(desde, hasta, orden), 50).get_page(request.GET.get('page'))
+    
+    return JsonResponse({
+        'vendedores': [
+            {
+                'id': perfil.user.id,
+                'username': perfil.user.username,
+                'nombre': perfil.user.get_full_name(),
+                'total_ventas': perfil.total_ventas,
+                'total_ingresos': float(perfil.total_ingresos),
+                'ticket_promedio': float(perfil.ticket_promedio),
+                'unidades': perfil.unidades,
+                'ultima_venta': perfil.ultima_venta.isoformat() if perfil.ultima_venta else None,
+            }
+            for perfil in pagina
+        ],
+        'pagina': pagina.number,
+        'total_paginas': pagina.paginator.num_pages,
+        'total_vendedores': pagina.paginator.count,
+    })
+
+
 @solo_administrador
 def editar_vendedor_view(request, user_id):
     """Vista para que el ADMIN edite el perfil de un vendedor"""
@@ -325,13 +367,10 @@ def editar_vendedor_view(request, user_id):
             messages.error(request, f'Error al actualizar el perfil: {str(e)}')
             return redirect('registration:editar_vendedor', user_id=user_id)
     
-    # Calcular estadísticas del vendedor
-    ventas = Venta.objects.filter(
-        usuario=vendedor_user,
-        estado='COMPLETADA'
-    )
-    total_ventas = ventas.count()
-    total_ingresos = ventas.aggregate(total=Sum('total'))['total'] or 0
+    # Calcular estadísticas del vendedor (desde el resumen diario)
+    resumen_ventas = totales(filas_resumen(usuario=vendedor_user, estado='COMPLETADA'))
+    total_ventas = resumen_ventas['cantidad']
+    total_ingresos = resumen_ventas['total']
     
     context = {
         'vendedor_user': vendedor_user,
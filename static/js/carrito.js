@@ -0,0 +1,76 @@
+// Botones del carrito sin recargar la pagina (ver carrito/operaciones.py).
+// Los enlaces con data-producto y data-operacion ("sumar" o "cantidad") y
+// data-valor se envian a la API JSON del carrito; la respuesta trae la cantidad
+// y el subtotal de cada producto y los totales, que se copian en los elementos
+// marcados con data-item-* y data-carrito-*. Sin JavaScript los enlaces siguen
+// funcionando como antes (recargan la pagina).
+(function () {
+    function escribir(selector, valor) {
+        document.querySelectorAll(selector).forEach(elemento => {
+            elemento.textContent = valor;
+        });
+    }
+
+    function actualizar(data) {
+        Object.entries(data.items).forEach(([producto, item]) => {
+            if (item.cantidad === 0) {
+                document.querySelectorAll(`[data-item-fila="${producto}"]`).forEach(fila => fila.remove());
+                return;
+            }
+            escribir(`[data-item-cantidad="${producto}"]`, item.cantidad);
+            escribir(`[data-item-subtotal="${producto}"]`, item.subtotal);
+            escribir(`[data-item-disponible="${producto}"]`, item.disponible);
+        });
+        escribir('[data-carrito-total]', data.total);
+        escribir('[data-carrito-neto]', data.neto);
+        escribir('[data-carrito-iva]', data.iva);
+        escribir('[data-carrito-lineas]', document.querySelectorAll('tr[data-item-fila]').length);
+        document.querySelectorAll('[data-carrito-badge]').forEach(badge => {
+            badge.textContent = data.cantidad;
+            badge.hidden = data.cantidad === 0;
+        });
+    }
+
+    function enviar(api, boton) {
+        const operacion = {producto: Number(boton.dataset.producto)};
+        operacion[boton.dataset.operacion] = Number(boton.dataset.valor);
+        boton.dataset.enviando = '1';
+
+        fetch(api.dataset.apiCarrito, {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+                'X-CSRFToken': api.dataset.csrf,
+                'X-Requested-With': 'XMLHttpRequest',
+            },
+            body: JSON.stringify({operaciones: [operacion]}),
+        })
+            .then(response => response.json())
+            .then(data => {
+                if (!data.success) {
+                    alert(data.error);
+                    return;
+                }
+                actualizar(data);
+                if (data.cantidad === 0 && api.dataset.recargarVacio) {
+                    window.location.reload();  // Muestra el carrito vacio
+                }
+                boton.dispatchEvent(new CustomEvent('carrito-actualizado', {bubbles: true, detail: data}));
+            })
+            .catch(error => console.error('Error al actualizar el carrito:', error))
+            .finally(() => delete boton.dataset.enviando);
+    }
+
+    document.addEventListener('click', function (evento) {
+        const boton = evento.target.closest('[data-operacion][data-producto]');
+        const api = document.querySelector('[data-api-carrito]');
+        // defaultPrevented: se cancelo en un confirm() del propio enlace
+        if (!boton || !api || evento.defaultPrevented) {
+            return;
+        }
+        evento.preventDefault();
+        if (!boton.dataset.enviando) {
+            enviar(api, boton);
+        }
+    });
+})();
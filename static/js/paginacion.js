@@ -0,0 +1,42 @@
+// Scroll infinito para los listados paginados con cursor (ver inventario/paginacion.py).
+// Cada bloque .cargar-mas indica la URL de la siguiente pagina y el contenedor
+// donde se agregan las filas; la pagina se pide con ?parcial=1 y llega como JSON.
+(function () {
+    function cargar(control) {
+        if (control.dataset.cargando || !control.dataset.siguiente || control.offsetParent === null) {
+            return;
+        }
+        control.dataset.cargando = '1';
+        const destino = document.getElementById(control.dataset.destino);
+
+        fetch(control.dataset.siguiente + '&parcial=1', {headers: {'X-Requested-With': 'XMLHttpRequest'}})
+            .then(response => response.json())
+            .then(data => {
+                destino.insertAdjacentHTML('beforeend', data.html);
+                destino.dispatchEvent(new CustomEvent('pagina-cargada'));
+                if (data.siguiente) {
+                    control.dataset.siguiente = data.siguiente;
+                } else {
+                    control.remove();
+                }
+            })
+            .catch(error => console.error('Error al cargar más resultados:', error))
+            .finally(() => delete control.dataset.cargando);
+    }
+
+    document.addEventListener('DOMContentLoaded', function () {
+        const controles = document.querySelectorAll('.cargar-mas');
+        const observador = 'IntersectionObserver' in window
+            ? new IntersectionObserver(entradas => {
+                entradas.forEach(entrada => entrada.isIntersecting && cargar(entrada.target));
+            }, {rootMargin: '300px'})
+            : null;
+
+        controles.forEach(control => {
+            control.querySelector('button').addEventListener('click', () => cargar(control));
+            if (observador) {
+                observador.observe(control);
+            }
+        });
+    });
+})();